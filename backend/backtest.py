@@ -0,0 +1,356 @@
+"""
+Historical backtesting over datasets/*_timeseries.csv.
+
+Replays history in rolling windows: every --cadence steps the fleet is
+re-optimized (optimize_static_config across sites, or optimize_dispatch per
+site) on a --horizon step price window, and the decision is held until the next
+re-optimization. Decision prices are either the realized prices of the window
+("perfect" foresight) or a persistence forecast of the last observed prices
+("persistence"). Realized P&L is computed with vectorized numpy over every
+5-minute step; the solves are spread across a process pool.
+
+    python backtest.py --cadence 12 --horizon 12 --mode perfect --workers 8
+    python backtest.py --optimizer dispatch --days 7 --out-dir backtest_out
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from optimization_function import optimize_dispatch
+from optimization_function_multiple_sites import optimize_static_config
+from price_cube import load_history_cube, to_epoch_ns
+from site_optimizer import energy_budget, fleet_arrays, load_sites
+from solve_history import set_history
+
+MODES = ("perfect", "persistence")
+OPTIMIZERS = ("static", "dispatch")
+
+# Per-process backtest context, set once by _init_worker
+_ctx = {}
+
+
+def _init_worker(context):
+    _ctx.clear()
+    _ctx.update(context)
+
+
+def _decision_prices(origin):
+    """(n_series, T) prices the optimizer sees when deciding at origin"""
+    values, T = _ctx["values"], _ctx["T"]
+    if _ctx["mode"] == "perfect":
+        return values[:, origin : origin + T]
+    return np.repeat(values[:, origin - 1 : origin], T, axis=1)
+
+
+def solve_static(ctx, prices):
+    """
+    optimize_static_config on one (n_series, T) price window
+    Returns: (S, D) allocation
+    """
+    arrays = ctx["arrays"]
+    sites, devices = ctx["sites"], ctx["devices"]
+    h = prices[ctx["hash_row"]].tolist()
+    g = prices[ctx["token_row"]].tolist()
+    e = {s: prices[row].tolist() for s, row in zip(sites, ctx["energy_rows"])}
+
+    def as_dict(matrix):
+        return {s: dict(zip(devices, matrix[i].tolist())) for i, s in enumerate(sites)}
+
+    result = optimize_static_config(
+        sites=sites,
+        devices=devices,
+        T=ctx["T"],
+        r_hash=as_dict(arrays["r_hash"]),
+        r_tok=as_dict(arrays["r_tok"]),
+        power=as_dict(arrays["power"]),
+        N=as_dict(arrays["N"]),
+        h=h,
+        g=g,
+        e=e,
+        P_MAX=dict(zip(sites, arrays["P_MAX"].tolist())),
+        E_BUDGET=ctx["E_BUDGET"],
+    )
+    return np.array([[result[s, d] for d in devices] for s in sites], float)
+
+
+def solve_dispatch(ctx, prices):
+    """
+    optimize_dispatch per site on one (n_series, T) price window
+    Returns: (cadence, S, D) schedule
+    """
+    arrays = ctx["arrays"]
+    devices = ctx["devices"]
+    h = prices[ctx["hash_row"]].tolist()
+    g = prices[ctx["token_row"]].tolist()
+
+    allocation = np.zeros((ctx["cadence"], len(ctx["sites"]), len(devices)))
+    for i, row in enumerate(ctx["energy_rows"]):
+        # Devices the site does not have would only add empty variables
+        present = [j for j, d in enumerate(devices) if arrays["N"][i, j] > 0]
+        if not present:
+            continue
+        schedule = optimize_dispatch(
+            {devices[j]: arrays["r_hash"][i, j] for j in present},
+            {devices[j]: arrays["r_tok"][i, j] for j in present},
+            {devices[j]: arrays["power"][i, j] for j in present},
+            {devices[j]: arrays["N"][i, j] for j in present},
+            h,
+            g,
+            prices[row].tolist(),
+            arrays["P_MAX"][i],
+        )
+        for j in present:
+            allocation[:, i, j] = schedule[devices[j]][: ctx["cadence"]]
+    return allocation
+
+
+def _solve_chunk(origins):
+    """Decisions for a chunk of origins: (len(origins) * cadence, S, D)"""
+    blocks = []
+    # Keep the solvers' per-solve prints out of the backtest output
+    with contextlib.redirect_stdout(io.StringIO()):
+        for origin in origins:
+            prices = _decision_prices(origin)
+            if _ctx["optimizer"] == "static":
+                allocation = solve_static(_ctx, prices)
+                # Static configuration held for the whole cadence
+                blocks.append(
+                    np.broadcast_to(allocation, (_ctx["cadence"],) + allocation.shape)
+                )
+            else:
+                blocks.append(solve_dispatch(_ctx, prices))
+    return np.concatenate(blocks)
+
+
+def build_context(
+    sites_data,
+    cube,
+    T=12,
+    cadence=12,
+    mode="perfect",
+    optimizer="static",
+    E_BUDGET=None,
+):
+    """Everything a solver process needs: prices, fleet arrays and settings"""
+    sites, devices, arrays, states = fleet_arrays(sites_data)
+    return {
+        "values": cube.values,
+        "T": T,
+        "cadence": cadence,
+        "mode": mode,
+        "optimizer": optimizer,
+        "sites": sites,
+        "devices": devices,
+        "arrays": arrays,
+        "hash_row": cube.row("hash"),
+        "token_row": cube.row("token"),
+        "energy_rows": [cube.row(state) for state in states],
+        "E_BUDGET": E_BUDGET if E_BUDGET is not None else energy_budget(sites_data),
+    }
+
+
+def realized_pnl(allocation, prices, arrays, hash_row, token_row, energy_rows):
+    """
+    Vectorized realized P&L of a per-step allocation
+    allocation: (steps, S, D); prices: (n_series, steps)
+    Returns: {hash_revenue, token_revenue, energy_cost, profit} each (steps, S)
+    """
+    h = prices[hash_row][:, None, None]
+    g = prices[token_row][:, None, None]
+    e = prices[energy_rows].T[:, :, None]
+
+    hash_revenue = (allocation * arrays["r_hash"][None] * h).sum(axis=2)
+    token_revenue = (allocation * arrays["r_tok"][None] * g).sum(axis=2)
+    energy_cost = (allocation * arrays["power"][None] * e).sum(axis=2)
+    return {
+        "hash_revenue": hash_revenue,
+        "token_revenue": token_revenue,
+        "energy_cost": energy_cost,
+        "profit": hash_revenue + token_revenue - energy_cost,
+    }
+
+
+def run_backtest(
+    sites_data,
+    datasets_dir,
+    start=None,
+    end=None,
+    cadence=12,
+    T=12,
+    mode="perfect",
+    optimizer="static",
+    E_BUDGET=None,
+    workers=None,
+    chunk_size=None,
+):
+    """
+    Returns: dict with timestamps (steps,), site_ids, allocation (steps, S, D),
+    and the realized P&L components (steps, S)
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}' (choose from {MODES})")
+    if optimizer not in OPTIMIZERS:
+        raise ValueError(f"Unknown optimizer '{optimizer}' (choose from {OPTIMIZERS})")
+    if optimizer == "dispatch" and T < cadence:
+        raise ValueError("The dispatch horizon must cover the re-optimization cadence")
+
+    cube = load_history_cube(datasets_dir)
+
+    first = cube.position(cube.common_start())
+    last = cube.position(cube.common_end())
+    if start is not None:
+        first = max(first, cube.position(start))
+    if end is not None:
+        last = min(last, cube.position(end))
+    if mode == "persistence":
+        first += 1  # needs one observed step before the first decision
+
+    # Every decision must see a full horizon and hold for a full cadence
+    span = max(T, cadence)
+    origins = list(range(first, last + 2 - span, cadence))
+    if not origins:
+        raise ValueError("Backtest range is shorter than one decision window")
+
+    context = build_context(
+        sites_data,
+        cube,
+        T=T,
+        cadence=cadence,
+        mode=mode,
+        optimizer=optimizer,
+        E_BUDGET=E_BUDGET,
+    )
+
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, -(-len(origins) // (workers * 4)))
+    chunks = [origins[i : i + chunk_size] for i in range(0, len(origins), chunk_size)]
+
+    if workers == 1:
+        _init_worker(context)
+        blocks = [_solve_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(context,)
+        ) as pool:
+            blocks = list(pool.map(_solve_chunk, chunks))
+    allocation = np.concatenate(blocks)
+
+    steps = slice(origins[0], origins[0] + len(allocation))
+    prices = cube.values[:, steps]
+    pnl = realized_pnl(
+        allocation,
+        prices,
+        context["arrays"],
+        context["hash_row"],
+        context["token_row"],
+        context["energy_rows"],
+    )
+    return {
+        "timestamps": cube.index[steps],
+        "site_ids": context["sites"],
+        "devices": context["devices"],
+        "allocation": allocation,
+        "decisions": len(origins),
+        **pnl,
+    }
+
+
+def site_report(result):
+    """Per-site realized totals"""
+    import pandas as pd
+
+    report = pd.DataFrame(
+        {
+            key: result[key].sum(axis=0)
+            for key in ("hash_revenue", "token_revenue", "energy_cost", "profit")
+        },
+        index=pd.Index(result["site_ids"], name="site_id"),
+    )
+    report["avg_machines"] = result["allocation"].sum(axis=2).mean(axis=0)
+    return report
+
+
+def fleet_report(result, freq="1D"):
+    """Fleet realized totals per period (default: daily)"""
+    import pandas as pd
+
+    index = pd.to_datetime(result["timestamps"])
+    frame = pd.DataFrame(
+        {
+            key: result[key].sum(axis=1)
+            for key in ("hash_revenue", "token_revenue", "energy_cost", "profit")
+        },
+        index=pd.Index(index, name="timestamp"),
+    )
+    return frame.resample(freq).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Historical backtest")
+    parser.add_argument("--sites-file", default=os.getenv("SITES_FILE", "sites.json"))
+    parser.add_argument("--datasets-dir", default="../datasets")
+    parser.add_argument("--start", help="First timestamp to replay")
+    parser.add_argument("--end", help="Last timestamp to replay")
+    parser.add_argument("--days", type=float, help="Replay only this many days")
+    parser.add_argument(
+        "--cadence", type=int, default=12, help="Steps between re-optimizations"
+    )
+    parser.add_argument("--horizon", type=int, default=12, help="Decision window T")
+    parser.add_argument("--mode", choices=MODES, default="perfect")
+    parser.add_argument("--optimizer", choices=OPTIMIZERS, default="static")
+    parser.add_argument("--energy-budget", type=float)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--out-dir", help="Write site and fleet reports as CSV here")
+    parser.add_argument(
+        "--history", help="Record solves to this solve history file (default: off)"
+    )
+    args = parser.parse_args()
+    set_history(args.history)
+
+    end = args.end
+    if args.days is not None:
+        cube = load_history_cube(args.datasets_dir)
+        first = to_epoch_ns(args.start) if args.start else cube.common_start()
+        end = first + int(args.days * 86400e9)
+
+    started = time.perf_counter()
+    result = run_backtest(
+        load_sites(args.sites_file),
+        args.datasets_dir,
+        start=args.start,
+        end=end,
+        cadence=args.cadence,
+        T=args.horizon,
+        mode=args.mode,
+        optimizer=args.optimizer,
+        E_BUDGET=args.energy_budget,
+        workers=args.workers,
+    )
+    elapsed = time.perf_counter() - started
+
+    sites = site_report(result)
+    fleet = fleet_report(result)
+    print(
+        f"Backtested {len(result['timestamps'])} steps, {result['decisions']} "
+        f"decisions ({args.optimizer}, {args.mode}) in {elapsed:.1f}s"
+    )
+    print("\nPer-site P&L:")
+    print(sites.round(2).to_string())
+    print("\nFleet P&L per day:")
+    print(fleet.round(2).to_string())
+    print(f"\nFleet total profit: {sites['profit'].sum():,.2f}")
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        sites.to_csv(os.path.join(args.out_dir, "backtest_sites.csv"))
+        fleet.to_csv(os.path.join(args.out_dir, "backtest_fleet.csv"))
+
+
+if __name__ == "__main__":
+    main()
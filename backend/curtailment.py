@@ -0,0 +1,156 @@
+"""
+Merit-order index for immediate curtailment response.
+
+For every site, device types are kept ranked by profit per watt at the
+current prices (lowest first). A shed plan for a target power reduction walks
+that order and turns off the least valuable machines first, so answering a
+curtailment event is a short array walk instead of a CBC solve.
+
+Price ticks update the index incrementally: an energy price tick re-ranks
+only the sites in that state; hash / token ticks re-rank every site with one
+vectorized pass. The running machine counts come from optimal_machines and
+are reconciled whenever the optimizer writes a new allocation.
+
+    index = MeritOrderIndex.from_sites(load_sites("sites.json"), h, g, e_states)
+    index.tick(energy={"Texas": 0.91})
+    plan = index.shed("1", 50_000)  # watts
+"""
+
+import math
+
+import numpy as np
+
+from site_optimizer import fleet_arrays
+
+
+class MeritOrderIndex:
+    def __init__(self, sites_data, hash_price, token_price, energy_prices):
+        """
+        sites_data: site documents as in sites.json
+        hash_price, token_price: current prices
+        energy_prices: {state: current energy price}
+        """
+        self.site_ids, self.devices, arrays, self.states = fleet_arrays(sites_data)
+        self.r_hash = arrays["r_hash"]
+        self.r_tok = arrays["r_tok"]
+        self.power = arrays["power"]
+        self.running = arrays["current"].astype(int)
+        self.risk = {site["id"]: site.get("curtailmentRisk") for site in sites_data}
+        self._rows = {s: i for i, s in enumerate(self.site_ids)}
+        self._state_rows = {}
+        for i, state in enumerate(self.states):
+            self._state_rows.setdefault(state, []).append(i)
+
+        self.hash_price = float(hash_price)
+        self.token_price = float(token_price)
+        self.energy = np.array(
+            [energy_prices[state] for state in self.states], dtype=float
+        )
+        self.profit = np.zeros_like(self.power)
+        self.order = np.zeros(self.power.shape, dtype=int)
+        self._rank(slice(None))
+
+    @classmethod
+    def from_sites(cls, sites_data, h, g, e_states):
+        """Index at the first step of a forecast window (h, g, e_states lists)"""
+        return cls(
+            sites_data, h[0], g[0], {state: e[0] for state, e in e_states.items()}
+        )
+
+    def _rank(self, rows):
+        """Recompute profit per machine-step and the merit order of rows"""
+        profit = (
+            self.r_hash[rows] * self.hash_price
+            + self.r_tok[rows] * self.token_price
+            - self.power[rows] * self.energy[rows, None]
+        )
+        self.profit[rows] = profit
+        with np.errstate(divide="ignore", invalid="ignore"):
+            per_watt = np.where(self.power[rows] > 0, profit / self.power[rows], np.inf)
+        # Lowest profit per watt first; devices drawing no power last
+        self.order[rows] = np.argsort(per_watt, axis=1, kind="stable")
+
+    def tick(self, hash_price=None, token_price=None, energy=None):
+        """
+        Apply a price tick
+        energy: {state: price}; only sites in those states are re-ranked
+        Returns: number of sites re-ranked
+        """
+        if hash_price is not None or token_price is not None:
+            if hash_price is not None:
+                self.hash_price = float(hash_price)
+            if token_price is not None:
+                self.token_price = float(token_price)
+            for state, price in (energy or {}).items():
+                self.energy[self._state_rows.get(state, [])] = price
+            self._rank(slice(None))
+            return len(self.site_ids)
+
+        rows = []
+        for state, price in (energy or {}).items():
+            state_rows = self._state_rows.get(state, [])
+            self.energy[state_rows] = price
+            rows.extend(state_rows)
+        if rows:
+            self._rank(rows)
+        return len(rows)
+
+    def shed(self, site_id, target_watts, commit=False):
+        """
+        Machines to turn off at site_id to cut at least target_watts, least
+        profitable per watt first
+        commit: also remove them from the running counts
+        Returns: {site_id, target_watts, shed_watts, shortfall_watts,
+            lost_profit_per_step, curtailment_risk, machines: [{device_type,
+            turn_off, remaining}]}
+        """
+        i = self._rows[site_id]
+        remaining = float(target_watts)
+        machines = []
+        shed_watts = lost = 0.0
+        for j in self.order[i]:
+            if remaining <= 0:
+                break
+            watts, running = self.power[i, j], self.running[i, j]
+            if watts <= 0 or running <= 0:
+                continue
+            n = min(int(running), math.ceil(remaining / watts))
+            remaining -= n * watts
+            shed_watts += n * watts
+            lost += n * self.profit[i, j]
+            machines.append(
+                {
+                    "device_type": self.devices[j],
+                    "turn_off": n,
+                    "remaining": int(running) - n,
+                }
+            )
+            if commit:
+                self.running[i, j] -= n
+
+        return {
+            "site_id": site_id,
+            "target_watts": float(target_watts),
+            "shed_watts": shed_watts,
+            "shortfall_watts": max(remaining, 0.0),
+            "lost_profit_per_step": lost,
+            "curtailment_risk": self.risk.get(site_id),
+            "machines": machines,
+        }
+
+    def shed_many(self, targets, commit=False):
+        """{site_id: target watts} -> list of shed plans"""
+        return [self.shed(s, watts, commit=commit) for s, watts in targets.items()]
+
+    def reconcile(self, sites_data):
+        """
+        Take running counts from a new optimizer allocation (optimal_machines)
+        while keeping the current prices; sites may have been added or removed
+        """
+        prices = {
+            state: self.energy[rows[0]] for state, rows in self._state_rows.items()
+        }
+        missing = {site["state"] for site in sites_data if site["state"] not in prices}
+        if missing:
+            raise KeyError(f"No energy price for states {sorted(missing)}")
+        self.__init__(sites_data, self.hash_price, self.token_price, prices)
@@ -0,0 +1,329 @@
+"""
+Multi-site time-indexed dispatch under a shared energy budget.
+
+The full model dispatches every (site, device) per 5-minute step, with each
+site's power cap and switching downtime and one energy budget across the
+fleet. The budget is the only constraint coupling sites, so it is relaxed
+with a Lagrange multiplier lam >= 0 (price decomposition). For a given lam,
+every site is an independent optimize_dispatch subproblem with energy prices
+scaled by (1 + lam), and the subproblems are solved in parallel across a
+process pool. Bisection on lam finds the smallest price at which the fleet
+fits the budget. Every lam also gives an upper bound
+
+    L(lam) = sum over sites of subproblem bound + lam * E_BUDGET
+
+so the gap of the returned (feasible) schedule is certified.
+
+    python fleet_dispatch.py --horizon 288 --switch-cost 500 --energy-budget 2e9
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from optimization_function import optimize_dispatch
+from optimization_function_multiple_sites import extract_site_params
+from price_cube import load_forecast_cube
+from site_optimizer import energy_budget, load_forecasts, load_sites
+from schedule_codec import stream_ndjson
+from solver_control import relative_gap
+
+# Per-process subproblem data, set once by _init_worker
+_ctx = {}
+
+
+def _init_worker(context):
+    _ctx.clear()
+    _ctx.update(context)
+
+
+def _solve_site(task):
+    """
+    One site's dispatch at energy price multiplier (1 + lam), optionally with
+    its own cap on energy spend
+    Returns: (site index, dense schedule, subproblem report, energy spend)
+    """
+    i, lam, energy_cap = task
+    site = _ctx["sites"][i]
+    e = [(1 + lam) * price for price in site["e"]]
+    with contextlib.redirect_stdout(io.StringIO()):
+        schedule, report = optimize_dispatch(
+            site["r_hash"],
+            site["r_tok"],
+            site["power"],
+            site["N"],
+            _ctx["h"],
+            _ctx["g"],
+            e,
+            site["P_MAX"],
+            time_limit=_ctx["time_limit"],
+            gap_rel=_ctx["gap_rel"],
+            return_report=True,
+            switch_cost=_ctx["switch_cost"],
+            energy_cap=energy_cap,
+        )
+    spend = sum(
+        site["power"][d] * price * count
+        for d, counts in schedule.items()
+        for price, count in zip(site["e"], counts)
+    )
+    return i, schedule, report, spend
+
+
+def build_context(
+    sites_data, h, g, e_states, switch_cost=0.0, time_limit=None, gap_rel=None
+):
+    """Per-site subproblem data (devices a site does not have are dropped)"""
+    sites, power, N, P_MAX, energy_prices, site_states, r_hash, r_tok = (
+        extract_site_params(sites_data)
+    )
+    subproblems = []
+    for s in sites:
+        present = [d for d in power[s] if N[s][d] > 0]
+        subproblems.append(
+            {
+                "id": s,
+                "r_hash": {d: r_hash[s][d] for d in present},
+                "r_tok": {d: r_tok[s][d] for d in present},
+                "power": {d: power[s][d] for d in present},
+                "N": {d: N[s][d] for d in present},
+                "P_MAX": P_MAX[s],
+                "e": list(e_states[site_states[s]]),
+            }
+        )
+    return {
+        "sites": subproblems,
+        "h": list(h),
+        "g": list(g),
+        "switch_cost": switch_cost,
+        "time_limit": time_limit,
+        "gap_rel": gap_rel,
+    }
+
+
+def combine_candidates(choice, candidates, budget):
+    """
+    Greedy multiple-choice knapsack over per-site candidate schedules
+    choice: {site: (profit, spend, schedule)}, a feasible starting pick
+    candidates: {site: [(profit, spend, schedule)]}
+    Repeatedly applies the swap with the most extra profit per extra spend
+    that still fits the budget.
+    Returns: the improved choice
+    """
+    choice = dict(choice)
+    slack = budget - sum(spend for _, spend, _ in choice.values())
+    while True:
+        best, best_ratio = None, 0.0
+        for i, options in candidates.items():
+            profit, spend, _ = choice[i]
+            for option in options:
+                gain, extra = option[0] - profit, option[1] - spend
+                if gain <= 1e-9 or extra > slack:
+                    continue
+                ratio = gain / extra if extra > 0 else float("inf")
+                if ratio > best_ratio:
+                    best, best_ratio = (i, option), ratio
+        if best is None:
+            return choice
+        i, option = best
+        slack -= option[1] - choice[i][1]
+        choice[i] = option
+
+
+def dispatch_fleet(
+    sites_data,
+    h,
+    g,
+    e_states,
+    E_BUDGET=None,
+    switch_cost=0.0,
+    time_limit=None,
+    gap_rel=None,
+    workers=None,
+    max_iter=20,
+    tol=1e-2,
+):
+    """
+    sites_data: site documents as in sites.json
+    h, g: lists of length T; e_states: {state: list of length T}
+    E_BUDGET: fleet energy budget (default: energy_budget(sites_data))
+    switch_cost: cost per interval in which a site changes configuration
+    time_limit, gap_rel: CBC budget per subproblem solve
+    tol: stop bisecting when the multiplier bracket is this tight (relative)
+    Returns: {schedules {site_id: {device: [count per t]}}, profit, spend,
+        budget, bound, gap, multiplier, iterations, solve_time}
+    """
+    E_BUDGET = energy_budget(sites_data) if E_BUDGET is None else E_BUDGET
+    context = build_context(
+        sites_data, h, g, e_states, switch_cost, time_limit, gap_rel
+    )
+    indices = [i for i, site in enumerate(context["sites"]) if site["N"]]
+    started = time.perf_counter()
+
+    workers = workers or os.cpu_count() or 1
+    pool = None
+    if workers > 1 and len(indices) > 1:
+        # spawn, not fork: the server's driver and scheduler threads may hold
+        # locks that a forked child would inherit
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(context,),
+        )
+        run = pool.map
+    else:
+        _init_worker(context)
+        run = map
+
+    # Every site's schedule at every multiplier tried: {site index: [(profit,
+    # spend, schedule)]}; the final schedule picks one candidate per site
+    candidates = {i: [] for i in indices}
+    bound = float("inf")
+    evaluations = 0
+    feasible = None  # (evaluation index, multiplier) of the last feasible one
+
+    def evaluate(lam):
+        """Solve every site at lam; returns whether the fleet fits the budget"""
+        nonlocal bound, evaluations, feasible
+        evaluations += 1
+        solved = list(run(_solve_site, [(i, lam, None) for i in indices]))
+        for i, schedule, report, spend in solved:
+            # Subproblem objectives are profit - lam * spend, so add it back
+            candidates[i].append((report["objective"] + lam * spend, spend, schedule))
+        if all(report["bound"] is not None for _, _, report, _ in solved):
+            dual = sum(report["bound"] for _, _, report, _ in solved) + lam * E_BUDGET
+            bound = min(bound, dual)
+        if sum(spend for _, _, _, spend in solved) > E_BUDGET:
+            return False
+        feasible = (evaluations - 1, lam)
+        return True
+
+    try:
+        # 1) Without the budget price: optimal whenever the budget is slack
+        if not evaluate(0.0):
+            # 2) Bracket the multiplier, then bisect to the smallest feasible one
+            lo, hi = 0.0, 1.0
+            while not evaluate(hi):
+                lo, hi = hi, hi * 2
+                if evaluations > max_iter:
+                    raise RuntimeError("Could not price the fleet into the budget")
+            for _ in range(max_iter):
+                if hi - lo <= tol * hi:
+                    break
+                mid = (lo + hi) / 2
+                if evaluate(mid):
+                    hi = mid
+                else:
+                    lo = mid
+
+        # 3) Start from the smallest feasible multiplier's schedules, then
+        #    spend what is left of the budget on per-site upgrades from other
+        #    multipliers
+        k, multiplier = feasible
+        choice = combine_candidates(
+            {i: candidates[i][k] for i in indices}, candidates, E_BUDGET
+        )
+
+        # 4) Offer the remaining slack to each site in turn (capped re-solves
+        #    in parallel) and keep the single best improvement
+        slack = E_BUDGET - sum(spend for _, spend, _ in choice.values())
+        if multiplier > 0 and slack > 0:
+            tasks = [(i, 0.0, choice[i][1] + slack) for i in indices]
+            upgrades = [
+                (
+                    report["objective"] - choice[i][0],
+                    i,
+                    (report["objective"], spend, schedule),
+                )
+                for i, schedule, report, spend in run(_solve_site, tasks)
+            ]
+            gain, i, option = max(upgrades, key=lambda upgrade: upgrade[0])
+            if gain > 0:
+                choice[i] = option
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    bound = bound if bound < float("inf") else None
+    profit = sum(profit for profit, _, _ in choice.values())
+    return {
+        "schedules": {
+            context["sites"][i]["id"]: schedule
+            for i, (_, _, schedule) in choice.items()
+        },
+        "profit": profit,
+        "spend": sum(spend for _, spend, _ in choice.values()),
+        "multiplier": multiplier,
+        "budget": E_BUDGET,
+        "bound": bound,
+        "gap": relative_gap(profit, bound),
+        "iterations": evaluations,
+        "solve_time": time.perf_counter() - started,
+    }
+
+
+def dispatch_sites_file(sites_file, forecasts_dir, T, start=None, **kwargs):
+    """
+    dispatch_fleet over the sites in sites_file and a T step forecast window
+    Returns: (window start in epoch ns, dispatch_fleet result)
+    """
+    cube = load_forecast_cube(forecasts_dir)
+    start = (
+        cube.common_start() if start is None else cube.timestamp(cube.position(start))
+    )
+    h, g, e_states = load_forecasts(forecasts_dir, T, start=start)
+    return start, dispatch_fleet(load_sites(sites_file), h, g, e_states, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet dispatch with a shared budget")
+    parser.add_argument("--sites-file", default=os.getenv("SITES_FILE", "sites.json"))
+    parser.add_argument(
+        "--forecasts-dir",
+        default=os.getenv("FORECASTS_DIR", "../datasets/forecasts"),
+    )
+    parser.add_argument("--horizon", type=int, default=12)
+    parser.add_argument("--start", help="Window start (default: first common time)")
+    parser.add_argument("--switch-cost", type=float, default=0.0)
+    parser.add_argument("--energy-budget", type=float)
+    parser.add_argument("--time-limit", type=float, help="Seconds per site solve")
+    parser.add_argument("--gap", type=float, help="Relative MIP gap per site solve")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--out", help="Write the schedules as NDJSON segments")
+    args = parser.parse_args()
+
+    start, result = dispatch_sites_file(
+        args.sites_file,
+        args.forecasts_dir,
+        args.horizon,
+        start=args.start,
+        E_BUDGET=args.energy_budget,
+        switch_cost=args.switch_cost,
+        time_limit=args.time_limit,
+        gap_rel=args.gap,
+        workers=args.workers,
+    )
+
+    print(
+        f"Dispatched {len(result['schedules'])} sites x {args.horizon} steps in "
+        f"{result['solve_time']:.2f}s ({result['iterations']} price iterations)"
+    )
+    print(f"Profit:      {result['profit']:,.2f}")
+    print(f"Energy:      {result['spend']:,.2f} of {result['budget']:,.2f}")
+    print(f"Multiplier:  {result['multiplier']:.6f}")
+    if result["gap"] is not None:
+        print(f"Bound:       {result['bound']:,.2f} (gap {result['gap']:.4%})")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            step_ns = load_forecast_cube(args.forecasts_dir).step_ns
+            f.writelines(stream_ndjson(result["schedules"].items(), start, step_ns))
+
+
+if __name__ == "__main__":
+    main()
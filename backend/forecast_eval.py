@@ -0,0 +1,348 @@
+"""
+Batch rolling-origin evaluation of the forecasters in models/*.pkl.
+
+For every series (hash, token, per-state energy) the history in
+datasets/*_timeseries.csv is cut at many origins. Each worker process loads a
+model once and forecasts a whole chunk of origins in a single predict call,
+one item per origin. Error metrics are computed vectorized over the
+(origins x horizon) error matrix. With --profit, the evaluator also re-prices
+the optimizer's decisions: it solves optimize_static_config on the forecast
+at each origin and on the realized prices (once per origin, shared by all
+forecasters), and reports the realized-profit regret caused by forecast error.
+
+The pickles are autogluon TimeSeriesPredictor stubs whose weights live in the
+directory they were saved to. --model-root points at a local copy of that
+directory. The "persistence" and "seasonal_naive" baselines need no model:
+
+    python forecast_eval.py --forecasters model,persistence --model-root ~/AutogluonModels
+    python forecast_eval.py --forecasters persistence,seasonal_naive --stride 12 --profit
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backtest import build_context, solve_static
+from price_cube import load_history_cube
+from site_optimizer import load_sites
+from solve_history import set_history
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models")
+
+# Cube series -> predictor pickle
+MODEL_FILES = {
+    "hash": "hash_model.pkl",
+    "token": "token_model.pkl",
+    "California": "cali_predictor.pkl",
+    "Texas": "texas_predictor.pkl",
+    "Ohio": "ohio_predictor.pkl",
+    "Nevada": "nevada_predictor.pkl",
+    "Wyoming": "wyoming_predictor.pkl",
+}
+
+FORECASTERS = ("model", "persistence", "seasonal_naive")
+
+# One day of 5-minute steps
+SEASONAL_PERIOD = 288
+
+# Per-process state: shared arrays from the initializer, models loaded lazily
+_ctx = {}
+_models = {}
+
+
+def _init_worker(context):
+    _ctx.clear()
+    _ctx.update(context)
+    _models.clear()
+
+
+def load_predictor(series, models_dir=MODELS_DIR, model_root=None):
+    """Load the autogluon predictor for series (once per process)"""
+    if series in _models:
+        return _models[series]
+
+    from autogluon.timeseries import TimeSeriesPredictor
+
+    with open(os.path.join(models_dir, MODEL_FILES[series]), "rb") as f:
+        path = pickle.load(f).path
+    if model_root:
+        path = os.path.join(model_root, os.path.basename(path.rstrip("/")))
+    _models[series] = TimeSeriesPredictor.load(path)
+    return _models[series]
+
+
+def _model_forecast(series, origins):
+    """One batched predict call over all origins: (len(origins), horizon)"""
+    import pandas as pd
+    from autogluon.timeseries import TimeSeriesDataFrame
+
+    predictor = load_predictor(series, _ctx["models_dir"], _ctx["model_root"])
+    values = _ctx["values"][_ctx["rows"][series]]
+    index = _ctx["index"]
+    context, horizon = _ctx["context"], _ctx["horizon"]
+
+    frames = []
+    for origin in origins:
+        steps = slice(origin - context, origin)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "item_id": origin,
+                    "timestamp": pd.to_datetime(index[steps]),
+                    predictor.target: values[steps],
+                }
+            )
+        )
+    data = TimeSeriesDataFrame.from_data_frame(pd.concat(frames, ignore_index=True))
+    predictions = predictor.predict(data)["mean"]
+    return np.vstack(
+        [predictions.loc[origin].to_numpy()[:horizon] for origin in origins]
+    )
+
+
+def baseline_forecast(values, origins, horizon, forecaster):
+    """Vectorized baseline forecasts: (len(origins), horizon)"""
+    origins = np.asarray(origins)
+    if forecaster == "persistence":
+        return np.repeat(values[origins - 1][:, None], horizon, axis=1)
+    if forecaster == "seasonal_naive":
+        steps = np.arange(horizon)
+        return values[origins[:, None] - SEASONAL_PERIOD + steps % SEASONAL_PERIOD]
+    raise ValueError(f"Unknown forecaster '{forecaster}'")
+
+
+def _forecast_chunk(task):
+    series, forecaster, origins = task
+    if forecaster == "model":
+        forecast = _model_forecast(series, origins)
+    else:
+        values = _ctx["values"][_ctx["rows"][series]]
+        forecast = baseline_forecast(values, origins, _ctx["horizon"], forecaster)
+    return series, forecaster, origins, forecast
+
+
+def error_metrics(forecast, actual):
+    """
+    Metrics over an (origins x horizon) forecast/actual pair
+    Returns: scalar metrics plus per-horizon-step MAE
+    """
+    error = forecast - actual
+    abs_error = np.abs(error)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ape = np.where(actual != 0, abs_error / np.abs(actual), np.nan)
+    return {
+        "mae": float(abs_error.mean()),
+        "rmse": float(np.sqrt((error**2).mean())),
+        "mape": float(np.nanmean(ape) * 100),
+        "bias": float(error.mean()),
+        "mae_by_step": abs_error.mean(axis=0),
+    }
+
+
+def _realized_profit(origins, decisions):
+    """Profit of per-origin decisions (O, n, m) at realized prices, vectorized"""
+    ctx = _ctx["solver"]
+    values, horizon = _ctx["values"], _ctx["horizon"]
+    arrays = ctx["arrays"]
+    actual = np.stack([values[:, o : o + horizon] for o in origins])  # (O, n, H)
+    coeff = (
+        arrays["r_hash"][None] * actual[:, ctx["hash_row"]].sum(axis=1)[:, None, None]
+        + arrays["r_tok"][None] * actual[:, ctx["token_row"]].sum(axis=1)[:, None, None]
+        - arrays["power"][None] * actual[:, ctx["energy_rows"]].sum(axis=2)[:, :, None]
+    )
+    return (coeff * np.asarray(decisions)).sum(axis=(1, 2))
+
+
+def _perfect_chunk(origins):
+    """
+    Realized profit of decisions made on realized (perfect-foresight) prices;
+    the same for every forecaster, so solved once per origin
+    Returns: profit per origin
+    """
+    ctx = _ctx["solver"]
+    values, horizon = _ctx["values"], _ctx["horizon"]
+    with contextlib.redirect_stdout(io.StringIO()):
+        decisions = [
+            solve_static(ctx, values[:, origin : origin + horizon])
+            for origin in origins
+        ]
+    return _realized_profit(origins, decisions)
+
+
+def _profit_chunk(task):
+    """
+    Realized profit of decisions made on forecast prices
+    Returns: (series, forecaster, profit per origin)
+    """
+    series, forecaster, origins, forecast = task
+    ctx = _ctx["solver"]
+    values, horizon = _ctx["values"], _ctx["horizon"]
+    row = _ctx["rows"][series]
+
+    decisions = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for origin, predicted in zip(origins, forecast):
+            seen = values[:, origin : origin + horizon].copy()
+            seen[row] = predicted
+            decisions.append(solve_static(ctx, seen))
+    return series, forecaster, _realized_profit(origins, decisions)
+
+
+def run_evaluation(
+    datasets_dir,
+    forecasters=("persistence", "seasonal_naive"),
+    series=None,
+    horizon=12,
+    context=2016,
+    stride=12,
+    max_origins=None,
+    profit=False,
+    sites_data=None,
+    models_dir=MODELS_DIR,
+    model_root=None,
+    workers=None,
+    chunk_size=64,
+):
+    """
+    Returns: {(series, forecaster): metrics}, with "regret" / "regret_pct" in the
+    metrics when profit=True
+    """
+    cube = load_history_cube(datasets_dir)
+    series = list(series or MODEL_FILES)
+    rows = {name: cube.row(name) for name in series + ["hash", "token"]}
+
+    # Origins where every series has full context and a full realized horizon
+    first = cube.position(cube.common_start()) + max(context, SEASONAL_PERIOD)
+    last = cube.position(cube.common_end()) - horizon + 1
+    origins = np.arange(first, last + 1, stride)
+    if max_origins:
+        origins = origins[-max_origins:]
+    if len(origins) == 0:
+        raise ValueError("History is too short for this context and horizon")
+
+    context_data = {
+        "values": cube.values,
+        "index": cube.index,
+        "rows": rows,
+        "horizon": horizon,
+        "context": context,
+        "models_dir": models_dir,
+        "model_root": model_root,
+    }
+    if profit:
+        context_data["solver"] = build_context(sites_data, cube, T=horizon)
+
+    tasks = [
+        (name, forecaster, origins[i : i + chunk_size].tolist())
+        for name in series
+        for forecaster in forecasters
+        for i in range(0, len(origins), chunk_size)
+    ]
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(context_data,)
+    ) as pool:
+        chunks = list(pool.map(_forecast_chunk, tasks))
+
+        # Stitch chunks back into one (origins x horizon) matrix per pair
+        forecasts = {}
+        for name, forecaster, chunk_origins, forecast in chunks:
+            forecasts.setdefault((name, forecaster), []).append(forecast)
+        forecasts = {key: np.vstack(parts) for key, parts in forecasts.items()}
+
+        results = {}
+        steps = origins[:, None] + np.arange(horizon)
+        for (name, forecaster), forecast in forecasts.items():
+            actual = cube.values[rows[name]][steps]
+            results[name, forecaster] = error_metrics(forecast, actual)
+
+        if profit:
+            origin_chunks = [
+                origins[i : i + chunk_size].tolist()
+                for i in range(0, len(origins), chunk_size)
+            ]
+            perfect_profit = sum(
+                float(chunk.sum()) for chunk in pool.map(_perfect_chunk, origin_chunks)
+            )
+            regrets = {}
+            for name, forecaster, forecast_profit in pool.map(_profit_chunk, chunks):
+                key = name, forecaster
+                regrets[key] = regrets.get(key, 0.0) + float(forecast_profit.sum())
+            for key, forecast_profit in regrets.items():
+                regret = perfect_profit - forecast_profit
+                results[key]["regret"] = regret
+                results[key]["regret_pct"] = (
+                    regret / abs(perfect_profit) * 100 if perfect_profit else 0.0
+                )
+
+    return results, len(origins)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin forecast evaluation")
+    parser.add_argument("--datasets-dir", default="../datasets")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--model-root", help="Local copy of the AutogluonModels dir")
+    parser.add_argument("--forecasters", default="persistence,seasonal_naive")
+    parser.add_argument("--series", help="Comma-separated subset of series")
+    parser.add_argument("--horizon", type=int, default=12)
+    parser.add_argument("--context", type=int, default=2016)
+    parser.add_argument("--stride", type=int, default=12, help="Steps between origins")
+    parser.add_argument("--max-origins", type=int)
+    parser.add_argument("--profit", action="store_true")
+    parser.add_argument("--sites-file", default=os.getenv("SITES_FILE", "sites.json"))
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--out", help="Write the metrics table as CSV")
+    parser.add_argument(
+        "--history", help="Record solves to this solve history file (default: off)"
+    )
+    args = parser.parse_args()
+    set_history(args.history)
+
+    forecasters = [f.strip() for f in args.forecasters.split(",")]
+    for forecaster in forecasters:
+        if forecaster not in FORECASTERS:
+            raise SystemExit(f"Unknown forecaster '{forecaster}' ({FORECASTERS})")
+
+    started = time.perf_counter()
+    results, n_origins = run_evaluation(
+        args.datasets_dir,
+        forecasters=forecasters,
+        series=args.series.split(",") if args.series else None,
+        horizon=args.horizon,
+        context=args.context,
+        stride=args.stride,
+        max_origins=args.max_origins,
+        profit=args.profit,
+        sites_data=load_sites(args.sites_file) if args.profit else None,
+        models_dir=args.models_dir,
+        model_root=args.model_root,
+        workers=args.workers,
+    )
+    elapsed = time.perf_counter() - started
+
+    import pandas as pd
+
+    table = pd.DataFrame(
+        {
+            key: {k: v for k, v in metrics.items() if k != "mae_by_step"}
+            for key, metrics in results.items()
+        }
+    ).T
+    table.index.names = ["series", "forecaster"]
+    print(f"Evaluated {n_origins} origins per series in {elapsed:.1f}s\n")
+    print(table.sort_index().to_string(float_format=lambda v: f"{v:,.4f}"))
+
+    if args.out:
+        table.to_csv(args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Load-generation harness for the Flask backends.
+
+Drives /health, /sites and /optimize with a pool of closed-loop clients at one
+or more concurrency levels and reports p50/p95/p99 latency, throughput and
+error rates per endpoint.
+
+By default the target server (server.py or server_simple.py) is started
+in-process on a free port, backed by the local Mongo stand-in and a fixture
+sites.json with --sites entries, so nothing on disk or in Atlas is touched:
+
+    python load_test.py --sites 50 --concurrency 1,4,16 --requests 200
+    python load_test.py --url http://localhost:5000 --endpoints health,sites
+"""
+
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FORECASTS_DIR = os.path.join(BACKEND_DIR, "..", "datasets", "forecasts")
+
+ENDPOINTS = {
+    "health": ("GET", "/health"),
+    "sites": ("GET", "/sites"),
+    "optimize": ("POST", "/optimize"),
+}
+
+
+def make_fixture_sites(template_sites, n_sites):
+    """Cycle through template_sites to build n_sites with unique ids"""
+    fixture = []
+    for i in range(n_sites):
+        site = json.loads(json.dumps(template_sites[i % len(template_sites)]))
+        site_id = str(i + 1)
+        site["id"] = site_id
+        site["site_id"] = site_id
+        site["name"] = f"{site['name']} #{i + 1}"
+        fixture.append(site)
+    return fixture
+
+
+def write_fixture(directory, n_sites, template_path=None):
+    """Write a fixture sites.json of n_sites into directory and return its path"""
+    with open(template_path or os.path.join(BACKEND_DIR, "sites.json"), "r") as f:
+        template_sites = json.load(f)
+    path = os.path.join(directory, "sites.json")
+    with open(path, "w") as f:
+        json.dump(make_fixture_sites(template_sites, n_sites), f, indent=2)
+    return path
+
+
+def wait_until_ready(base_url, path, timeout=60):
+    """
+    Poll path until it answers 200 (or 404: the server has no such endpoint)
+    Returns: True when ready, False after timeout seconds
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(base_url + path, timeout=1).status_code in (200, 404):
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def start_local_server(module_name, sites_path, forecasts_dir):
+    """
+    Import server.py / server_simple.py against the fixture files and the local
+    Mongo stand-in, and serve it from a background thread on a free port once
+    /ready reports the database connected and the warm-up done
+    """
+    from werkzeug.serving import make_server
+
+    os.environ["SITES_FILE"] = sites_path
+    os.environ["FORECASTS_DIR"] = forecasts_dir
+    os.environ["MONGO_URI"] = f"local://{sites_path}"
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    module = importlib.import_module(module_name)
+
+    # Same threaded WSGI server that app.run() uses
+    server = make_server("127.0.0.1", 0, module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    if not wait_until_ready(base_url, "/ready"):
+        server.shutdown()
+        raise SystemExit(f"{module_name} was not ready within 60s")
+    return server, base_url
+
+
+def start_asgi_server(sites_path, forecasts_dir, workers):
+    """Run server_async under uvicorn with several workers in a subprocess"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    env = dict(
+        os.environ,
+        SITES_FILE=sites_path,
+        FORECASTS_DIR=forecasts_dir,
+        MONGO_URI=f"local://{sites_path}",
+    )
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "server_async:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    if wait_until_ready(base_url, "/health", timeout=30):
+        return process, base_url
+    process.terminate()
+    raise SystemExit("server_async did not come up within 30s")
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _client(base_url, mix, n_requests, deadline, seed, samples, lock):
+    """One closed-loop client: issue requests back to back until done"""
+    rng = random.Random(seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    session = requests.Session()
+    sent = 0
+    while sent < n_requests and time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path = ENDPOINTS[name]
+        start = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, timeout=120)
+            ok = response.status_code < 400
+            response.content  # make sure the body is fully read
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples.append((name, elapsed, ok))
+        sent += 1
+    session.close()
+
+
+def run_level(base_url, mix, concurrency, n_requests, duration, seed=0):
+    """
+    Run one concurrency level. Each client sends n_requests // concurrency
+    requests, or keeps going until duration seconds pass if duration is set.
+    """
+    samples = []
+    lock = threading.Lock()
+    per_client = max(1, n_requests // concurrency) if not duration else sys.maxsize
+    start = time.perf_counter()
+    deadline = start + duration if duration else float("inf")
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(concurrency):
+            pool.submit(
+                _client, base_url, mix, per_client, deadline, seed + i, samples, lock
+            )
+    wall = time.perf_counter() - start
+    return summarize(samples, wall, concurrency)
+
+
+def summarize(samples, wall, concurrency):
+    """Per-endpoint and overall latency/throughput/error statistics"""
+    report = {"concurrency": concurrency, "wall_s": wall, "endpoints": {}}
+    groups = {}
+    for name, elapsed, ok in samples:
+        groups.setdefault(name, []).append((elapsed, ok))
+    groups["all"] = [(elapsed, ok) for _, elapsed, ok in samples]
+
+    for name, rows in groups.items():
+        latencies = sorted(elapsed for elapsed, _ in rows)
+        errors = sum(1 for _, ok in rows if not ok)
+        report["endpoints"][name] = {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "throughput_rps": len(rows) / wall if wall > 0 else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    return report
+
+
+def print_report(report):
+    print(f"\nConcurrency {report['concurrency']} ({report['wall_s']:.1f}s)")
+    print(
+        f"  {'endpoint':<10} {'reqs':>6} {'err%':>6} {'rps':>8} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for name, stats in report["endpoints"].items():
+        print(
+            f"  {name:<10} {stats['requests']:>6} {stats['error_rate'] * 100:>5.1f}% "
+            f"{stats['throughput_rps']:>8.1f} {stats['p50_ms']:>9.1f} "
+            f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}"
+        )
+
+
+def parse_mix(endpoints, weights):
+    names = [name.strip() for name in endpoints.split(",") if name.strip()]
+    for name in names:
+        if name not in ENDPOINTS:
+            raise SystemExit(
+                f"Unknown endpoint '{name}' (choose from {list(ENDPOINTS)})"
+            )
+    if weights:
+        values = [float(w) for w in weights.split(",")]
+        if len(values) != len(names):
+            raise SystemExit("--weights needs one value per endpoint")
+    else:
+        values = [1.0] * len(names)
+    return list(zip(names, values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="Target a running server instead of a local one")
+    parser.add_argument(
+        "--server",
+        default="server",
+        choices=["server", "server_simple", "server_async"],
+        help="Backend module to start locally (ignored with --url)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=2, help="uvicorn workers for server_async"
+    )
+    parser.add_argument("--sites", type=int, default=5, help="Fixture fleet size")
+    parser.add_argument("--template", help="sites.json to build the fixture from")
+    parser.add_argument("--forecasts-dir", default=DEFAULT_FORECASTS_DIR)
+    parser.add_argument("--endpoints", default="health,sites,optimize")
+    parser.add_argument("--weights", help="Relative request mix, e.g. 10,5,1")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument(
+        "--requests", type=int, default=100, help="Requests per concurrency level"
+    )
+    parser.add_argument(
+        "--duration", type=float, help="Seconds per level (overrides --requests)"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the reports to this file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.endpoints, args.weights)
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    server = None
+    process = None
+    tmpdir = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        tmpdir = tempfile.TemporaryDirectory(prefix="mara-load-")
+        sites_path = write_fixture(tmpdir.name, args.sites, args.template)
+        forecasts_dir = os.path.abspath(args.forecasts_dir)
+        if args.server == "server_async":
+            process, base_url = start_asgi_server(
+                sites_path, forecasts_dir, args.workers
+            )
+        else:
+            server, base_url = start_local_server(
+                args.server, sites_path, forecasts_dir
+            )
+        print(f"Started {args.server} with {args.sites} fixture sites at {base_url}")
+
+    reports = []
+    try:
+        for concurrency in levels:
+            report = run_level(
+                base_url, mix, concurrency, args.requests, args.duration, args.seed
+            )
+            print_report(report)
+            reports.append(report)
+    finally:
+        if server is not None:
+            server.shutdown()
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+In-memory stand-in for the parts of pymongo the backend uses.
+
+Lets server.py run without a MongoDB Atlas connection, e.g. for load testing:
+
+    MONGO_URI=local://fixtures/sites.json python server.py
+"""
+
+import copy
+import hashlib
+import json
+import threading
+
+try:
+    from bson import ObjectId
+except ImportError:  # pymongo not installed
+    ObjectId = None
+
+
+LOCAL_URI_PREFIX = "local://"
+
+
+def _matches(doc, query):
+    """Equality match on (possibly dotted) top-level fields"""
+    for key, expected in (query or {}).items():
+        value = doc
+        for part in key.split("."):
+            if not isinstance(value, dict) or part not in value:
+                return False
+            value = value[part]
+        if value != expected:
+            return False
+    return True
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+class UpdateResult:
+    def __init__(self, matched_count, modified_count, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class LocalCollection:
+    """Thread-safe list of documents with a pymongo-like interface"""
+
+    def __init__(self, name):
+        self.name = name
+        self._docs = []
+        self._lock = threading.Lock()
+
+    def _new_id(self):
+        return ObjectId() if ObjectId is not None else str(len(self._docs) + 1)
+
+    def insert_one(self, doc):
+        doc = copy.deepcopy(doc)
+        with self._lock:
+            doc.setdefault("_id", self._new_id())
+            self._docs.append(doc)
+        return InsertOneResult(doc["_id"])
+
+    def insert_many(self, docs):
+        return InsertManyResult([self.insert_one(doc).inserted_id for doc in docs])
+
+    def find(self, query=None):
+        with self._lock:
+            return [copy.deepcopy(d) for d in self._docs if _matches(d, query)]
+
+    def find_one(self, query=None):
+        with self._lock:
+            for doc in self._docs:
+                if _matches(doc, query):
+                    return copy.deepcopy(doc)
+        return None
+
+    def count_documents(self, query=None):
+        with self._lock:
+            return sum(1 for d in self._docs if _matches(d, query))
+
+    def update_one(self, query, update, upsert=False):
+        with self._lock:
+            for doc in self._docs:
+                if _matches(doc, query):
+                    for path, value in update.get("$set", {}).items():
+                        _set_path(doc, path, copy.deepcopy(value))
+                    return UpdateResult(1, 1)
+            if not upsert:
+                return UpdateResult(0, 0)
+            doc = copy.deepcopy(query)
+            for path, value in update.get("$set", {}).items():
+                _set_path(doc, path, copy.deepcopy(value))
+            doc.setdefault("_id", self._new_id())
+            self._docs.append(doc)
+            return UpdateResult(0, 0, doc["_id"])
+
+    def delete_one(self, query):
+        with self._lock:
+            for i, doc in enumerate(self._docs):
+                if _matches(doc, query):
+                    del self._docs[i]
+                    return DeleteResult(1)
+        return DeleteResult(0)
+
+
+class LocalDatabase:
+    def __init__(self, name):
+        self.name = name
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = LocalCollection(name)
+            return self._collections[name]
+
+
+class _Admin:
+    def command(self, name, *args, **kwargs):
+        return {"ok": 1.0}
+
+
+class LocalMongoClient:
+    """Drop-in for MongoClient(...) backed by process memory"""
+
+    def __init__(self, *args, **kwargs):
+        self.admin = _Admin()
+        self._databases = {}
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = LocalDatabase(name)
+        return self._databases[name]
+
+    def close(self):
+        pass
+
+
+def is_local_uri(uri):
+    return uri.startswith(LOCAL_URI_PREFIX)
+
+
+def client_from_uri(uri, db_name, collection_name):
+    """
+    Build a LocalMongoClient for a local:// URI, seeding the sites collection
+    from the JSON file named in the URI (if any)
+    """
+    client = LocalMongoClient()
+    seed_path = uri[len(LOCAL_URI_PREFIX) :]
+    if seed_path:
+        with open(seed_path, "r") as f:
+            docs = json.load(f)
+        # Ids derived from the seed position, so every worker process seeded
+        # from the same file sees the same _ids, as with one shared database
+        for i, doc in enumerate(docs):
+            if "_id" not in doc:
+                digest = hashlib.blake2b(str(i).encode(), digest_size=12).digest()
+                doc["_id"] = ObjectId(digest) if ObjectId is not None else digest.hex()
+        client[db_name][collection_name].insert_many(docs)
+    return client
+
+
+class _AsyncCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    async def to_list(self, length=None):
+        return self._docs if length is None else self._docs[:length]
+
+
+class AsyncLocalCollection:
+    """motor-style async view over a LocalCollection"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, query=None):
+        return _AsyncCursor(self._collection.find(query))
+
+    async def find_one(self, query=None):
+        return self._collection.find_one(query)
+
+    async def update_one(self, query, update, upsert=False):
+        return self._collection.update_one(query, update, upsert=upsert)
+
+
+class AsyncLocalDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name):
+        return AsyncLocalCollection(self._database[name])
+
+
+class _AsyncAdmin:
+    async def command(self, name, *args, **kwargs):
+        return {"ok": 1.0}
+
+
+class AsyncLocalMongoClient:
+    """Drop-in for motor's AsyncIOMotorClient(...) backed by a LocalMongoClient"""
+
+    def __init__(self, client=None):
+        self._client = client or LocalMongoClient()
+        self.admin = _AsyncAdmin()
+
+    def __getitem__(self, name):
+        return AsyncLocalDatabase(self._client[name])
+
+    def close(self):
+        pass
@@ -1,12 +1,43 @@
+import time
+
 import pulp
 
+from schedule_codec import run_lengths
+from solve_history import record_solve
+from solver_control import fall_back, greedy_fill, report_line, seed, solve
+
 
-def optimize_dispatch(r_hash, r_tok, power, N, h, g, e, P_MAX):
+def optimize_dispatch(
+    r_hash,
+    r_tok,
+    power,
+    N,
+    h,
+    g,
+    e,
+    P_MAX,
+    run_length=False,
+    time_limit=None,
+    gap_rel=None,
+    warm_start=True,
+    return_report=False,
+    switch_cost=0.0,
+    energy_cap=None,
+):
     """
     r_hash, r_tok, power, N: dicts keyed by device-name
     h, g, e: lists of length T of hash_price, token_price, energy_price
     P_MAX: scalar max power
+    run_length: return {device: [(t_start, t_end_exclusive, count)]} segments
+        instead of one count per interval
+    time_limit, gap_rel: CBC budget in seconds / relative MIP gap target
+    warm_start: seed CBC with the best constant (never switching) schedule
+    return_report: return (schedule, solver_control report)
+    switch_cost: cost charged for every interval in which the configuration
+        changes (on top of the forced downtime)
+    energy_cap: upper bound on the energy cost sum(power * e * x) over T
     """
+    started = time.perf_counter()
     devices = list(r_hash.keys())
     T = len(h)
 
@@ -14,7 +45,13 @@ def optimize_dispatch(r_hash, r_tok, power, N, h, g, e, P_MAX):
     prob = pulp.LpProblem("compute_arbitrage", pulp.LpMaximize)
 
     # 2) Variables
-    x = pulp.LpVariable.dicts("x", (devices, range(T)), lowBound=0, cat="Integer")
+    x = {
+        d: {
+            t: pulp.LpVariable(f"x_{d}_{t}", lowBound=0, upBound=N[d], cat="Integer")
+            for t in range(T)
+        }
+        for d in devices
+    }
     y = pulp.LpVariable.dicts("y", range(1, T), lowBound=0, upBound=1, cat="Binary")
 
     # 3) Objective
@@ -22,7 +59,7 @@ def optimize_dispatch(r_hash, r_tok, power, N, h, g, e, P_MAX):
         (r_hash[d] * h[t] + r_tok[d] * g[t] - power[d] * e[t]) * x[d][t]
         for d in devices
         for t in range(T)
-    )
+    ) - switch_cost * pulp.lpSum(y.values())
 
     # 4) Power constraint
     for t in range(T):
@@ -37,13 +74,50 @@ def optimize_dispatch(r_hash, r_tok, power, N, h, g, e, P_MAX):
             # force offline during change
             prob += x[d][t] <= N[d] * (1 - y[t])
 
-    # 6) Solve
-    status = prob.solve(pulp.PULP_CBC_CMD(msg=False))
-    print("Status:", pulp.LpStatus[status])
-    print("Total Profit:", pulp.value(prob.objective))
+    if energy_cap is not None:
+        prob += (
+            pulp.lpSum(power[d] * e[t] * x[d][t] for d in devices for t in range(T))
+            <= energy_cap
+        )
+
+    # 6) Heuristic: the best constant configuration needs no changes (y = 0)
+    profit = {
+        d: sum(r_hash[d] * h[t] + r_tok[d] * g[t] - power[d] * e[t] for t in range(T))
+        for d in devices
+    }
+    energy = {d: sum(power[d] * e[t] for t in range(T)) for d in devices}
+    constant, _ = greedy_fill(profit, power, N, P_MAX, cost=energy, budget=energy_cap)
+    if warm_start:
+        seed(
+            {(d, t): x[d][t] for d in devices for t in range(T)},
+            {(d, t): constant[d] for d in devices for t in range(T)},
+        )
+        seed(y, {})
+
+    # 7) Solve within the budget
+    build_time = time.perf_counter() - started
+    report = solve(prob, time_limit=time_limit, gap_rel=gap_rel, warm_start=warm_start)
+
+    # 8) Extract schedule, falling back to the heuristic without an incumbent
+    if report["has_incumbent"]:
+        schedule = {d: [int(round(x[d][t].value())) for t in range(T)] for d in devices}
+    else:
+        schedule = {d: [constant[d]] * T for d in devices}
+        fall_back(report, sum(profit[d] * constant[d] for d in devices))
+    record_solve(
+        "optimize_dispatch",
+        prob,
+        report,
+        (r_hash, r_tok, power, N, h, g, e, P_MAX, switch_cost, energy_cap),
+        build_time,
+    )
+    print("Status:", report["status"], f"({report_line(report)})")
+    print("Total Profit:", report["objective"])
 
-    # 7) Extract schedule
-    schedule = {d: [int(x[d][t].value()) for t in range(T)] for d in devices}
+    if run_length:
+        schedule = {d: run_lengths(seq) for d, seq in schedule.items()}
+    if return_report:
+        return schedule, report
     return schedule
 
 
@@ -1,8 +1,20 @@
 import pulp
 import json
+import time
+
+from solver_control import (
+    SOLVE_MODES,
+    fall_back,
+    greedy_fill,
+    relative_gap,
+    report_line,
+    round_and_repair,
+    seed,
+    solve,
+)
+from solve_history import record_solve
 
 # from autogluon.timeseries import TimeSeriesPredictor  # Temporarily commented out
-import pandas as pd
 
 
 def extract_site_params(sites_data):
@@ -68,7 +80,16 @@ def optimize_static_config(
     e,  # e[s][t]
     P_MAX,  # P_MAX[s]
     E_BUDGET,  # total energy-$ budget
+    time_limit=None,  # seconds; None = no limit
+    gap_rel=None,  # relative MIP gap target; None = CBC default
+    warm_start=True,  # seed CBC with the greedy heuristic solution
+    return_report=False,  # also return the solver_control report
+    mode="exact",  # "fast": round the LP relaxation instead of solving the MILP
 ):
+    if mode not in SOLVE_MODES:
+        raise ValueError(f"Unknown mode '{mode}' (choose from {SOLVE_MODES})")
+    started = time.perf_counter()
+
     # 1) Precompute profit & energy sums over T
     profit_coeff = {
         s: {
@@ -113,13 +134,90 @@ def optimize_static_config(
         "energy_budget",
     )
 
-    # 6) Solve
-    status = prob.solve(pulp.PULP_CBC_CMD(msg=False))
-    print("Status:", pulp.LpStatus[status])
-    print("Max Total Profit:", pulp.value(prob.objective))
+    inputs = (sites, devices, T, r_hash, r_tok, power, N, h, g, e, P_MAX, E_BUDGET)
+    if mode == "fast":
+        build_time = time.perf_counter() - started
+        config, report = _solve_rounded(
+            prob, x, profit_coeff, energy_coeff, power, N, P_MAX, E_BUDGET, time_limit
+        )
+        record_solve("optimize_static_config", prob, report, inputs, build_time)
+        print("Status:", report["status"], f"({report_line(report)})")
+        print("Max Total Profit:", report["objective"])
+        return (config, report) if return_report else config
+
+    # 6) Greedy heuristic: per site by profit per watt, within the budget
+    heuristic = {}
+    spent = 0.0
+    for s in sites:
+        counts, used = greedy_fill(
+            profit_coeff[s],
+            power[s],
+            N[s],
+            P_MAX[s],
+            cost=energy_coeff[s],
+            budget=E_BUDGET - spent,
+        )
+        spent += used
+        heuristic.update({(s, d): n for d, n in counts.items()})
+    if warm_start:
+        seed(x, heuristic)
+
+    # 7) Solve within the budget
+    build_time = time.perf_counter() - started
+    report = solve(prob, time_limit=time_limit, gap_rel=gap_rel, warm_start=warm_start)
+    report["mode"] = "exact"
+
+    # 8) Extract config, falling back to the heuristic without an incumbent
+    if report["has_incumbent"]:
+        config = {(s, d): int(round(x[s, d].value())) for s in sites for d in devices}
+    else:
+        config = heuristic
+        fall_back(
+            report, sum(profit_coeff[s][d] * n for (s, d), n in heuristic.items())
+        )
+    record_solve("optimize_static_config", prob, report, inputs, build_time)
+    print("Status:", report["status"], f"({report_line(report)})")
+    print("Max Total Profit:", report["objective"])
+
+    if return_report:
+        return config, report
+    return config
 
-    # 7) Extract config
-    return {(s, d): int(x[s, d].value()) for s in sites for d in devices}
+
+def _solve_rounded(
+    prob, x, profit_coeff, energy_coeff, power, N, P_MAX, E_BUDGET, time_limit
+):
+    """
+    Fast mode: LP relaxation, rounded with a repair step that keeps every
+    power_cap_{s} and the energy_budget satisfied. The LP optimum bounds the
+    MILP optimum, so the reported gap is certified.
+    """
+    report = solve(prob, time_limit=time_limit, relax=True)
+    keys = list(x)
+    relaxed = {
+        k: (x[k].value() or 0.0) if report["has_incumbent"] else 0.0 for k in keys
+    }
+    profit = {(s, d): profit_coeff[s][d] for s, d in keys}
+    caps = {}
+    for s, d in keys:
+        caps.setdefault(s, {})[s, d] = power[s][d]
+    constraints = [(coeffs, P_MAX[s]) for s, coeffs in caps.items()]
+    constraints.append(({(s, d): energy_coeff[s][d] for s, d in keys}, E_BUDGET))
+    config = round_and_repair(
+        relaxed, profit, {(s, d): N[s][d] for s, d in keys}, constraints
+    )
+
+    objective = sum(profit[k] * n for k, n in config.items())
+    bound = report["objective"] if report["termination"] == "optimal" else None
+    report.update(
+        termination="rounded",
+        objective=objective,
+        bound=bound,
+        gap=relative_gap(objective, bound),
+        has_incumbent=True,
+        mode="fast",
+    )
+    return config, report
 
 
 if __name__ == "__main__":
@@ -142,33 +240,10 @@ if __name__ == "__main__":
         extract_site_params(sites_data)
     )
 
-    # Read CSV forecasts
-    import pandas as pd
-
-    # Hash price forecast
-    h = pd.read_csv("../datasets/forecasts/hash_forecast.csv").iloc[:, 1].tolist()[:T]
-
-    # Token price forecast
-    g = pd.read_csv("../datasets/forecasts/token_forecast.csv").iloc[:, 1].tolist()[:T]
-
-    # Energy price forecasts per state
-    e_states = {
-        "California": pd.read_csv("../datasets/forecasts/cali_energy_forecast.csv")
-        .iloc[:, 1]
-        .tolist()[:T],
-        "Texas": pd.read_csv("../datasets/forecasts/texas_energy_forecast.csv")
-        .iloc[:, 1]
-        .tolist()[:T],
-        "Ohio": pd.read_csv("../datasets/forecasts/ohio_energy_forecast.csv")
-        .iloc[:, 1]
-        .tolist()[:T],
-        "Nevada": pd.read_csv("../datasets/forecasts/nevada_energy_forecast.csv")
-        .iloc[:, 1]
-        .tolist()[:T],
-        "Wyoming": pd.read_csv("../datasets/forecasts/wyoming_energy_forecast.csv")
-        .iloc[:, 1]
-        .tolist()[:T],
-    }
+    # Forecasts, aligned on timestamp across series
+    from site_optimizer import load_forecasts
+
+    h, g, e_states = load_forecasts("../datasets/forecasts", T)
 
     # Map energy prices to sites based on their states
     e = {site: e_states[state] for site, state in site_states.items()}
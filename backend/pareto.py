@@ -0,0 +1,311 @@
+"""
+Profit vs. emissions Pareto frontier of the static allocation.
+
+Emissions of one machine over the horizon are the site's carbonIntensity
+(kg CO2 per kWh) times the machine's energy use. The frontier is traced with
+the epsilon-constraint method: maximize profit subject to the
+optimize_static_config constraints plus emissions <= eps, for a grid of eps
+between zero and the emissions of the profit-only optimum.
+
+The grid is split into contiguous chunks, one per worker process. Each worker
+builds the pulp model once and solves its chunk in ascending eps, changing
+only the emissions_cap right-hand side. Every solve is warm-started from the
+previous solution, which is still feasible under the looser cap. Frontiers
+are cached per sites / forecast version.
+
+    python pareto.py --points 9 --workers 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pulp
+
+from optimization_function_multiple_sites import extract_site_params
+from price_cube import files_version, load_forecast_cube
+from site_optimizer import collect_devices, energy_budget, load_forecasts, load_sites
+from solver_control import solve
+
+# Per-process model state, set once by _init_worker
+_ctx = {}
+
+
+def _init_worker(context):
+    _ctx.clear()
+    _ctx.update(context)
+
+
+def build_context(sites_data, h, g, e_states, T, E_BUDGET=None):
+    """Per-(site, device) profit, energy and emissions coefficients over T"""
+    devices = collect_devices(sites_data)
+    sites, power, N, P_MAX, energy_prices, site_states, r_hash, r_tok = (
+        extract_site_params(sites_data)
+    )
+    carbon = {site["id"]: site.get("carbonIntensity", 0.0) for site in sites_data}
+    hours = T * 5 / 60
+    items = [(s, d) for s in sites for d in devices if N[s][d] > 0]
+    e = {s: e_states[site_states[s]] for s in sites}
+    return {
+        "sites": sites,
+        "items": items,
+        "profit": {
+            (s, d): sum(
+                r_hash[s][d] * h[t] + r_tok[s][d] * g[t] - power[s][d] * e[s][t]
+                for t in range(T)
+            )
+            for s, d in items
+        },
+        "energy": {
+            (s, d): sum(power[s][d] * e[s][t] for t in range(T)) for s, d in items
+        },
+        # W -> kW, times hours over the horizon, times kg CO2 per kWh
+        "emissions": {(s, d): carbon[s] * power[s][d] / 1000 * hours for s, d in items},
+        "power": {(s, d): power[s][d] for s, d in items},
+        "N": {(s, d): N[s][d] for s, d in items},
+        "P_MAX": P_MAX,
+        "E_BUDGET": energy_budget(sites_data) if E_BUDGET is None else E_BUDGET,
+    }
+
+
+def _model():
+    """The epsilon-constrained model, built once per process"""
+    if "prob" in _ctx:
+        return _ctx["prob"], _ctx["x"]
+
+    items = _ctx["items"]
+    prob = pulp.LpProblem("pareto_static", pulp.LpMaximize)
+    x = {
+        (s, d): pulp.LpVariable(
+            f"x_{s}_{d}", lowBound=0, upBound=_ctx["N"][s, d], cat="Integer"
+        )
+        for s, d in items
+    }
+    prob += pulp.lpSum(_ctx["profit"][k] * x[k] for k in items)
+    by_site = {s: [] for s in _ctx["sites"]}
+    for k in items:
+        by_site[k[0]].append(k)
+    for s, keys in by_site.items():
+        prob += (
+            pulp.lpSum(_ctx["power"][k] * x[k] for k in keys) <= _ctx["P_MAX"][s],
+            f"power_cap_{s}",
+        )
+    prob += (
+        pulp.lpSum(_ctx["energy"][k] * x[k] for k in items) <= _ctx["E_BUDGET"],
+        "energy_budget",
+    )
+    prob += (
+        pulp.lpSum(_ctx["emissions"][k] * x[k] for k in items) <= 0,
+        "emissions_cap",
+    )
+    _ctx["prob"], _ctx["x"] = prob, x
+    return prob, x
+
+
+def _seed(eps):
+    """Feasible start: greedy by profit per kg CO2 under every constraint"""
+    profit, emissions = _ctx["profit"], _ctx["emissions"]
+    power, energy = _ctx["power"], _ctx["energy"]
+    room = dict(_ctx["P_MAX"])
+    budget, cap = _ctx["E_BUDGET"], eps
+    counts = {k: 0 for k in _ctx["items"]}
+
+    def ratio(k):
+        return profit[k] / emissions[k] if emissions[k] > 0 else float("inf")
+
+    for k in sorted(_ctx["items"], key=ratio, reverse=True):
+        if profit[k] <= 0:
+            continue
+        n = _ctx["N"][k]
+        for used, left in (
+            (power[k], room[k[0]]),
+            (energy[k], budget),
+            (emissions[k], cap),
+        ):
+            if used > 0:
+                n = min(n, int(left // used))
+        n = max(int(n), 0)
+        counts[k] = n
+        room[k[0]] -= n * power[k]
+        budget -= n * energy[k]
+        cap -= n * emissions[k]
+    return counts
+
+
+def _point(x, report, eps):
+    allocation = {k: int(round(var.value() or 0)) for k, var in x.items()}
+    return {
+        "eps": eps,
+        "profit": sum(_ctx["profit"][k] * n for k, n in allocation.items()),
+        "emissions": sum(_ctx["emissions"][k] * n for k, n in allocation.items()),
+        "termination": report["termination"],
+        "gap": report["gap"],
+        "allocation": allocation,
+    }
+
+
+def _solve_chunk(task):
+    """Solve a chunk of ascending eps values, each warm-started from the last"""
+    eps_values, time_limit, gap_rel = task
+    prob, x = _model()
+    cap = prob.constraints["emissions_cap"]
+    start = _seed(eps_values[0])
+
+    points = []
+    for eps in eps_values:
+        cap.changeRHS(eps)
+        for k, var in x.items():
+            var.setInitialValue(start[k])
+        report = solve(prob, time_limit=time_limit, gap_rel=gap_rel, warm_start=True)
+        if report["has_incumbent"]:
+            point = _point(x, report, eps)
+            start = point["allocation"]
+        else:
+            # Keep the (still feasible) previous start as this point
+            for k, var in x.items():
+                var.varValue = start[k]
+            point = _point(x, {**report, "termination": "heuristic"}, eps)
+        points.append(point)
+    return points
+
+
+def non_dominated(points):
+    """Points not beaten on both profit (higher) and emissions (lower)"""
+    frontier = []
+    for point in sorted(points, key=lambda p: (p["emissions"], -p["profit"])):
+        if not frontier or point["profit"] > frontier[-1]["profit"] + 1e-6:
+            frontier.append(point)
+    return frontier
+
+
+def pareto_frontier(
+    sites_data,
+    h,
+    g,
+    e_states,
+    T=12,
+    points=9,
+    E_BUDGET=None,
+    time_limit=None,
+    gap_rel=None,
+    workers=None,
+):
+    """
+    Returns: {"points": non-dominated [{eps, profit, emissions, termination,
+        gap, allocation {(site, device): count}}] sorted by emissions,
+        "solves": number of MILP solves, "solve_time"}
+    """
+    started = time.perf_counter()
+    context = build_context(sites_data, h, g, e_states, T, E_BUDGET=E_BUDGET)
+
+    # 1) The profit-only optimum bounds the emissions range (a cap above the
+    #    fleet's total possible emissions does not bind)
+    _init_worker(context)
+    uncapped = sum(context["emissions"][k] * context["N"][k] for k in context["items"])
+    top = _solve_chunk(([uncapped + 1.0], time_limit, gap_rel))[0]
+    max_emissions = top["emissions"]
+    grid = [max_emissions * i / (points - 1) for i in range(points - 1)]
+
+    # 2) Contiguous ascending chunks, one per worker
+    workers = max(1, min(workers or os.cpu_count() or 1, len(grid)))
+    size = -(-len(grid) // workers) if grid else 1
+    tasks = [
+        (grid[i : i + size], time_limit, gap_rel) for i in range(0, len(grid), size)
+    ]
+    if workers == 1:
+        chunks = [_solve_chunk(task) for task in tasks]
+    else:
+        # spawn, not fork: the server's driver and scheduler threads may hold
+        # locks that a forked child would inherit. Spawned workers re-import
+        # the caller's __main__, so it must keep startup side effects behind
+        # a main-process check (server.SERVING_PROCESS)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(context,),
+        ) as pool:
+            chunks = list(pool.map(_solve_chunk, tasks))
+
+    solved = [point for chunk in chunks for point in chunk] + [top]
+    return {
+        "points": non_dominated(solved),
+        "solves": len(solved),
+        "solve_time": time.perf_counter() - started,
+    }
+
+
+# (sites version, forecast version, T, points, budget) -> frontier
+_frontier_cache = {}
+# pareto_frontier uses this process's _ctx, so callers take turns
+_frontier_lock = threading.Lock()
+
+
+def pareto_frontier_file(sites_file, forecasts_dir, T=12, points=9, **kwargs):
+    """
+    pareto_frontier for sites_file on the current forecasts, computed once per
+    sites / forecast version
+    Returns: (frontier, cached)
+    """
+    with _frontier_lock:
+        cube = load_forecast_cube(forecasts_dir)
+        key = (
+            files_version([sites_file]),
+            cube.version,
+            T,
+            points,
+            tuple(sorted(kwargs.items())),
+        )
+        if key in _frontier_cache:
+            return _frontier_cache[key], True
+
+        h, g, e_states = load_forecasts(forecasts_dir, T)
+        frontier = pareto_frontier(
+            load_sites(sites_file), h, g, e_states, T=T, points=points, **kwargs
+        )
+        # Older versions can never be requested again
+        _frontier_cache.clear()
+        _frontier_cache[key] = frontier
+        return frontier, False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profit vs. emissions frontier")
+    parser.add_argument("--sites-file", default=os.getenv("SITES_FILE", "sites.json"))
+    parser.add_argument(
+        "--forecasts-dir",
+        default=os.getenv("FORECASTS_DIR", "../datasets/forecasts"),
+    )
+    parser.add_argument("--T", type=int, default=12)
+    parser.add_argument("--points", type=int, default=9)
+    parser.add_argument("--time-limit", type=float, help="Seconds per solve")
+    parser.add_argument("--gap", type=float, help="Relative MIP gap per solve")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    frontier, _ = pareto_frontier_file(
+        args.sites_file,
+        args.forecasts_dir,
+        T=args.T,
+        points=args.points,
+        time_limit=args.time_limit,
+        gap_rel=args.gap,
+        workers=args.workers,
+    )
+    print(
+        f"{len(frontier['points'])} non-dominated points from "
+        f"{frontier['solves']} solves in {frontier['solve_time']:.2f}s\n"
+    )
+    print(f"{'emissions kg':>14} {'profit':>18} {'termination':>12}")
+    for point in frontier["points"]:
+        print(
+            f"{point['emissions']:>14,.1f} {point['profit']:>18,.2f} "
+            f"{point['termination']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
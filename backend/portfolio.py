@@ -0,0 +1,357 @@
+"""
+Headless portfolio runs of optimize_static_config over many fleets.
+
+A portfolio is a set of scenarios, each one fleet file (sites.json format)
+with a horizon T, energy budget, forecast directory (forecast version) and
+window start. Scenarios come from either
+
+  - a directory of fleet files, crossed with the --T / --energy-budget /
+    --forecasts-dir grids, or
+  - a manifest: .jsonl with one scenario per line (streamed) or .json with a
+    list, e.g. {"fleet": "buildout_a.json", "T": 24, "energy_budget": 2e9,
+    "forecasts_dir": "../datasets/forecasts", "name": "a-24h"}; relative
+    paths are resolved against the manifest's directory.
+
+Scenarios are solved in parallel across a process pool. Memory stays bounded
+for any portfolio size: scenarios are read lazily, at most --in-flight are
+queued at a time, workers are recycled after --tasks-per-child solves, and
+results are written in row groups of --batch rows. Output is two columnar
+tables in --out-dir: scenarios (one row per scenario) and allocations (one
+row per scenario, site and device type), as Parquet (requires pyarrow) or
+CSV.
+
+    python portfolio.py buildouts/ --T 12 24 --energy-budget 1e9 2e9 --out-dir out
+    python portfolio.py sweep.jsonl --workers 8 --format csv --out-dir out
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from optimization_function_multiple_sites import extract_site_params
+from site_optimizer import energy_budget, load_forecasts, load_sites, solve_sites
+from solve_history import set_history
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output unavailable, CSV still works
+    pa = pq = None
+
+FORMATS = ("parquet", "csv")
+
+SCENARIO_COLUMNS = (
+    ("scenario", "int64"),
+    ("name", "string"),
+    ("fleet", "string"),
+    ("forecasts_dir", "string"),
+    ("start", "string"),
+    ("T", "int64"),
+    ("energy_budget", "float64"),
+    ("mode", "string"),
+    ("status", "string"),
+    ("error", "string"),
+    ("profit", "float64"),
+    ("energy_spend", "float64"),
+    ("bound", "float64"),
+    ("gap", "float64"),
+    ("termination", "string"),
+    ("solve_time", "float64"),
+    ("sites", "int64"),
+    ("machines", "int64"),
+)
+
+ALLOCATION_COLUMNS = (
+    ("scenario", "int64"),
+    ("site_id", "string"),
+    ("device_type", "string"),
+    ("machines", "int64"),
+    ("power", "float64"),
+)
+
+
+def iter_scenarios(source, Ts=(12,), budgets=(None,), forecasts_dirs=(), mode="exact"):
+    """
+    Scenario dicts {fleet, T, energy_budget, forecasts_dir, start, mode, name}
+    from a directory of fleet files (crossed with the grids) or a manifest
+    """
+    default_forecasts = forecasts_dirs[0] if forecasts_dirs else None
+    if os.path.isdir(source):
+        fleets = sorted(
+            os.path.join(source, f) for f in os.listdir(source) if f.endswith(".json")
+        )
+        # Forecast directory outermost, so workers reuse their cached cube
+        for forecasts_dir in forecasts_dirs:
+            for fleet in fleets:
+                for T in Ts:
+                    for budget in budgets:
+                        yield {
+                            "fleet": fleet,
+                            "T": T,
+                            "energy_budget": budget,
+                            "forecasts_dir": forecasts_dir,
+                            "start": None,
+                            "mode": mode,
+                            "name": os.path.splitext(os.path.basename(fleet))[0],
+                        }
+        return
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        if source.endswith(".jsonl"):
+            entries = (json.loads(line) for line in f if line.strip())
+        else:
+            entries = iter(json.load(f))
+        for entry in entries:
+            fleet = os.path.join(base, entry["fleet"])
+            forecasts_dir = entry.get("forecasts_dir")
+            yield {
+                "fleet": fleet,
+                "T": int(entry.get("T", Ts[0])),
+                "energy_budget": entry.get("energy_budget"),
+                "forecasts_dir": (
+                    os.path.join(base, forecasts_dir)
+                    if forecasts_dir
+                    else default_forecasts
+                ),
+                "start": entry.get("start"),
+                "mode": entry.get("mode", mode),
+                "name": entry.get("name", os.path.splitext(os.path.basename(fleet))[0]),
+            }
+
+
+def _solve_scenario(task):
+    """
+    Solve one scenario in a worker process
+    Returns: (scenario row, allocation rows)
+    """
+    scenario_id, scenario, time_limit, gap_rel = task
+    row = {
+        "scenario": scenario_id,
+        "name": scenario["name"],
+        "fleet": scenario["fleet"],
+        "forecasts_dir": scenario["forecasts_dir"],
+        "start": None if scenario["start"] is None else str(scenario["start"]),
+        "T": scenario["T"],
+        "energy_budget": scenario["energy_budget"],
+        "mode": scenario["mode"],
+    }
+    try:
+        sites_data = load_sites(scenario["fleet"])
+        budget = scenario["energy_budget"]
+        budget = energy_budget(sites_data) if budget is None else float(budget)
+        with contextlib.redirect_stdout(io.StringIO()):
+            config, report = solve_sites(
+                sites_data,
+                scenario["forecasts_dir"],
+                T=scenario["T"],
+                time_limit=time_limit,
+                gap_rel=gap_rel,
+                return_report=True,
+                mode=scenario["mode"],
+                E_BUDGET=budget,
+                start=scenario["start"],
+            )
+    except Exception as e:
+        return {**row, "status": "error", "error": f"{type(e).__name__}: {e}"}, []
+
+    sites, power, N, P_MAX, energy_prices, site_states, r_hash, r_tok = (
+        extract_site_params(sites_data)
+    )
+    _, _, e_states = load_forecasts(
+        scenario["forecasts_dir"], scenario["T"], start=scenario["start"]
+    )
+    spend = sum(
+        power[s][d] * sum(e_states[site_states[s]]) * n for (s, d), n in config.items()
+    )
+    allocations = [
+        {
+            "scenario": scenario_id,
+            "site_id": str(s),
+            "device_type": d,
+            "machines": n,
+            "power": float(power[s][d] * n),
+        }
+        for (s, d), n in config.items()
+        if N[s][d] > 0
+    ]
+    row.update(
+        energy_budget=budget,
+        status="success",
+        error=None,
+        profit=report["objective"],
+        energy_spend=spend,
+        bound=report["bound"],
+        gap=report["gap"],
+        termination=report["termination"],
+        solve_time=report["solve_time"],
+        sites=len(sites),
+        machines=sum(config.values()),
+    )
+    return row, allocations
+
+
+class ColumnarWriter:
+    """Buffers rows per table and writes them out every batch_rows rows"""
+
+    def __init__(self, out_dir, fmt="parquet", batch_rows=10000):
+        if fmt == "parquet" and pa is None:
+            raise RuntimeError("Parquet output needs pyarrow (or use --format csv)")
+        os.makedirs(out_dir, exist_ok=True)
+        self.batch_rows = batch_rows
+        self._tables = {
+            name: {
+                "columns": columns,
+                "path": os.path.join(out_dir, f"{name}.{fmt}"),
+                "rows": [],
+                "writer": None,
+            }
+            for name, columns in (
+                ("scenarios", SCENARIO_COLUMNS),
+                ("allocations", ALLOCATION_COLUMNS),
+            )
+        }
+        self.fmt = fmt
+
+    def add(self, table, rows):
+        state = self._tables[table]
+        state["rows"].extend(rows)
+        if len(state["rows"]) >= self.batch_rows:
+            self._flush(state)
+
+    def _flush(self, state):
+        names = [name for name, _ in state["columns"]]
+        if self.fmt == "parquet":
+            schema = pa.schema([(name, kind) for name, kind in state["columns"]])
+            if state["writer"] is None:
+                state["writer"] = pq.ParquetWriter(state["path"], schema)
+            columns = {n: [row.get(n) for row in state["rows"]] for n in names}
+            state["writer"].write_table(pa.table(columns, schema=schema))
+        else:
+            if state["writer"] is None:
+                state["writer"] = open(state["path"], "w", newline="")
+                csv.writer(state["writer"]).writerow(names)
+            writer = csv.writer(state["writer"])
+            writer.writerows([row.get(n) for n in names] for row in state["rows"])
+        state["rows"].clear()
+
+    def close(self):
+        """Write what is buffered; returns the output paths"""
+        for state in self._tables.values():
+            if state["rows"] or state["writer"] is None:
+                self._flush(state)
+            state["writer"].close()
+        return [state["path"] for state in self._tables.values()]
+
+
+def run_portfolio(
+    scenarios,
+    writer,
+    workers=None,
+    in_flight=None,
+    tasks_per_child=50,
+    time_limit=None,
+    gap_rel=None,
+):
+    """
+    Solve scenarios (any iterable) in parallel and hand results to writer
+    in_flight: most scenarios queued at a time (default 2 per worker)
+    tasks_per_child: solves before a worker process is replaced
+    Returns: {"scenarios", "errors"}
+    """
+    counts = {"scenarios": 0, "errors": 0}
+
+    def collect(result):
+        row, allocations = result
+        counts["scenarios"] += 1
+        counts["errors"] += row["status"] != "success"
+        writer.add("scenarios", [row])
+        writer.add("allocations", allocations)
+
+    tasks = ((i, scenario, time_limit, gap_rel) for i, scenario in enumerate(scenarios))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for task in tasks:
+            collect(_solve_scenario(task))
+        return counts
+
+    in_flight = in_flight or 2 * workers
+    with ProcessPoolExecutor(
+        max_workers=workers, max_tasks_per_child=tasks_per_child
+    ) as pool:
+        pending = set()
+        for task in tasks:
+            if len(pending) >= in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future.result())
+            pending.add(pool.submit(_solve_scenario, task))
+        for future in wait(pending).done:
+            collect(future.result())
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve a portfolio of fleets")
+    parser.add_argument("source", help="Directory of fleet files, or a manifest")
+    parser.add_argument("--T", type=int, nargs="+", default=[12])
+    parser.add_argument("--energy-budget", type=float, nargs="+")
+    parser.add_argument(
+        "--forecasts-dir",
+        nargs="+",
+        default=[os.getenv("FORECASTS_DIR", "../datasets/forecasts")],
+        help="One or more forecast directories (forecast versions)",
+    )
+    parser.add_argument("--mode", choices=("exact", "fast"), default="exact")
+    parser.add_argument("--time-limit", type=float, help="Seconds per solve")
+    parser.add_argument("--gap", type=float, help="Relative MIP gap per solve")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--in-flight", type=int, help="Most scenarios queued")
+    parser.add_argument("--tasks-per-child", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=10000, help="Rows per write")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--out-dir", default="portfolio_out")
+    parser.add_argument(
+        "--history", help="Record solves to this solve history file (default: off)"
+    )
+    args = parser.parse_args()
+    set_history(args.history)
+
+    writer = ColumnarWriter(args.out_dir, args.format, args.batch)
+    scenarios = iter_scenarios(
+        args.source,
+        Ts=args.T,
+        budgets=args.energy_budget or [None],
+        forecasts_dirs=args.forecasts_dir,
+        mode=args.mode,
+    )
+    started = time.perf_counter()
+    try:
+        counts = run_portfolio(
+            scenarios,
+            writer,
+            workers=args.workers,
+            in_flight=args.in_flight,
+            tasks_per_child=args.tasks_per_child,
+            time_limit=args.time_limit,
+            gap_rel=args.gap,
+        )
+    finally:
+        paths = writer.close()
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"Solved {counts['scenarios']} scenarios ({counts['errors']} errors) in "
+        f"{elapsed:.1f}s ({counts['scenarios'] / max(elapsed, 1e-9):.1f}/s)"
+    )
+    for path in paths:
+        print(f"  {path}")
+
+
+if __name__ == "__main__":
+    main()
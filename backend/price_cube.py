@@ -0,0 +1,282 @@
+"""
+Timestamp-aligned price cube.
+
+Every price series (hash, token, per-state energy) is as-of joined onto one
+regular int64 epoch-ns time grid, once, into a (series x time) float array.
+Optimizers then read aligned windows by start time and horizon with O(1)
+index arithmetic instead of slicing each CSV by position, which silently
+misaligned hash_forecast.csv (starts 20:25) against the other forecasts
+(start 20:00).
+
+    cube = load_forecast_cube("../datasets/forecasts")
+    start = cube.common_start()
+    window = cube.window(start, 12)          # (n_series, 12) view
+    h = window[cube.row("hash")]
+"""
+
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Fill policies for grid points without an observation at exactly that time
+FILL_POLICIES = ("ffill", "bfill", "nearest", "interpolate", "none")
+
+FORECAST_FILES = {
+    "hash": "hash_forecast.csv",
+    "token": "token_forecast.csv",
+    "California": "cali_energy_forecast.csv",
+    "Texas": "texas_energy_forecast.csv",
+    "Ohio": "ohio_energy_forecast.csv",
+    "Nevada": "nevada_energy_forecast.csv",
+    "Wyoming": "wyoming_energy_forecast.csv",
+}
+
+HISTORY_FILES = {
+    "hash": "hash_price_timeseries.csv",
+    "token": "token_price_timeseries.csv",
+    "California": "energy_price_cali_timeseries.csv",
+    "Texas": "energy_price_texas_timeseries.csv",
+    "Ohio": "energy_price_ohio_timeseries.csv",
+    "Nevada": "energy_price_nevada_timeseries.csv",
+    "Wyoming": "energy_price_wyoming_timeseries.csv",
+}
+
+
+def to_epoch_ns(ts):
+    """int64 epoch nanoseconds (UTC) for an int, string, datetime or datetime64"""
+    if isinstance(ts, (int, np.integer)):
+        return int(ts)
+    if isinstance(ts, datetime) and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    if isinstance(ts, str):
+        ts = ts.replace(" ", "T")
+        if ts.endswith("Z"):
+            ts = ts[:-1]
+    return int(np.datetime64(ts, "ns").astype(np.int64))
+
+
+def asof_join(grid, times, values, fill="ffill", tolerance=None):
+    """
+    Vectorized as-of join of one (times, values) series onto grid
+    tolerance: max distance (ns) to the observation used; None = unlimited
+    """
+    if fill not in FILL_POLICIES:
+        raise ValueError(f"Unknown fill policy '{fill}' (choose from {FILL_POLICIES})")
+
+    out = np.full(len(grid), np.nan)
+    if len(times) == 0:
+        return out
+
+    if fill == "interpolate":
+        inside = (grid >= times[0]) & (grid <= times[-1])
+        out[inside] = np.interp(grid[inside], times, values)
+        return out
+
+    before = np.searchsorted(times, grid, side="right") - 1
+    after = np.searchsorted(times, grid, side="left")
+    has_before = before >= 0
+    has_after = after < len(times)
+    before_c = np.clip(before, 0, len(times) - 1)
+    after_c = np.clip(after, 0, len(times) - 1)
+    dist_before = np.where(has_before, grid - times[before_c], np.iinfo(np.int64).max)
+    dist_after = np.where(has_after, times[after_c] - grid, np.iinfo(np.int64).max)
+
+    if fill == "ffill":
+        pick, dist, ok = before_c, dist_before, has_before
+    elif fill == "bfill":
+        pick, dist, ok = after_c, dist_after, has_after
+    elif fill == "nearest":
+        use_after = dist_after < dist_before
+        pick = np.where(use_after, after_c, before_c)
+        dist = np.minimum(dist_before, dist_after)
+        ok = has_before | has_after
+    else:  # "none": exact timestamps only
+        pick, dist, ok = before_c, dist_before, has_before
+        tolerance = 0
+
+    if tolerance is not None:
+        ok = ok & (dist <= tolerance)
+    out[ok] = values[pick[ok]]
+    return out
+
+
+class PriceCube:
+    def __init__(self, names, start_ns, step_ns, values, version=None):
+        """
+        names: series names, one per row of values
+        start_ns, step_ns: the regular grid is start_ns + i * step_ns
+        values: (n_series, n_times) float array, NaN where a series has no data
+        """
+        self.names = list(names)
+        self.start_ns = int(start_ns)
+        self.step_ns = int(step_ns)
+        self.values = values
+        self.version = version
+        self._rows = {name: i for i, name in enumerate(self.names)}
+        # First / last valid grid position of each series
+        valid = ~np.isnan(values)
+        any_valid = valid.any(axis=1)
+        self._first = np.where(any_valid, valid.argmax(axis=1), len(self))
+        self._last = np.where(
+            any_valid, values.shape[1] - 1 - valid[:, ::-1].argmax(axis=1), -1
+        )
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    @property
+    def index(self):
+        """int64 epoch-ns timestamps of the grid"""
+        return self.start_ns + self.step_ns * np.arange(len(self), dtype=np.int64)
+
+    @property
+    def end_ns(self):
+        return self.start_ns + self.step_ns * (len(self) - 1)
+
+    def row(self, name):
+        return self._rows[name]
+
+    def series(self, name):
+        return self.values[self._rows[name]]
+
+    def position(self, ts):
+        """Grid position of the last grid point at or before ts (O(1))"""
+        return (to_epoch_ns(ts) - self.start_ns) // self.step_ns
+
+    def timestamp(self, position):
+        return self.start_ns + self.step_ns * int(position)
+
+    def common_start(self, names=None):
+        """First grid time at which every named series has data"""
+        rows = [self._rows[n] for n in names] if names else range(len(self.names))
+        return self.timestamp(max(self._first[r] for r in rows))
+
+    def common_end(self, names=None):
+        """Last grid time at which every named series has data"""
+        rows = [self._rows[n] for n in names] if names else range(len(self.names))
+        return self.timestamp(min(self._last[r] for r in rows))
+
+    def window(self, start, horizon, names=None, strict=True):
+        """
+        Prices for horizon grid steps from start (O(1) slice, a view when
+        names is None)
+        strict: raise if the window leaves the grid or contains gaps
+        """
+        i = self.position(start)
+        if isinstance(start, (int, np.integer)):
+            start = np.datetime64(int(start), "ns").astype("datetime64[s]")
+        if strict and (i < 0 or i + horizon > len(self)):
+            raise IndexError(
+                f"Window of {horizon} steps from {start} is outside the price cube"
+            )
+        i = max(i, 0)
+        block = self.values[:, i : i + horizon]
+        if names is not None:
+            block = block[[self._rows[n] for n in names]]
+        if strict and np.isnan(block).any():
+            raise ValueError(f"Window of {horizon} steps from {start} has gaps")
+        return block
+
+    def asof(self, name, timestamps):
+        """Vectorized lookup: value at the last grid point at or before each ts"""
+        ts = np.asarray(timestamps)
+        if ts.dtype.kind == "M":
+            ts = ts.astype("datetime64[ns]").astype(np.int64)
+        elif ts.dtype.kind not in "iu":
+            ts = np.array([to_epoch_ns(t) for t in ts.ravel()]).reshape(ts.shape)
+        pos = (ts - self.start_ns) // self.step_ns
+        out = np.full(ts.shape, np.nan)
+        inside = (pos >= 0) & (pos < len(self))
+        out[inside] = self.series(name)[pos[inside]]
+        return out
+
+    @classmethod
+    def from_series(
+        cls, series, step_ns=None, fill="ffill", tolerance=None, version=None
+    ):
+        """
+        series: {name: (times int64 ns sorted, values)}
+        step_ns: grid step; inferred as the smallest median spacing if None
+        """
+        if step_ns is None:
+            step_ns = min(
+                int(np.median(np.diff(times)))
+                for times, _ in series.values()
+                if len(times) > 1
+            )
+        start = min(times[0] for times, _ in series.values())
+        end = max(times[-1] for times, _ in series.values())
+        # Align the grid to whole steps so windows line up with wall-clock times
+        start -= start % step_ns
+        grid = np.arange(start, end + 1, step_ns, dtype=np.int64)
+
+        values = np.vstack(
+            [
+                asof_join(grid, times, vals, fill=fill, tolerance=tolerance)
+                for times, vals in series.values()
+            ]
+        )
+        return cls(list(series), start, step_ns, values, version=version)
+
+    @classmethod
+    def from_csvs(cls, paths, step_ns=None, fill="ffill", tolerance=None):
+        """
+        paths: {name: csv path}; each CSV is (timestamp, value) like the files
+        in datasets/ and datasets/forecasts/
+        """
+        import pandas as pd
+
+        series = {}
+        for name, path in paths.items():
+            df = pd.read_csv(path)
+            times = (
+                pd.to_datetime(df.iloc[:, 0])
+                .to_numpy(dtype="datetime64[ns]")
+                .astype(np.int64)
+            )
+            vals = df.iloc[:, 1].to_numpy(dtype=float)
+            order = np.argsort(times, kind="stable")
+            series[name] = (times[order], vals[order])
+        return cls.from_series(
+            series,
+            step_ns=step_ns,
+            fill=fill,
+            tolerance=tolerance,
+            version=files_version(paths.values()),
+        )
+
+
+def files_version(paths):
+    """Changes whenever any of the files is rewritten"""
+    parts = []
+    for path in paths:
+        stat = os.stat(path)
+        parts.append(f"{stat.st_mtime_ns:x}.{stat.st_size:x}")
+    return "-".join(parts)
+
+
+# (directory, files, fill) -> PriceCube, rebuilt when any file changes
+_cube_cache = {}
+
+
+def load_cube(directory, files, fill="ffill", tolerance=None):
+    paths = {name: os.path.join(directory, f) for name, f in files.items()}
+    key = (os.path.abspath(directory), tuple(files.items()), fill, tolerance)
+    version = files_version(paths.values())
+    cached = _cube_cache.get(key)
+    if cached is not None and cached.version == version:
+        return cached
+    cube = PriceCube.from_csvs(paths, fill=fill, tolerance=tolerance)
+    _cube_cache[key] = cube
+    return cube
+
+
+def load_forecast_cube(forecasts_dir, fill="ffill"):
+    """The forecast CSVs as one aligned cube, built once per file version"""
+    return load_cube(forecasts_dir, FORECAST_FILES, fill=fill)
+
+
+def load_history_cube(datasets_dir, fill="ffill", tolerance=None):
+    """The historic *_timeseries.csv series as one aligned cube"""
+    return load_cube(datasets_dir, HISTORY_FILES, fill=fill, tolerance=tolerance)
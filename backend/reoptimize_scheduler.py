@@ -0,0 +1,218 @@
+"""
+Event-driven re-optimization scheduler.
+
+Watches the forecast files and sites.json. When they change, it prices the
+current optimal_machines allocation under the new forecasts with a vectorized
+numpy evaluation and compares it with a cheap feasible estimate of what a
+re-solve would earn (the greedy allocation under the power caps and the shared
+energy budget, which the solve starts from). A full optimize_static_config
+solve runs only when that estimate beats the current profit by more than the
+threshold, or when the deadline since the last solve has passed. Bursts of
+file updates are debounced.
+
+    python reoptimize_scheduler.py --threshold 0.02 --deadline 300
+
+server.py starts it in-process when REOPTIMIZE_SCHEDULER=1.
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from price_cube import FORECAST_FILES
+from site_optimizer import (
+    allocation_profit,
+    energy_budget,
+    fleet_arrays,
+    load_forecasts,
+    load_sites,
+    optimize_sites_file,
+    profit_coefficients,
+)
+from solver_control import greedy_fill
+
+logger = logging.getLogger(__name__)
+
+
+def greedy_profit(coeff, arrays, energy_cost, budget):
+    """
+    Profit of a feasible integer allocation under the latest prices: the
+    greedy_fill seed optimize_static_config itself starts from (per site by
+    profit per watt, within the power caps and the shared energy budget).
+    A re-solve earns at least this much, and it never exceeds the profit of
+    the current allocation when that allocation is already optimal.
+    energy_cost: (S, D) energy cost of one machine over the horizon
+    """
+    total = 0.0
+    spent = 0.0
+    for s in range(coeff.shape[0]):
+        items = range(coeff.shape[1])
+        counts, used = greedy_fill(
+            {d: coeff[s, d] for d in items},
+            {d: arrays["power"][s, d] for d in items},
+            {d: arrays["N"][s, d] for d in items},
+            arrays["P_MAX"][s],
+            cost={d: energy_cost[s, d] for d in items},
+            budget=budget - spent,
+        )
+        spent += used
+        total += sum(coeff[s, d] * n for d, n in counts.items())
+    return float(total)
+
+
+class ReoptimizeScheduler:
+    def __init__(
+        self,
+        sites_file,
+        forecasts_dir,
+        T=12,
+        threshold=0.02,
+        debounce=10.0,
+        deadline=300.0,
+        poll_interval=1.0,
+        solve=None,
+    ):
+        """
+        threshold: minimum relative improvement (estimate vs current) to re-solve
+        debounce: seconds without further changes before a burst is evaluated
+        deadline: force a solve when the last one is older than this
+        solve: callable running the full optimization (defaults to a solve that
+            writes back to sites_file)
+        """
+        self.sites_file = sites_file
+        self.forecasts_dir = forecasts_dir
+        self.T = T
+        self.threshold = threshold
+        self.debounce = debounce
+        self.deadline = deadline
+        self.poll_interval = poll_interval
+        self.solve = solve or (
+            lambda: optimize_sites_file(sites_file, forecasts_dir, T=T)
+        )
+
+        self.watched = [sites_file] + [
+            os.path.join(forecasts_dir, name) for name in FORECAST_FILES.values()
+        ]
+        self._mtimes = self._snapshot()
+        self._pending_since = None
+        self._last_change = None
+        self._last_solve = time.monotonic()
+        self._stop = threading.Event()
+
+    def _snapshot(self):
+        mtimes = {}
+        for path in self.watched:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                mtimes[path] = None
+        return mtimes
+
+    def estimate(self):
+        """
+        Price the current allocation and a feasible re-solve estimate under
+        the latest forecasts
+        Returns: (current_profit, estimate)
+        """
+        sites_data = load_sites(self.sites_file)
+        sites, devices, arrays, states = fleet_arrays(sites_data)
+        h, g, e_states = load_forecasts(self.forecasts_dir, self.T)
+        e = np.array([e_states[state] for state in states], dtype=float)
+        coeff = profit_coefficients(arrays, np.asarray(h), np.asarray(g), e)
+        energy_cost = arrays["power"] * e.sum(axis=1)[:, None]
+        estimate = greedy_profit(coeff, arrays, energy_cost, energy_budget(sites_data))
+        return allocation_profit(coeff, arrays["current"]), estimate
+
+    def check(self, now=None):
+        """
+        One scheduler tick
+        Returns: the reason a solve was run ("improvement" / "deadline"), or None
+        """
+        now = time.monotonic() if now is None else now
+
+        mtimes = self._snapshot()
+        if mtimes != self._mtimes:
+            self._mtimes = mtimes
+            self._last_change = now
+            if self._pending_since is None:
+                self._pending_since = now
+
+        reason = None
+        if now - self._last_solve >= self.deadline:
+            reason = "deadline"
+        elif (
+            self._pending_since is not None and now - self._last_change >= self.debounce
+        ):
+            self._pending_since = None
+            current, estimate = self.estimate()
+            improvement = estimate - current
+            logger.info(
+                f"Current profit {current:.2f}, re-solve estimate {estimate:.2f} "
+                f"({improvement:+.2f})"
+            )
+            if improvement > self.threshold * max(abs(current), 1.0):
+                reason = "improvement"
+
+        if reason is None:
+            return None
+
+        logger.info(f"Re-optimizing ({reason})")
+        self.solve()
+        self._last_solve = time.monotonic()
+        self._pending_since = None
+        # Our own write-back to sites.json is not a new event
+        self._mtimes = self._snapshot()
+        return reason
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Re-optimization check failed: {e}", exc_info=True)
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Run in a daemon thread"""
+        thread = threading.Thread(
+            target=self.run_forever, name="reoptimize-scheduler", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event-driven re-optimization")
+    parser.add_argument("--sites-file", default=os.getenv("SITES_FILE", "sites.json"))
+    parser.add_argument(
+        "--forecasts-dir",
+        default=os.getenv("FORECASTS_DIR", "../datasets/forecasts"),
+    )
+    parser.add_argument("--T", type=int, default=12)
+    parser.add_argument("--threshold", type=float, default=0.02)
+    parser.add_argument("--debounce", type=float, default=10.0)
+    parser.add_argument("--deadline", type=float, default=300.0)
+    parser.add_argument("--poll", type=float, default=1.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    ReoptimizeScheduler(
+        args.sites_file,
+        args.forecasts_dir,
+        T=args.T,
+        threshold=args.threshold,
+        debounce=args.debounce,
+        deadline=args.deadline,
+        poll_interval=args.poll,
+    ).run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Compact, streamable representation of dispatch schedules.
+
+optimize_dispatch produces one machine count per device per interval, but the
+downtime logic makes counts change rarely. A schedule is therefore stored as
+run-length segments per device:
+
+    {"air": [{"start": "2025-06-21T20:25:00", "end": "2025-06-21T21:25:00", "count": 10}, ...]}
+
+where end is exclusive. stream_ndjson() serializes segments one JSON line at a
+time, so neither the server nor the client needs the dense lists in memory.
+The stream always finishes with an "end" line, so clients can tell a complete
+stream from a truncated one.
+"""
+
+import json
+import logging
+
+import numpy as np
+
+from price_cube import to_epoch_ns
+
+logger = logging.getLogger(__name__)
+
+FIVE_MINUTES_NS = 300 * 10**9
+
+
+def run_lengths(counts):
+    """
+    Run-length segments of a sequence of counts
+    Returns: list of (start_index, end_index_exclusive, count)
+    """
+    counts = np.asarray(counts)
+    if counts.size == 0:
+        return []
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(counts)) + 1))
+    ends = np.append(starts[1:], counts.size)
+    return [
+        (int(s), int(e), int(counts[s])) for s, e in zip(starts.tolist(), ends.tolist())
+    ]
+
+
+def format_ts(ns):
+    return str(np.datetime64(int(ns), "ns").astype("datetime64[s]"))
+
+
+def segments_to_json(segments, start, step_ns=FIVE_MINUTES_NS):
+    """Index segments -> [{"start", "end", "count"}] with ISO timestamps"""
+    t0 = to_epoch_ns(start)
+    return [
+        {
+            "start": format_ts(t0 + i * step_ns),
+            "end": format_ts(t0 + j * step_ns),
+            "count": count,
+        }
+        for i, j, count in segments
+    ]
+
+
+def encode_schedule(schedule, start, step_ns=FIVE_MINUTES_NS):
+    """
+    Dense {device: [count per t]} -> {device: [{"start", "end", "count"}]}
+    Also accepts {device: [(i, j, count)]} segments from
+    optimize_dispatch(..., run_length=True).
+    """
+    encoded = {}
+    for device, values in schedule.items():
+        values = list(values)
+        segments = values if values and isinstance(values[0], tuple) else None
+        encoded[device] = segments_to_json(
+            segments if segments is not None else run_lengths(values), start, step_ns
+        )
+    return encoded
+
+
+def decode_schedule(encoded, step_ns=FIVE_MINUTES_NS):
+    """{device: [{"start", "end", "count"}]} -> dense {device: [count per t]}"""
+    dense = {}
+    for device, segments in encoded.items():
+        values = []
+        for segment in segments:
+            steps = (to_epoch_ns(segment["end"]) - to_epoch_ns(segment["start"])) // (
+                step_ns
+            )
+            values.extend([segment["count"]] * int(steps))
+        dense[device] = values
+    return dense
+
+
+def stream_ndjson(schedules, start, step_ns=FIVE_MINUTES_NS, summary=None):
+    """
+    Serialize schedules one segment per line
+    schedules: iterable of (site_id, {device: dense counts or index segments})
+        consumed lazily, so each site can be solved as the stream is read
+    step_ns: grid step of the schedules (the price cube's step_ns)
+    summary: extra JSON-serializable fields for the final "end" line
+    A site that fails mid-stream ends the segments with an "error" line; the
+    last line is always "end", with "complete" false after an error.
+    Yields: newline-terminated JSON strings
+    """
+    yield json.dumps({"type": "header", "start": format_ts(to_epoch_ns(start))}) + "\n"
+    n_segments = 0
+    complete = True
+    try:
+        for site_id, schedule in schedules:
+            for device, segments in encode_schedule(schedule, start, step_ns).items():
+                for segment in segments:
+                    n_segments += 1
+                    yield json.dumps(
+                        {
+                            "type": "segment",
+                            "site_id": site_id,
+                            "device": device,
+                            **segment,
+                        }
+                    ) + "\n"
+    except Exception as e:
+        logger.error(f"Schedule stream failed: {e}", exc_info=True)
+        complete = False
+        yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+    end = {"type": "end", "segments": n_segments, "complete": complete}
+    yield json.dumps({**end, **(summary or {})}) + "\n"
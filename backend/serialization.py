@@ -0,0 +1,186 @@
+"""
+Fast JSON encoding, response compression and the on-disk site format.
+
+dumps() encodes with orjson when it is installed (falling back to json),
+writing ObjectId as its hex string, datetimes as ISO 8601 and numpy values as
+plain numbers. compress() picks brotli (when installed) or gzip from a
+request's Accept-Encoding and skips small bodies. init_flask(app) makes every
+jsonify response go through both.
+
+Site files are written "pretty" (indent=2, the default, readable diffs) or
+"compact" (no whitespace, smaller and faster) per SITES_FORMAT; loading
+accepts either.
+
+    body, encoding = compress(dumps(payload), request.headers["Accept-Encoding"])
+"""
+
+import gzip
+import json
+import os
+import tempfile
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+try:
+    from bson import ObjectId
+except ImportError:  # pymongo not installed
+    ObjectId = None
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = int(os.getenv("MIN_COMPRESS_BYTES", 1024))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+
+SITE_FORMATS = ("pretty", "compact")
+SITES_FORMAT = os.getenv("SITES_FORMAT", "pretty")
+
+
+def _default(obj):
+    if ObjectId is not None and isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if hasattr(obj, "tolist"):  # numpy arrays and scalars
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj, pretty=False):
+    """JSON bytes for obj"""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    if pretty:
+        return json.dumps(obj, default=_default, indent=2).encode()
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def negotiate(accept_encoding):
+    """
+    Best supported content coding for an Accept-Encoding header
+    Returns: "br", "gzip" or None (identity)
+    """
+    available = ("br", "gzip") if brotli is not None else ("gzip",)
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            weights[coding] = q
+    best, best_q = None, 0.0
+    for coding in available:  # in order of preference on equal q
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body, accept_encoding, min_size=MIN_COMPRESS_BYTES):
+    """
+    Compress body for the client's Accept-Encoding
+    Returns: (body, content coding or None when sent as is)
+    """
+    if len(body) < min_size:
+        return body, None
+    coding = negotiate(accept_encoding)
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), coding
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), coding
+    return body, None
+
+
+def load_json_file(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def save_json_file(path, obj, fmt=None):
+    """
+    Write obj to path in SITES_FORMAT (or fmt), atomically: readers see the
+    old or the new file, never a partial one
+    """
+    fmt = fmt or SITES_FORMAT
+    if fmt not in SITE_FORMATS:
+        raise ValueError(f"Unknown site format '{fmt}' (choose from {SITE_FORMATS})")
+    body = dumps(obj, pretty=fmt == "pretty")
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".sites-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def init_flask(app):
+    """Encode jsonify responses with dumps() and compress JSON responses"""
+    from flask import request
+    from flask.json.provider import JSONProvider
+
+    class FastJSONProvider(JSONProvider):
+        def dumps(self, obj, **kwargs):
+            return dumps(obj).decode()
+
+        def loads(self, s, **kwargs):
+            return loads(s)
+
+        def response(self, *args, **kwargs):
+            # jsonify(value), jsonify(a, b) -> list, jsonify(key=value) -> dict
+            if args and kwargs:
+                raise TypeError("jsonify() takes either args or kwargs, not both")
+            obj = args[0] if len(args) == 1 else list(args) or kwargs or None
+            return self._app.response_class(dumps(obj), mimetype="application/json")
+
+    app.json = FastJSONProvider(app)
+
+    @app.after_request
+    def compress_json(response):
+        if (
+            response.mimetype != "application/json"
+            or response.is_streamed
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        body, coding = compress(
+            response.get_data(), request.headers.get("Accept-Encoding", "")
+        )
+        if coding is not None:
+            response.set_data(body)
+            response.headers["Content-Encoding"] = coding
+        return response
+
+    return app
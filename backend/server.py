@@ -1,10 +1,14 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
-from bson import json_util
+import functools
 import os
 import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
@@ -12,6 +16,23 @@ from optimization_function_multiple_sites import (
     optimize_static_config,
     extract_site_params,
 )
+from site_optimizer import (
+    dispatch_sites,
+    load_forecasts,
+    load_sites,
+    optimize_sites_file,
+    warm_up,
+)
+from schedule_codec import stream_ndjson
+from curtailment import MeritOrderIndex
+from fleet_dispatch import dispatch_sites_file
+from pareto import pareto_frontier_file
+from price_cube import FORECAST_FILES, files_version, load_forecast_cube
+from single_flight import SingleFlight
+from site_sync import SiteChangeLog
+from serialization import dumps, init_flask
+from solver_control import request_budget, request_options
+from local_mongo import is_local_uri, client_from_uri
 
 # Load environment variables
 load_dotenv()
@@ -22,6 +43,8 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
+# orjson for jsonify, gzip / brotli for JSON responses
+init_flask(app)
 
 # MongoDB Atlas configuration
 MONGO_URI = os.getenv(
@@ -31,19 +54,75 @@ MONGO_URI = os.getenv(
 DB_NAME = os.getenv("DB_NAME", "mara")
 SITES_COLLECTION = os.getenv("SITES_COLLECTION", "sites")
 
-# Initialize MongoDB client
-try:
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-    # Test the connection
-    client.admin.command("ping")
-    db = client[DB_NAME]
-    collection = db[SITES_COLLECTION]
-    logger.info("Successfully connected to MongoDB Atlas")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB Atlas: {e}")
-    client = None
-    db = None
-    collection = None
+# Local data files
+SITES_FILE = os.getenv("SITES_FILE", "sites.json")
+FORECASTS_DIR = os.getenv("FORECASTS_DIR", "../datasets/forecasts")
+
+# Default solve budget: CBC returns its best incumbent after this many seconds.
+# Requests may override it with "time_limit" / "gap" in the JSON body.
+OPTIMIZE_TIME_LIMIT = float(os.getenv("OPTIMIZE_TIME_LIMIT", 10))
+OPTIMIZE_GAP = float(os.getenv("OPTIMIZE_GAP")) if os.getenv("OPTIMIZE_GAP") else None
+# "exact" MILP or "fast" LP relaxation with rounding; requests may set "mode"
+OPTIMIZE_MODE = os.getenv("OPTIMIZE_MODE", "exact")
+
+# Startup runs in the background so the process serves /health immediately.
+# Readiness (GET /ready) is tracked separately from liveness (GET /health).
+readiness = {"database": "connecting", "warm_up": "pending"}
+DB_RETRY_SECONDS = float(os.getenv("DB_RETRY_SECONDS", 5))
+
+client = None
+db = None
+collection = None
+
+
+def _connect_database():
+    """Connect to MongoDB, retrying in the background until it answers"""
+    global client, db, collection
+    while True:
+        try:
+            if is_local_uri(MONGO_URI):
+                new_client = client_from_uri(MONGO_URI, DB_NAME, SITES_COLLECTION)
+            else:
+                new_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+            # Test the connection
+            new_client.admin.command("ping")
+            client = new_client
+            db = client[DB_NAME]
+            collection = db[SITES_COLLECTION]
+            readiness["database"] = "connected"
+            logger.info("Successfully connected to MongoDB Atlas")
+            return
+        except Exception as e:
+            readiness["database"] = "unavailable"
+            logger.error(f"Failed to connect to MongoDB Atlas: {e}")
+            time.sleep(DB_RETRY_SECONDS)
+
+
+def _warm_up():
+    """Preload pandas, the forecast cube and CBC before reporting ready"""
+    start = time.perf_counter()
+    try:
+        warm_up(FORECASTS_DIR)
+        readiness["warm_up"] = "done"
+        logger.info(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        readiness["warm_up"] = "failed"
+        logger.error(f"Warm-up failed: {e}")
+
+
+def start_background_startup():
+    threading.Thread(target=_connect_database, name="db-connect", daemon=True).start()
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+
+
+# The spawn pools of /dispatch/fleet and /pareto re-import this module in every
+# worker as __mp_main__ (under `python server.py`), before
+# multiprocessing.parent_process() is set; only the serving process connects,
+# warms up and runs the scheduler
+SERVING_PROCESS = __name__ != "__mp_main__"
+
+if SERVING_PROCESS:
+    start_background_startup()
 
 
 @app.route("/health", methods=["GET"])
@@ -55,6 +134,26 @@ def health_check():
     )
 
 
+@app.route("/ready", methods=["GET"])
+def readiness_check():
+    """Readiness endpoint: 200 once warm-up has finished and MongoDB is connected"""
+    ready = readiness["warm_up"] == "done" and readiness["database"] == "connected"
+    return (
+        jsonify(
+            {
+                "status": "ready" if ready else "starting",
+                **readiness,
+                "timestamp": datetime.utcnow().isoformat(),
+            }
+        ),
+        200 if ready else 503,
+    )
+
+
+def _database_unavailable():
+    return jsonify({"error": "Database not connected"}), 503
+
+
 #         if client:
 #             client.admin.command('ping')
 #             return jsonify({
@@ -184,156 +283,408 @@ def health_check():
 #         }
 
 
-@app.route("/optimize", methods=["POST"])
-def optimize():
-    """Optimize site configurations based on forecasts"""
+def solve_budget(body):
+    """Solve budget from a request body, falling back to the server defaults"""
+    return request_budget(body, OPTIMIZE_TIME_LIMIT, OPTIMIZE_GAP)
+
+
+def optimize_options(body):
+    """Solve budget plus "mode" for /optimize requests"""
+    return request_options(body, OPTIMIZE_TIME_LIMIT, OPTIMIZE_GAP, OPTIMIZE_MODE)
+
+
+def run_optimization(
+    time_limit=OPTIMIZE_TIME_LIMIT, gap_rel=OPTIMIZE_GAP, mode=OPTIMIZE_MODE
+):
+    """
+    Solve against the current forecasts and write optimal_machines back
+    time_limit, gap_rel: solve budget; the best incumbent found within it is used
+    mode: "exact" MILP, or "fast" LP relaxation with rounding
+    Returns: (response payload, HTTP status)
+    """
     try:
-        with open("sites.json", "r") as f:
-            sites_data = json.load(f)
-
-        # Extract parameters from sites data
-        T = 12
-
-        # Get all unique device types from the sites data
-        devices = set()
-        for site in sites_data:
-            devices.update(site["miners"].keys())
-            if "inference" in site:
-                devices.update(site["inference"].keys())
-        devices = list(devices)
-
-        sites, power, N, P_MAX, energy_prices, site_states, r_hash, r_tok = (
-            extract_site_params(sites_data)
+        # Run optimization and save the results back to sites.json
+        result, updated_sites, report = optimize_sites_file(
+            SITES_FILE,
+            FORECASTS_DIR,
+            T=12,
+            time_limit=time_limit,
+            gap_rel=gap_rel,
+            mode=mode,
+            write_lock=sites_write_lock,
         )
 
-        # Read CSV forecasts
-        import pandas as pd
-
-        # Hash price forecast
-        h = (
-            pd.read_csv("../datasets/forecasts/hash_forecast.csv")
-            .iloc[:, 1]
-            .tolist()[:T]
+        return (
+            {
+                "status": "success",
+                "message": f"Optimization completed and {updated_sites} sites updated",
+                "updated_sites": updated_sites,
+                "version": sites_version(),
+                "solver": report,
+                "results": [
+                    {
+                        "site_id": site_id,
+                        "device_type": device_type,
+                        "optimal_machines": count,
+                    }
+                    for (site_id, device_type), count in result.items()
+                ],
+            },
+            200,
         )
 
-        # Token price forecast
-        g = (
-            pd.read_csv("../datasets/forecasts/token_forecast.csv")
-            .iloc[:, 1]
-            .tolist()[:T]
+    except Exception as e:
+        logger.error(f"Error during optimization: {str(e)}", exc_info=True)
+        return (
+            {
+                "status": "error",
+                "message": f"Failed to complete optimization: {str(e)}",
+            },
+            500,
         )
 
-        # Energy price forecasts per state
-        e_states = {
-            "California": pd.read_csv("../datasets/forecasts/cali_energy_forecast.csv")
-            .iloc[:, 1]
-            .tolist()[:T],
-            "Texas": pd.read_csv("../datasets/forecasts/texas_energy_forecast.csv")
-            .iloc[:, 1]
-            .tolist()[:T],
-            "Ohio": pd.read_csv("../datasets/forecasts/ohio_energy_forecast.csv")
-            .iloc[:, 1]
-            .tolist()[:T],
-            "Nevada": pd.read_csv("../datasets/forecasts/nevada_energy_forecast.csv")
-            .iloc[:, 1]
-            .tolist()[:T],
-            "Wyoming": pd.read_csv("../datasets/forecasts/wyoming_energy_forecast.csv")
-            .iloc[:, 1]
-            .tolist()[:T],
-        }
 
-        # Map energy prices to sites based on their states
-        e = {site: e_states[state] for site, state in site_states.items()}
-
-        # Calculate a more realistic energy budget based on sites' power capacity
-        E_BUDGET = sum(site["powerCapacity"] * 1000 * 24 * 30 for site in sites_data)
-        print(f"\nEnergy Budget: {E_BUDGET/1000000:.2f} MWh")
-
-        # Run optimization
-        result = optimize_static_config(
-            sites=sites,
-            devices=devices,
-            T=T,
-            r_hash=r_hash,
-            r_tok=r_tok,
-            power=power,
-            N=N,
-            h=h,
-            g=g,
-            e=e,
-            P_MAX=P_MAX,
-            E_BUDGET=E_BUDGET,
+# Concurrent optimizations with the same inputs share one solve and one
+# write-back; different inputs still serialize their sites.json writes
+optimize_flight = SingleFlight()
+sites_write_lock = threading.Lock()
+
+
+def optimization_key(options):
+    """Identifies equivalent optimizations: same sites, forecasts and options"""
+    try:
+        forecasts = files_version(
+            os.path.join(FORECASTS_DIR, name) for name in FORECAST_FILES.values()
         )
+        inputs = (sites_version(), forecasts)
+    except OSError:
+        # Let run_optimization report the missing file
+        inputs = None
+    return inputs, tuple(sorted(options.items()))
 
-        print("\nOptimization Results:")
 
-        # Load current sites data
-        with open("sites.json", "r") as f:
-            sites_data = json.load(f)
+def coalesced_optimization(**options):
+    """
+    run_optimization, attached to an in-flight equivalent solve if any
+    Returns: (response payload, HTTP status); the payload's "coalesced" is
+        True when the result came from another request's solve
+    """
+    (payload, status), shared = optimize_flight.do(
+        optimization_key(options), run_optimization, **options
+    )
+    return {**payload, "coalesced": shared}, status
 
-        # Create a mapping of site_id to site index for easy updates
-        site_index = {
-            site["id"]: idx for idx, site in enumerate(sites_data) if "id" in site
-        }
 
-        # Update sites with optimization results
-        updated_sites = 0
-        for (site_id, device_type), count in result.items():
-            print(f"Site: {site_id}, Device: {device_type}, Count: {count}")
-
-            if site_id not in site_index:
-                print(f"Warning: Site ID {site_id} not found in sites.json")
-                continue
-
-            site_idx = site_index[site_id]
-            site = sites_data[site_idx]
-
-            # Determine if it's a mining or inference device
-            if device_type in ["asic", "gpu"]:
-                if "inference" not in site:
-                    site["inference"] = {}
-                if device_type not in site["inference"]:
-                    site["inference"][device_type] = {}
-                site["inference"][device_type]["optimal_machines"] = count
-            else:
-                if "miners" not in site:
-                    site["miners"] = {}
-                if device_type not in site["miners"]:
-                    site["miners"][device_type] = {}
-                site["miners"][device_type]["optimal_machines"] = count
+@app.route("/optimize", methods=["POST"])
+def optimize():
+    """
+    Optimize site configurations based on forecasts
+    Body (optional): {"time_limit": seconds, "gap": relative MIP gap,
+        "mode": "exact" | "fast"}
+    """
+    try:
+        budget = optimize_options(request.get_json(silent=True) or {})
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    payload, status = coalesced_optimization(**budget)
+    return jsonify(payload), status
 
-            updated_sites += 1
 
-        # Save updated data back to sites.json
-        with open("sites.json", "w") as f:
-            json.dump(sites_data, f, indent=2)
+@app.route("/dispatch", methods=["POST"])
+def dispatch():
+    """
+    Time-indexed dispatch schedules, streamed as NDJSON run-length segments
+    Body: {"horizon": T (default 12), "start": timestamp, "site_ids": [...],
+        "time_limit": seconds per site, "gap": relative MIP gap}
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        start, schedules = dispatch_sites(
+            load_sites(SITES_FILE),
+            FORECASTS_DIR,
+            int(body.get("horizon", 12)),
+            start=body.get("start"),
+            site_ids=body.get("site_ids"),
+            **solve_budget(body),
+        )
+    except (IndexError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error during dispatch: {str(e)}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    # Sites are solved one at a time as the client reads the stream
+    step_ns = load_forecast_cube(FORECASTS_DIR).step_ns
+    return Response(
+        stream_with_context(stream_ndjson(schedules, start, step_ns)),
+        mimetype="application/x-ndjson",
+    )
 
-        print(f"\nUpdated {updated_sites} sites in sites.json")
 
-        return (
-            jsonify(
-                {
-                    "status": "success",
-                    "message": f"Optimization completed and {updated_sites} sites updated",
-                    "updated_sites": updated_sites,
-                }
+@app.route("/dispatch/fleet", methods=["POST"])
+def dispatch_fleet():
+    """
+    Fleet-wide dispatch under the shared energy budget, with switching costs
+    Body: {"horizon": T (default 12), "start": timestamp, "switch_cost": cost
+        per configuration change, "energy_budget": budget, "time_limit",
+        "gap"}; the budget fields apply to each site subproblem
+    The NDJSON "end" line carries profit, spend, bound and gap.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        start, result = dispatch_sites_file(
+            SITES_FILE,
+            FORECASTS_DIR,
+            int(body.get("horizon", 12)),
+            start=body.get("start"),
+            E_BUDGET=(
+                float(body["energy_budget"]) if "energy_budget" in body else None
             ),
-            200,
+            switch_cost=float(body.get("switch_cost", 0.0)),
+            **solve_budget(body),
         )
+    except (IndexError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error during fleet dispatch: {str(e)}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    summary = {
+        key: result[key]
+        for key in ("profit", "spend", "budget", "bound", "gap", "multiplier")
+    }
+    step_ns = load_forecast_cube(FORECASTS_DIR).step_ns
+    return Response(
+        stream_ndjson(result["schedules"].items(), start, step_ns, summary=summary),
+        mimetype="application/x-ndjson",
+    )
 
+
+@app.route("/pareto", methods=["GET"])
+def pareto():
+    """
+    Profit vs. emissions frontier of the static allocation, cached per sites
+    and forecast version
+    Query: points (default 9), allocations=1 to include each point's machines
+    """
+    try:
+        points = int(request.args.get("points", 9))
+        if points < 2:
+            raise ValueError("points must be at least 2")
+        frontier, cached = pareto_frontier_file(
+            SITES_FILE,
+            FORECASTS_DIR,
+            T=12,
+            points=points,
+            time_limit=OPTIMIZE_TIME_LIMIT,
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
-        logger.error(f"Error during optimization: {str(e)}", exc_info=True)
-        return (
-            jsonify(
-                {
-                    "status": "error",
-                    "message": f"Failed to complete optimization: {str(e)}",
-                }
-            ),
-            500,
+        logger.error(f"Error computing Pareto frontier: {str(e)}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    with_allocations = request.args.get("allocations") == "1"
+    return (
+        jsonify(
+            {
+                "status": "success",
+                "cached": cached,
+                "solves": frontier["solves"],
+                "solve_time": frontier["solve_time"],
+                "points": [
+                    _pareto_point(point, with_allocations)
+                    for point in frontier["points"]
+                ],
+            }
+        ),
+        200,
+    )
+
+
+def _pareto_point(point, with_allocations):
+    body = {key: value for key, value in point.items() if key != "allocation"}
+    if with_allocations:
+        body["allocation"] = [
+            {"site_id": site_id, "device_type": device_type, "optimal_machines": n}
+            for (site_id, device_type), n in point["allocation"].items()
+        ]
+    return body
+
+
+# Merit-order index for curtailment, built on first use from the first
+# forecast step and moved by POST /prices/tick. Running counts are taken from
+# optimal_machines again whenever the optimizer rewrites sites.json.
+merit_index = None
+merit_version = None
+merit_lock = threading.Lock()
+
+
+def current_merit_index():
+    """The merit-order index, reconciled with the latest optimizer allocation"""
+    global merit_index, merit_version
+    version = sites_version()
+    if merit_index is not None and merit_version == version:
+        return merit_index
+    sites_data = load_sites(SITES_FILE)
+    try:
+        if merit_index is None:
+            raise KeyError("not built")
+        merit_index.reconcile(sites_data)
+    except KeyError:
+        # First use, or sites in states without a ticked price
+        h, g, e_states = load_forecasts(FORECASTS_DIR, 1)
+        merit_index = MeritOrderIndex.from_sites(sites_data, h, g, e_states)
+    merit_version = version
+    return merit_index
+
+
+@app.route("/curtail", methods=["POST"])
+def curtail():
+    """
+    Shed plan for a power reduction, from the merit-order index (no solve)
+    Body: {"targets": {site_id: watts}, "commit": true to also take the
+        machines out of the index's running counts}
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        targets = {
+            str(site_id): float(watts)
+            for site_id, watts in (body.get("targets") or {}).items()
+        }
+        if not targets or any(watts < 0 for watts in targets.values()):
+            raise ValueError("targets must map site ids to non-negative watts")
+        started = time.perf_counter()
+        with merit_lock:
+            index = current_merit_index()
+            unknown = sorted(set(targets) - set(index.site_ids))
+            if unknown:
+                return (
+                    jsonify({"status": "error", "message": f"Unknown sites {unknown}"}),
+                    404,
+                )
+            plans = index.shed_many(targets, commit=bool(body.get("commit")))
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error planning curtailment: {str(e)}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    return (
+        jsonify(
+            {
+                "status": "success",
+                "sites_version": merit_version,
+                "plan_time": time.perf_counter() - started,
+                "plans": plans,
+            }
+        ),
+        200,
+    )
+
+
+@app.route("/prices/tick", methods=["POST"])
+def prices_tick():
+    """
+    Move the merit-order index to new prices
+    Body: {"hash_price", "token_price", "energy": {state: price}}, all optional
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        energy = {
+            state: float(price) for state, price in (body.get("energy") or {}).items()
+        }
+        hash_price = body.get("hash_price")
+        token_price = body.get("token_price")
+        with merit_lock:
+            reranked = current_merit_index().tick(
+                hash_price=float(hash_price) if hash_price is not None else None,
+                token_price=float(token_price) if token_price is not None else None,
+                energy=energy,
+            )
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error applying price tick: {str(e)}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    return jsonify({"status": "success", "reranked_sites": reranked}), 200
+
+
+# Background optimization jobs, polled by the dashboard instead of blocking
+# on POST /optimize. Finished jobs beyond the most recent MAX_JOBS are dropped.
+MAX_JOBS = 100
+jobs = {}
+jobs_lock = threading.Lock()
+job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="optimize-job")
+
+
+def _run_job(job_id, budget):
+    with jobs_lock:
+        jobs[job_id]["status"] = "running"
+    payload, status = coalesced_optimization(**budget)
+    with jobs_lock:
+        jobs[job_id].update(
+            status="done" if status == 200 else "error",
+            result=payload,
+            finished_at=datetime.utcnow().isoformat(),
         )
 
 
+@app.route("/optimize/jobs", methods=["POST"])
+def submit_optimize_job():
+    """Queue an optimization and return its job id immediately"""
+    try:
+        budget = optimize_options(request.get_json(silent=True) or {})
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    job_id = uuid.uuid4().hex
+    with jobs_lock:
+        jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "submitted_at": datetime.utcnow().isoformat(),
+        }
+        # Evict the oldest finished jobs; queued and running ones are kept
+        finished = [i for i, j in jobs.items() if j["status"] in ("done", "error")]
+        for old_id in finished[: max(0, len(jobs) - MAX_JOBS)]:
+            del jobs[old_id]
+        job = dict(jobs[job_id])
+    job_executor.submit(_run_job, job_id, budget)
+    return jsonify(job), 202
+
+
+@app.route("/optimize/jobs/<job_id>", methods=["GET"])
+def get_optimize_job(job_id):
+    """Status of an optimization job, with its result once finished"""
+    with jobs_lock:
+        job = jobs.get(job_id)
+        job = dict(job) if job else None
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+
+def sites_version():
+    """Changes whenever sites.json is rewritten"""
+    stat = os.stat(SITES_FILE)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+# Optional in-process re-optimization on forecast/site changes
+if SERVING_PROCESS and os.getenv("REOPTIMIZE_SCHEDULER", "0") == "1":
+    from reoptimize_scheduler import ReoptimizeScheduler
+
+    ReoptimizeScheduler(
+        SITES_FILE,
+        FORECASTS_DIR,
+        threshold=float(os.getenv("REOPTIMIZE_THRESHOLD", 0.02)),
+        deadline=float(os.getenv("REOPTIMIZE_DEADLINE", 300)),
+        # The API's default options, so the key matches a plain POST /optimize
+        solve=functools.partial(coalesced_optimization, **optimize_options({})),
+    ).start()
+
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Endpoint not found"}), 404
@@ -347,6 +698,8 @@ def internal_error(error):
 @app.route("/debug/site-structure", methods=["GET"])
 def debug_site_structure():
     """Debug endpoint to check the structure of site documents"""
+    if db is None:
+        return _database_unavailable()
     try:
         site = db[SITES_COLLECTION].find_one({})
         if not site:
@@ -360,20 +713,43 @@ def debug_site_structure():
         return jsonify({"error": str(e)}), 500
 
 
+# Changes to the sites collection, for GET /sites?since= and ETags. The
+# collection is re-read at most once per SITES_SYNC_INTERVAL seconds.
+SITES_SYNC_INTERVAL = float(os.getenv("SITES_SYNC_INTERVAL", 1.0))
+site_log = SiteChangeLog()
+
+
 @app.route("/sites", methods=["GET"])
 def get_sites():
     """
     Retrieve all documents from the sites collection
+    Query: since=<version> to get only the sites changed since that version,
+        plus the ids of deleted sites (a full list if the version is unknown)
     Returns:
-        JSON: List of all site documents
+        JSON: {"sites": [...], "version"} or, with since, {"version", "full",
+            "sites", "deleted"}; 304 when If-None-Match is the current version
     """
+    if db is None:
+        return _database_unavailable()
     try:
-        sites = list(db[SITES_COLLECTION].find({}))
-        # Use json_util to handle BSON types like ObjectId
+        site_log.refresh(
+            lambda: list(db[SITES_COLLECTION].find({})),
+            token=int(time.monotonic() / SITES_SYNC_INTERVAL),
+        )
+        headers = {"ETag": site_log.etag()}
+        if request.if_none_match.contains_weak(site_log.version):
+            return Response(status=304, headers=headers)
+
+        since = request.args.get("since")
+        if since is None:
+            body = {"sites": site_log.snapshot(), "version": site_log.version}
+        else:
+            body = site_log.changes(since)
+        # dumps writes BSON types like ObjectId as strings
         return (
-            json_util.dumps({"sites": sites}),
+            dumps(body),
             200,
-            {"Content-Type": "application/json"},
+            {"Content-Type": "application/json", **headers},
         )
     except Exception as e:
         logger.error(f"Error retrieving sites: {str(e)}")
@@ -0,0 +1,342 @@
+"""
+ASGI serving mode for the backend (FastAPI + uvicorn).
+
+Serves the core subset of server.py's endpoints (/health, /sites,
+/optimize and /debug/site-structure) with the same payloads, but reads
+MongoDB through the async motor driver and runs the CPU-bound
+optimize_static_config solves in a process pool, so /health and /sites stay
+fast while optimizations are in flight. The dashboard's job, dispatch,
+frontier and curtailment endpoints are only in server.py.
+
+    python server_async.py                      # WEB_CONCURRENCY workers on $PORT
+    uvicorn server_async:app --workers 4 --port 5000
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+from local_mongo import AsyncLocalMongoClient, is_local_uri, client_from_uri
+from price_cube import FORECAST_FILES, files_version
+from serialization import compress, dumps
+from site_optimizer import (
+    apply_results,
+    load_sites,
+    save_sites,
+    sites_file_lock,
+    solve_sites,
+)
+from site_sync import SiteChangeLog
+from solver_control import request_options
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "mara")
+SITES_COLLECTION = os.getenv("SITES_COLLECTION", "sites")
+
+SITES_FILE = os.getenv("SITES_FILE", "sites.json")
+FORECASTS_DIR = os.getenv("FORECASTS_DIR", "../datasets/forecasts")
+
+# Solver processes per web worker
+SOLVER_PROCESSES = int(os.getenv("SOLVER_PROCESSES", 2))
+
+# Default solve budget, as in server.py; requests may override it
+OPTIMIZE_TIME_LIMIT = float(os.getenv("OPTIMIZE_TIME_LIMIT", 10))
+OPTIMIZE_GAP = float(os.getenv("OPTIMIZE_GAP")) if os.getenv("OPTIMIZE_GAP") else None
+OPTIMIZE_MODE = os.getenv("OPTIMIZE_MODE", "exact")
+
+# GET /sites?since= re-reads the collection at most once per interval, as in
+# server.py
+SITES_SYNC_INTERVAL = float(os.getenv("SITES_SYNC_INTERVAL", 1.0))
+
+
+class _State:
+    client = None
+    db = None
+    solver_pool = None
+    sites_lock = None
+    # Optimization key -> asyncio.Task of the in-flight solve
+    in_flight = {}
+    site_log = SiteChangeLog()
+
+
+state = _State()
+
+
+async def _connect_db():
+    if is_local_uri(MONGO_URI):
+        client = AsyncLocalMongoClient(
+            client_from_uri(MONGO_URI, DB_NAME, SITES_COLLECTION)
+        )
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    try:
+        await client.admin.command("ping")
+        logger.info("Successfully connected to MongoDB")
+    except Exception as e:
+        logger.error(f"Failed to connect to MongoDB: {e}")
+    return client
+
+
+@asynccontextmanager
+async def lifespan(app):
+    state.client = await _connect_db()
+    state.db = state.client[DB_NAME]
+    # spawn, not fork: the event loop and driver threads must not be copied
+    state.solver_pool = ProcessPoolExecutor(
+        max_workers=SOLVER_PROCESSES,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    state.sites_lock = asyncio.Lock()
+    try:
+        yield
+    finally:
+        state.solver_pool.shutdown(wait=False, cancel_futures=True)
+        state.client.close()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with serialization.dumps (orjson)"""
+
+    def render(self, content):
+        return dumps(content)
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(CORSMiddleware, allow_origins=["*"])
+
+
+@app.middleware("http")
+async def compress_json(request: Request, call_next):
+    """gzip / brotli for JSON responses, per Accept-Encoding"""
+    response = await call_next(request)
+    content_type = response.headers.get("content-type", "").split(";")[0]
+    if content_type != "application/json" or "content-encoding" in response.headers:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    body, coding = compress(body, request.headers.get("accept-encoding", ""))
+    headers = {
+        key: value for key, value in response.headers.items() if key != "content-length"
+    }
+    headers["vary"] = "Accept-Encoding"
+    if coding is not None:
+        headers["content-encoding"] = coding
+    return Response(body, status_code=response.status_code, headers=headers)
+
+
+def _write_back(result):
+    """
+    Merge solver output into the current sites.json; the file lock keeps the
+    read-modify-write atomic across uvicorn workers
+    Returns: (updated sites, sites.json version after the write)
+    """
+    with sites_file_lock(SITES_FILE):
+        sites_data = load_sites(SITES_FILE)
+        updated_sites = apply_results(sites_data, result)
+        save_sites(SITES_FILE, sites_data)
+        version = sites_version()
+    print(f"\nUpdated {updated_sites} sites in sites.json")
+    return updated_sites, version
+
+
+def sites_version():
+    """Changes whenever sites.json is rewritten, as in server.py"""
+    stat = os.stat(SITES_FILE)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint"""
+    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+
+
+@app.post("/optimize")
+async def optimize(request: Request):
+    """
+    Optimize site configurations based on forecasts
+    Body (optional): {"time_limit": seconds, "gap": relative MIP gap,
+        "mode": "exact" | "fast"}
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        body = {}
+    try:
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        options = request_options(
+            body, OPTIMIZE_TIME_LIMIT, OPTIMIZE_GAP, OPTIMIZE_MODE
+        )
+    except (TypeError, ValueError) as e:
+        return JSONResponse(
+            {"status": "error", "message": str(e)},
+            status_code=400,
+        )
+
+    try:
+        # Equivalent concurrent requests share one solve and one write-back
+        key = await asyncio.to_thread(_optimization_key, options)
+        task = state.in_flight.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.create_task(_optimize(options))
+            state.in_flight[key] = task
+            task.add_done_callback(lambda _: state.in_flight.pop(key, None))
+        payload = await asyncio.shield(task)
+        return {**payload, "coalesced": shared}
+
+    except Exception as e:
+        logger.error(f"Error during optimization: {str(e)}", exc_info=True)
+        return JSONResponse(
+            {
+                "status": "error",
+                "message": f"Failed to complete optimization: {str(e)}",
+            },
+            status_code=500,
+        )
+
+
+def _optimization_key(options):
+    """Same sites.json, forecast files and solve options -> same optimization"""
+    paths = [SITES_FILE] + [
+        os.path.join(FORECASTS_DIR, name) for name in FORECAST_FILES.values()
+    ]
+    return files_version(paths), tuple(sorted(options.items()))
+
+
+async def _optimize(options):
+    """
+    Solve in a solver process and write the result back to sites.json
+    options: {"time_limit", "gap_rel", "mode"} from request_options
+    """
+    sites_data = await asyncio.to_thread(load_sites, SITES_FILE)
+
+    # Run optimization off the event loop, in a solver process
+    loop = asyncio.get_running_loop()
+    result, report = await loop.run_in_executor(
+        state.solver_pool,
+        functools.partial(
+            solve_sites,
+            sites_data,
+            FORECASTS_DIR,
+            T=12,
+            return_report=True,
+            **options,
+        ),
+    )
+
+    # The asyncio lock orders this worker's write-backs without holding a
+    # thread per waiter; the file lock inside orders them across workers
+    async with state.sites_lock:
+        updated_sites, version = await asyncio.to_thread(_write_back, result)
+
+    return {
+        "status": "success",
+        "message": f"Optimization completed and {updated_sites} sites updated",
+        "updated_sites": updated_sites,
+        "version": version,
+        "solver": report,
+        "results": [
+            {
+                "site_id": site_id,
+                "device_type": device_type,
+                "optimal_machines": count,
+            }
+            for (site_id, device_type), count in result.items()
+        ],
+    }
+
+
+@app.get("/debug/site-structure")
+async def debug_site_structure():
+    """Debug endpoint to check the structure of site documents"""
+    try:
+        site = await state.db[SITES_COLLECTION].find_one({})
+        if not site:
+            return JSONResponse({"error": "No sites found"}, status_code=404)
+
+        # Remove _id for cleaner output since it's an ObjectId
+        site.pop("_id", None)
+        return {"fields": list(site.keys()), "sample": site}
+    except Exception as e:
+        logger.error(f"Error in debug endpoint: {str(e)}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@app.get("/sites")
+async def get_sites(request: Request, since: str = None):
+    """
+    Retrieve all documents from the sites collection
+    Query: since=<version> to get only the sites changed since that version,
+        plus the ids of deleted sites
+    Returns:
+        JSON: {"sites": [...], "version"} or, with since, {"version", "full",
+            "sites", "deleted"}; 304 when If-None-Match is the current version
+    """
+    try:
+        token = int(asyncio.get_running_loop().time() / SITES_SYNC_INTERVAL)
+        if state.site_log.needs_refresh(token):
+            sites = await state.db[SITES_COLLECTION].find({}).to_list(None)
+            state.site_log.apply(sites, token)
+        headers = {"ETag": state.site_log.etag()}
+        # Weak comparison, as for any weak ETag
+        if_none_match = request.headers.get("if-none-match", "")
+        if f'"{state.site_log.version}"' in (
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+        ):
+            return Response(status_code=304, headers=headers)
+
+        if since is None:
+            body = {
+                "sites": state.site_log.snapshot(),
+                "version": state.site_log.version,
+            }
+        else:
+            body = state.site_log.changes(since)
+        # dumps writes BSON types like ObjectId as strings
+        return Response(dumps(body), media_type="application/json", headers=headers)
+    except Exception as e:
+        logger.error(f"Error retrieving sites: {str(e)}")
+        return JSONResponse({"error": "Failed to retrieve sites"}, status_code=500)
+
+
+@app.exception_handler(StarletteHTTPException)
+async def http_error(request, exc):
+    if exc.status_code == 404:
+        return JSONResponse({"error": "Endpoint not found"}, status_code=404)
+    return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+
+@app.exception_handler(Exception)
+async def internal_error(request, exc):
+    return JSONResponse({"error": "Internal Server Error"}, status_code=500)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    port = int(os.getenv("PORT", 5000))
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+    logger.info(f"Starting ASGI server on port {port} with {workers} workers")
+    uvicorn.run("server_async:app", host="0.0.0.0", port=port, workers=workers)
@@ -1,9 +1,10 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
-import json
 from datetime import datetime
 import logging
+from site_sync import SiteChangeLog
+from serialization import init_flask, load_json_file, save_json_file
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,6 +12,9 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
+init_flask(app)
+
+SITES_FILE = os.getenv("SITES_FILE", "sites.json")
 
 
 @app.route("/health", methods=["GET"])
@@ -27,8 +31,7 @@ def optimize():
     """Mock optimization endpoint that returns sample values"""
     try:
         # Load the sites data
-        with open("sites.json", "r") as f:
-            sites_data = json.load(f)
+        sites_data = load_json_file(SITES_FILE)
 
         # Create mock optimization results
         updated_sites = 0
@@ -55,8 +58,7 @@ def optimize():
             updated_sites += 1
 
         # Save the updated data back to sites.json
-        with open("sites.json", "w") as f:
-            json.dump(sites_data, f, indent=2)
+        save_json_file(SITES_FILE, sites_data)
 
         logger.info(f"Mock optimization completed for {updated_sites} sites")
 
@@ -85,13 +87,29 @@ def optimize():
         )
 
 
+# Changes to sites.json, for GET /sites?since= and ETags
+site_log = SiteChangeLog()
+
+
 @app.route("/sites", methods=["GET"])
 def get_sites():
-    """Get all sites data"""
+    """
+    Get all sites data, or with ?since=<version> only the sites changed since
+    that version plus the ids of deleted sites
+    """
     try:
-        with open("sites.json", "r") as f:
-            sites_data = json.load(f)
-        return jsonify(sites_data), 200
+        stat = os.stat(SITES_FILE)
+        site_log.refresh(
+            lambda: load_json_file(SITES_FILE), token=(stat.st_mtime_ns, stat.st_size)
+        )
+        headers = {"ETag": site_log.etag()}
+        if request.if_none_match.contains_weak(site_log.version):
+            return Response(status=304, headers=headers)
+
+        since = request.args.get("since")
+        if since is None:
+            return jsonify(site_log.snapshot()), 200, headers
+        return jsonify(site_log.changes(since)), 200, headers
     except Exception as e:
         logger.error(f"Error getting sites: {str(e)}")
         return (
@@ -0,0 +1,316 @@
+"""
+Shared /optimize pipeline: sites.json + forecast CSVs -> optimize_static_config
+-> optimal_machines written back into the site documents.
+
+Used by server.py (Flask) and server_async.py (ASGI) so both serve the same
+results.
+"""
+
+import contextlib
+import os
+
+import numpy as np
+import pulp
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process sites.json lock
+    fcntl = None
+
+from optimization_function_multiple_sites import (
+    optimize_static_config,
+    extract_site_params,
+)
+from optimization_function import optimize_dispatch
+from price_cube import load_forecast_cube
+from serialization import load_json_file, save_json_file
+from solver_control import solve
+
+INFERENCE_DEVICES = ["asic", "gpu"]
+
+
+def collect_devices(sites_data):
+    """All unique device types across the fleet, sorted"""
+    devices = set()
+    for site in sites_data:
+        devices.update(site["miners"].keys())
+        if "inference" in site:
+            devices.update(site["inference"].keys())
+    return sorted(devices)
+
+
+def energy_budget(sites_data):
+    """A month of every site running at full power capacity, in Wh"""
+    return sum(site["powerCapacity"] * 1000 * 24 * 30 for site in sites_data)
+
+
+def fleet_arrays(sites_data):
+    """
+    Per-(site, device) parameters as (S, D) arrays
+    Returns: site_ids, devices, arrays {r_hash, r_tok, power, N, P_MAX, current}, states
+    """
+    devices = collect_devices(sites_data)
+    sites, power, N, P_MAX, energy_prices, site_states, r_hash, r_tok = (
+        extract_site_params(sites_data)
+    )
+
+    def matrix(values):
+        return np.array(
+            [[values[s][d] for d in devices] for s in sites], dtype=float
+        ).reshape(len(sites), len(devices))
+
+    current = np.zeros((len(sites), len(devices)))
+    for i, site in enumerate(sites_data):
+        for group in ("miners", "inference"):
+            for device, spec in site.get(group, {}).items():
+                current[i, devices.index(device)] = spec.get("optimal_machines", 0)
+
+    arrays = {
+        "r_hash": matrix(r_hash),
+        "r_tok": matrix(r_tok),
+        "power": matrix(power),
+        "N": matrix(N),
+        "P_MAX": np.array([P_MAX[s] for s in sites], dtype=float),
+        "current": current,
+    }
+    return sites, devices, arrays, [site_states[s] for s in sites]
+
+
+def profit_coefficients(arrays, h, g, e):
+    """
+    Profit of one machine of each (site, device) summed over the horizon
+    h, g: (T,) arrays; e: (S, T) array
+    """
+    return (
+        arrays["r_hash"] * h.sum()
+        + arrays["r_tok"] * g.sum()
+        - arrays["power"] * e.sum(axis=1)[:, None]
+    )
+
+
+def allocation_profit(coeff, allocation):
+    """Expected profit of an (S, D) allocation"""
+    return float((coeff * allocation).sum())
+
+
+def load_forecasts(forecasts_dir, T, start=None):
+    """
+    Aligned forecast window of T steps from start (default: the first time
+    every series has a forecast)
+    Returns: h (list), g (list), e_states {state: list}
+    """
+    cube = load_forecast_cube(forecasts_dir)
+    if start is None:
+        start = cube.common_start()
+    window = cube.window(start, T)
+
+    h = window[cube.row("hash")].tolist()
+    g = window[cube.row("token")].tolist()
+    e_states = {
+        name: window[cube.row(name)].tolist()
+        for name in cube.names
+        if name not in ("hash", "token")
+    }
+    return h, g, e_states
+
+
+def warm_up(forecasts_dir, T=12):
+    """
+    Build the price cube and run a one-variable CBC solve, so the first
+    request does not pay for loading the forecasts, pulp and the CBC binary
+    """
+    load_forecasts(forecasts_dir, T)
+    prob = pulp.LpProblem("warm_up", pulp.LpMaximize)
+    x = pulp.LpVariable("x", 0, 1, cat="Integer")
+    prob += x
+    solve(prob)
+
+
+def dispatch_sites(
+    sites_data,
+    forecasts_dir,
+    T,
+    start=None,
+    site_ids=None,
+    time_limit=None,
+    gap_rel=None,
+):
+    """
+    Time-indexed optimize_dispatch for each site over a T step forecast window
+    time_limit, gap_rel: CBC budget per site solve
+    Returns: (window start in epoch ns, lazy iterator of
+        (site_id, {device: [(t_start, t_end, count)]}))
+    """
+    cube = load_forecast_cube(forecasts_dir)
+    start = (
+        cube.common_start() if start is None else cube.timestamp(cube.position(start))
+    )
+    h, g, e_states = load_forecasts(forecasts_dir, T, start=start)
+    sites, power, N, P_MAX, energy_prices, site_states, r_hash, r_tok = (
+        extract_site_params(sites_data)
+    )
+
+    def schedules():
+        for s in sites:
+            if site_ids is not None and s not in site_ids:
+                continue
+            yield s, optimize_dispatch(
+                r_hash[s],
+                r_tok[s],
+                power[s],
+                N[s],
+                h,
+                g,
+                e_states[site_states[s]],
+                P_MAX[s],
+                run_length=True,
+                time_limit=time_limit,
+                gap_rel=gap_rel,
+            )
+
+    return start, schedules()
+
+
+def solve_sites(
+    sites_data,
+    forecasts_dir,
+    T=12,
+    time_limit=None,
+    gap_rel=None,
+    return_report=False,
+    mode="exact",
+    E_BUDGET=None,
+    start=None,
+):
+    """
+    Run optimize_static_config over every site in sites_data
+    time_limit, gap_rel: CBC budget in seconds / relative MIP gap target
+    mode: "exact" MILP or "fast" LP relaxation with rounding
+    E_BUDGET: energy budget (default: energy_budget(sites_data))
+    start: forecast window start (default: first common forecast time)
+    Returns: {(site_id, device): count}, plus the solver report if return_report
+    """
+    devices = collect_devices(sites_data)
+    sites, power, N, P_MAX, energy_prices, site_states, r_hash, r_tok = (
+        extract_site_params(sites_data)
+    )
+
+    h, g, e_states = load_forecasts(forecasts_dir, T, start=start)
+
+    # Map energy prices to sites based on their states
+    e = {site: e_states[state] for site, state in site_states.items()}
+
+    E_BUDGET = energy_budget(sites_data) if E_BUDGET is None else E_BUDGET
+    print(f"\nEnergy Budget: {E_BUDGET/1000000:.2f} MWh")
+
+    return optimize_static_config(
+        sites=sites,
+        devices=devices,
+        T=T,
+        r_hash=r_hash,
+        r_tok=r_tok,
+        power=power,
+        N=N,
+        h=h,
+        g=g,
+        e=e,
+        P_MAX=P_MAX,
+        E_BUDGET=E_BUDGET,
+        time_limit=time_limit,
+        gap_rel=gap_rel,
+        return_report=return_report,
+        mode=mode,
+    )
+
+
+def apply_results(sites_data, result):
+    """
+    Write optimal_machines counts from result into sites_data in place
+    Returns: number of (site, device) entries updated
+    """
+    print("\nOptimization Results:")
+
+    # Create a mapping of site_id to site index for easy updates
+    site_index = {
+        site["id"]: idx for idx, site in enumerate(sites_data) if "id" in site
+    }
+
+    updated_sites = 0
+    for (site_id, device_type), count in result.items():
+        print(f"Site: {site_id}, Device: {device_type}, Count: {count}")
+
+        if site_id not in site_index:
+            print(f"Warning: Site ID {site_id} not found in sites.json")
+            continue
+
+        site = sites_data[site_index[site_id]]
+
+        # Determine if it's a mining or inference device
+        group = "inference" if device_type in INFERENCE_DEVICES else "miners"
+        site.setdefault(group, {}).setdefault(device_type, {})
+        site[group][device_type]["optimal_machines"] = count
+
+        updated_sites += 1
+
+    return updated_sites
+
+
+def load_sites(sites_file):
+    return load_json_file(sites_file)
+
+
+def save_sites(sites_file, sites_data):
+    """Atomic write in SITES_FORMAT ("pretty" or "compact")"""
+    save_json_file(sites_file, sites_data)
+
+
+@contextlib.contextmanager
+def sites_file_lock(sites_file):
+    """
+    Exclusive lock on <sites_file>.lock, shared by every process that writes
+    sites_file (e.g. several web workers); a no-op where fcntl is unavailable
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{sites_file}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def optimize_sites_file(
+    sites_file,
+    forecasts_dir,
+    T=12,
+    time_limit=None,
+    gap_rel=None,
+    mode="exact",
+    write_lock=None,
+):
+    """
+    Solve for the fleet in sites_file and write optimal_machines back to it
+    mode: "exact" MILP or "fast" LP relaxation with rounding
+    write_lock: held around the read-modify-write of sites_file
+    Returns: (result, updated_sites, solver report)
+    """
+    result, report = solve_sites(
+        load_sites(sites_file),
+        forecasts_dir,
+        T=T,
+        time_limit=time_limit,
+        gap_rel=gap_rel,
+        return_report=True,
+        mode=mode,
+    )
+
+    # Re-read so edits made while solving are not overwritten
+    with write_lock or contextlib.nullcontext(), sites_file_lock(sites_file):
+        sites_data = load_sites(sites_file)
+        updated_sites = apply_results(sites_data, result)
+        save_sites(sites_file, sites_data)
+
+    print(f"\nUpdated {updated_sites} sites in sites.json")
+    return result, updated_sites, report
@@ -0,0 +1,144 @@
+"""
+Versioned delta sync for site documents.
+
+SiteChangeLog keeps the last seen copy of every site with its content digest.
+The fleet version is a digest of every (site, digest) pair, so it is derived
+from the data alone: every process and every uvicorn worker that reads the
+same sites arrives at the same version, and it survives restarts. Reloading
+the source (sites.json or the sites collection) only moves the version when a
+document changed.
+
+Clients hold the version as an opaque cursor and ask for what changed since
+it:
+
+    log = SiteChangeLog()
+    log.refresh(lambda: load_sites("sites.json"), token=files_version([...]))
+    log.changes(since="5d41402abc4b2a76")
+    # {"version": "7d793037a0760186", "full": False, "sites": [...], "deleted": [...]}
+
+The per-site digests of the last max_versions fleet versions are kept, and a
+delta is the difference between the cursor's version and the current one:
+changed or added documents, plus the ids of deleted sites. A cursor this
+process has not seen (or no longer keeps) gets a full snapshot.
+"""
+
+import collections
+import copy
+import hashlib
+import json
+import threading
+
+
+def site_key(site):
+    """Sites are keyed by their "id", falling back to Mongo's _id"""
+    return str(site["id"]) if "id" in site else str(site.get("_id"))
+
+
+def site_digest(site):
+    """Content digest of a site document (ObjectId / datetime via str)"""
+    body = json.dumps(site, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.blake2b(body.encode(), digest_size=16).digest()
+
+
+def fleet_version(digests):
+    """Version of a fleet from its {key: site digest}, independent of order"""
+    h = hashlib.blake2b(digest_size=8)
+    for key in sorted(digests):
+        h.update(key.encode())
+        h.update(b"\0")
+        h.update(digests[key])
+    return h.hexdigest()
+
+
+class SiteChangeLog:
+    def __init__(self, max_versions=64):
+        self.max_versions = max_versions
+        self._sites = {}  # key -> (digest, document), in source order
+        self._versions = collections.OrderedDict()  # version -> {key: digest}
+        self.version = fleet_version({})
+        self._versions[self.version] = {}
+        self._token = None
+        self._lock = threading.Lock()
+
+    def etag(self):
+        """
+        Weak ETag of the version: the same sites are equivalent whether the
+        body is sent as is, gzip or brotli compressed
+        """
+        return f'W/"{self.version}"'
+
+    def needs_refresh(self, token):
+        """Whether a source at this token has not been applied yet"""
+        return token is None or token != self._token
+
+    def refresh(self, load, token=None):
+        """
+        Reload the sites with load() and record what changed
+        token: skip the reload when it equals the previous refresh's token
+            (e.g. the sites.json file version)
+        Returns: number of sites changed or deleted
+        """
+        with self._lock:
+            if not self.needs_refresh(token):
+                return 0
+            return self._apply(load(), token)
+
+    def apply(self, sites, token=None):
+        """refresh() for sites that were already loaded (e.g. asynchronously)"""
+        with self._lock:
+            return self._apply(sites, token)
+
+    def _apply(self, sites, token):
+        self._token = token
+        current = {}
+        changed = 0
+        for site in sites:
+            key = site_key(site)
+            digest = site_digest(site)
+            previous = self._sites.get(key)
+            if previous is not None and previous[0] == digest:
+                current[key] = previous
+                continue
+            current[key] = (digest, copy.deepcopy(site))
+            changed += 1
+        changed += sum(1 for key in self._sites if key not in current)
+        self._sites = current
+
+        digests = {key: entry[0] for key, entry in current.items()}
+        self.version = fleet_version(digests)
+        self._versions[self.version] = digests
+        self._versions.move_to_end(self.version)
+        while len(self._versions) > self.max_versions:
+            self._versions.popitem(last=False)
+        return changed
+
+    def changes(self, since=None):
+        """
+        Sites changed and deleted after version since (all sites when since is
+        missing or a version this log does not keep)
+        Returns: {"version", "full", "sites": [documents], "deleted": [ids]}
+        """
+        with self._lock:
+            base = self._versions.get(since) if since else None
+            if base is None:
+                return {
+                    "version": self.version,
+                    "full": True,
+                    "sites": [entry[1] for entry in self._sites.values()],
+                    "deleted": [],
+                }
+            return {
+                "version": self.version,
+                "full": False,
+                "sites": [
+                    document
+                    for key, (digest, document) in self._sites.items()
+                    if base.get(key) != digest
+                ],
+                "deleted": [key for key in base if key not in self._sites],
+            }
+
+    def snapshot(self):
+        """Every current site document, in source order"""
+        with self._lock:
+            return [entry[1] for entry in self._sites.values()]
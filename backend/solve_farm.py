@@ -0,0 +1,490 @@
+"""
+Distributed solve-worker farm.
+
+Solve tasks (optimize_static_config or optimize_dispatch inputs, encoded as
+compact JSON) go onto a broker queue and are pulled by worker processes on
+any number of nodes. Workers hold a lease on the task they are solving and
+renew it with heartbeats. A task whose lease runs out (the worker died or hung)
+or whose solve raised is queued again, up to MAX_ATTEMPTS times, after which
+it is reported as failed. Results wait on the broker until the submitter
+collects them.
+
+LocalBroker is the in-memory broker stand-in. It is served to other processes
+and nodes with multiprocessing.managers over TCP (SOLVE_FARM_KEY is the shared
+auth key; the protocol is pickle, so only expose it on a trusted network):
+
+    python solve_farm.py broker --bind 0.0.0.0:5600
+    python solve_farm.py worker --broker head-node:5600 --processes 8   # per node
+    python solve_farm.py local --workers 4 --horizon 24                 # one machine
+
+Workers pull tasks as they free up, so throughput grows with the number of
+worker processes until the broker or the submitter is the bottleneck.
+"""
+
+import argparse
+import collections
+import contextlib
+import io
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from multiprocessing.managers import BaseManager
+
+from fleet_dispatch import build_context
+from optimization_function import optimize_dispatch
+from optimization_function_multiple_sites import (
+    extract_site_params,
+    optimize_static_config,
+)
+from serialization import dumps, loads
+from site_optimizer import collect_devices, energy_budget, load_forecasts, load_sites
+from solve_history import set_history
+
+# Seconds without a heartbeat before a task's lease expires
+LEASE_TIMEOUT = float(os.getenv("SOLVE_FARM_LEASE", 15))
+HEARTBEAT_INTERVAL = LEASE_TIMEOUT / 3
+MAX_ATTEMPTS = int(os.getenv("SOLVE_FARM_ATTEMPTS", 3))
+AUTHKEY = os.getenv("SOLVE_FARM_KEY", "solve-farm").encode()
+
+TASK_KINDS = ("static", "dispatch")
+
+
+class LocalBroker:
+    """In-memory task queue with leases, retries and result storage"""
+
+    def __init__(self, lease_timeout=LEASE_TIMEOUT, max_attempts=MAX_ATTEMPTS):
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self._cond = threading.Condition()
+        self._queue = collections.deque()  # task ids ready to run
+        self._tasks = {}  # id -> {"payload", "attempts", "errors"}
+        self._leases = {}  # id -> (worker, deadline)
+        self._results = {}  # id -> {"status", "result" | "errors", "attempts"}
+        self._workers = {}  # worker -> time of its last call
+
+    def put(self, payload):
+        """Queue an encoded task; returns its id"""
+        task_id = uuid.uuid4().hex
+        with self._cond:
+            self._tasks[task_id] = {"payload": payload, "attempts": 0, "errors": []}
+            self._queue.append(task_id)
+            self._cond.notify_all()
+        return task_id
+
+    def reserve(self, worker, timeout=1.0):
+        """
+        Lease the next task to worker, waiting up to timeout seconds
+        Returns: (task id, payload, attempt) or None
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._workers[worker] = time.monotonic()
+            while True:
+                self._expire()
+                if self._queue:
+                    task_id = self._queue.popleft()
+                    task = self._tasks[task_id]
+                    task["attempts"] += 1
+                    self._leases[task_id] = (
+                        worker,
+                        time.monotonic() + self.lease_timeout,
+                    )
+                    return task_id, task["payload"], task["attempts"]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(min(remaining, self.lease_timeout))
+
+    def heartbeat(self, worker, task_id=None):
+        """
+        Renew worker's lease on task_id
+        Returns: False if the lease was lost (the task went to another worker)
+        """
+        with self._cond:
+            self._workers[worker] = time.monotonic()
+            if task_id is None:
+                return True
+            lease = self._leases.get(task_id)
+            if lease is None or lease[0] != worker:
+                return False
+            self._leases[task_id] = (worker, time.monotonic() + self.lease_timeout)
+            return True
+
+    def complete(self, worker, task_id, result):
+        """Store a result; late results of an already finished task are dropped"""
+        with self._cond:
+            self._workers[worker] = time.monotonic()
+            task = self._tasks.pop(task_id, None)
+            if task is None:
+                return False
+            self._leases.pop(task_id, None)
+            with contextlib.suppress(ValueError):
+                self._queue.remove(task_id)  # requeued after a missed heartbeat
+            self._results[task_id] = {
+                "status": "done",
+                "result": result,
+                "attempts": task["attempts"],
+                "worker": worker,
+            }
+            self._cond.notify_all()
+            return True
+
+    def fail(self, worker, task_id, error):
+        """Record a failed attempt; the task is retried until MAX_ATTEMPTS"""
+        with self._cond:
+            self._workers[worker] = time.monotonic()
+            lease = self._leases.get(task_id)
+            if lease is None or lease[0] != worker:
+                return
+            del self._leases[task_id]
+            self._retry(task_id, f"{worker}: {error}")
+
+    def _retry(self, task_id, error):
+        task = self._tasks[task_id]
+        task["errors"].append(error)
+        if task["attempts"] < self.max_attempts:
+            self._queue.append(task_id)
+        else:
+            del self._tasks[task_id]
+            self._results[task_id] = {
+                "status": "failed",
+                "errors": task["errors"],
+                "attempts": task["attempts"],
+            }
+        self._cond.notify_all()
+
+    def _expire(self):
+        """Requeue (or fail) tasks whose lease ran out; call with the lock held"""
+        now = time.monotonic()
+        for task_id, (worker, deadline) in list(self._leases.items()):
+            if deadline < now:
+                del self._leases[task_id]
+                self._retry(task_id, f"{worker}: lease expired")
+
+    def wait_results(self, task_ids, timeout=1.0):
+        """
+        Results of any finished tasks among task_ids, waiting up to timeout
+        seconds for at least one; returned results are removed from the broker
+        Returns: {task id: result}
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._expire()
+                ready = {
+                    i: self._results.pop(i) for i in task_ids if i in self._results
+                }
+                remaining = deadline - time.monotonic()
+                if ready or remaining <= 0:
+                    return ready
+                self._cond.wait(min(remaining, self.lease_timeout))
+
+    def stats(self):
+        """Queue depth, leases, stored results and seconds since each worker"""
+        with self._cond:
+            self._expire()
+            now = time.monotonic()
+            return {
+                "queued": len(self._queue),
+                "leased": len(self._leases),
+                "results": len(self._results),
+                "workers": {w: now - seen for w, seen in self._workers.items()},
+            }
+
+
+_broker = None
+
+
+def _get_broker():
+    """The broker of the serving process, created on first connection"""
+    global _broker
+    if _broker is None:
+        _broker = LocalBroker()
+    return _broker
+
+
+class BrokerManager(BaseManager):
+    pass
+
+
+BrokerManager.register("broker", callable=_get_broker)
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def connect_broker(address, authkey=AUTHKEY):
+    """Proxy for the broker served at (host, port)"""
+    manager = BrokerManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.broker()
+
+
+def static_inputs(sites_data, h, g, e_states, T, E_BUDGET=None, **options):
+    """
+    optimize_static_config inputs for a fleet as one task
+    options: time_limit, gap_rel, mode
+    """
+    sites, power, N, P_MAX, energy_prices, site_states, r_hash, r_tok = (
+        extract_site_params(sites_data)
+    )
+    return {
+        "sites": sites,
+        "devices": collect_devices(sites_data),
+        "T": T,
+        "r_hash": r_hash,
+        "r_tok": r_tok,
+        "power": power,
+        "N": N,
+        "h": list(h),
+        "g": list(g),
+        "e": {s: list(e_states[site_states[s]]) for s in sites},
+        "P_MAX": P_MAX,
+        "E_BUDGET": energy_budget(sites_data) if E_BUDGET is None else E_BUDGET,
+        **options,
+    }
+
+
+def dispatch_inputs(sites_data, h, g, e_states, switch_cost=0.0, **options):
+    """
+    optimize_dispatch inputs, one task per site with machines
+    options: time_limit, gap_rel, energy_cap
+    Returns: [(site id, inputs)]
+    """
+    context = build_context(sites_data, h, g, e_states)
+    return [
+        (
+            site["id"],
+            {
+                "r_hash": site["r_hash"],
+                "r_tok": site["r_tok"],
+                "power": site["power"],
+                "N": site["N"],
+                "h": context["h"],
+                "g": context["g"],
+                "e": site["e"],
+                "P_MAX": site["P_MAX"],
+                "switch_cost": switch_cost,
+                **options,
+            },
+        )
+        for site in context["sites"]
+        if site["N"]
+    ]
+
+
+def run_task(kind, inputs):
+    """Solve one decoded task; returns a JSON-ready result"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        if kind == "static":
+            config, report = optimize_static_config(**inputs, return_report=True)
+            return {
+                "config": [[s, d, n] for (s, d), n in config.items()],
+                "report": report,
+            }
+        if kind == "dispatch":
+            schedule, report = optimize_dispatch(**inputs, return_report=True)
+            return {"schedule": schedule, "report": report}
+    raise ValueError(f"Unknown task kind '{kind}' (choose from {TASK_KINDS})")
+
+
+def run_worker(broker, worker_id=None, max_tasks=None, idle_exit=None):
+    """
+    Pull and solve tasks until max_tasks are done or the queue has been empty
+    for idle_exit seconds (both default to running forever)
+    Returns: number of tasks completed
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    current = {"task": None}
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            broker.heartbeat(worker_id, current["task"])
+
+    threading.Thread(target=beat, name="heartbeat", daemon=True).start()
+    done = 0
+    idle_since = time.monotonic()
+    try:
+        while max_tasks is None or done < max_tasks:
+            leased = broker.reserve(worker_id, timeout=1.0)
+            if leased is None:
+                if idle_exit is not None and time.monotonic() - idle_since > idle_exit:
+                    break
+                continue
+            task_id, payload, _ = leased
+            current["task"] = task_id
+            try:
+                task = loads(payload)
+                result = dumps(run_task(task["kind"], task["inputs"]))
+            except Exception as e:
+                broker.fail(worker_id, task_id, f"{type(e).__name__}: {e}")
+            else:
+                broker.complete(worker_id, task_id, result)
+                done += 1
+            current["task"] = None
+            idle_since = time.monotonic()
+    finally:
+        stop.set()
+    return done
+
+
+def _worker_process(address, authkey, idle_exit):
+    run_worker(connect_broker(address, authkey), idle_exit=idle_exit)
+
+
+class SolveFarm:
+    """Submitter side: queue tasks and collect their results"""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def submit(self, kind, inputs):
+        if kind not in TASK_KINDS:
+            raise ValueError(f"Unknown task kind '{kind}' (choose from {TASK_KINDS})")
+        return self.broker.put(dumps({"kind": kind, "inputs": inputs}))
+
+    def collect(self, task_ids, timeout=None, alive=None):
+        """
+        Yield (task id, result) as tasks finish, in completion order
+        result: {"status": "done", "result": {...}, "attempts", "worker"} or
+            {"status": "failed", "errors": [...], "attempts"}
+        alive: optional callable, False once no worker can finish the rest
+        Raises: TimeoutError if timeout seconds pass first, RuntimeError if
+            alive() turns False with tasks still pending
+        """
+        pending = list(task_ids)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while pending:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"{len(pending)} tasks still running")
+            # Checked before waiting: results of workers that already exited
+            # are on the broker by then
+            workers_alive = alive is None or alive()
+            ready = self.broker.wait_results(pending, 1.0)
+            if not ready and not workers_alive:
+                raise RuntimeError(f"{len(pending)} tasks left and no workers")
+            for task_id, result in ready.items():
+                if result["status"] == "done":
+                    result["result"] = loads(result["result"])
+                pending.remove(task_id)
+                yield task_id, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed solve-worker farm")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    broker_parser = commands.add_parser("broker", help="Serve the task queue")
+    broker_parser.add_argument("--bind", default="0.0.0.0:5600")
+
+    worker_parser = commands.add_parser("worker", help="Run workers on this node")
+    worker_parser.add_argument("--broker", default="127.0.0.1:5600")
+    worker_parser.add_argument("--processes", type=int, default=os.cpu_count())
+
+    local_parser = commands.add_parser(
+        "local", help="Broker and workers on this machine, solving sites.json"
+    )
+    local_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    local_parser.add_argument(
+        "--sites-file", default=os.getenv("SITES_FILE", "sites.json")
+    )
+    local_parser.add_argument(
+        "--forecasts-dir",
+        default=os.getenv("FORECASTS_DIR", "../datasets/forecasts"),
+    )
+    local_parser.add_argument("--horizon", type=int, default=12)
+    local_parser.add_argument("--switch-cost", type=float, default=0.0)
+    local_parser.add_argument(
+        "--repeat", type=int, default=1, help="Submit every task this many times"
+    )
+    local_parser.add_argument(
+        "--timeout", type=float, help="Seconds to wait for all results"
+    )
+    for command_parser in (worker_parser, local_parser):
+        command_parser.add_argument(
+            "--history", help="Record solves to this solve history file (default: off)"
+        )
+    args = parser.parse_args()
+    if args.command != "broker":
+        set_history(args.history)
+
+    if args.command == "broker":
+        address = parse_address(args.bind)
+        print(f"Broker listening on {address[0]}:{address[1]}")
+        BrokerManager(address=address, authkey=AUTHKEY).get_server().serve_forever()
+
+    elif args.command == "worker":
+        address = parse_address(args.broker)
+        processes = [
+            multiprocessing.Process(
+                target=_worker_process, args=(address, AUTHKEY, None), daemon=True
+            )
+            for _ in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        print(f"{len(processes)} workers pulling from {args.broker}")
+        for process in processes:
+            process.join()
+
+    else:
+        manager = BrokerManager(address=("127.0.0.1", 0), authkey=AUTHKEY)
+        manager.start()
+        farm = SolveFarm(manager.broker())
+        sites_data = load_sites(args.sites_file)
+        h, g, e_states = load_forecasts(args.forecasts_dir, args.horizon)
+        started = time.perf_counter()
+        ids = {}
+        for _ in range(args.repeat):
+            for site_id, inputs in dispatch_inputs(
+                sites_data, h, g, e_states, switch_cost=args.switch_cost
+            ):
+                ids[farm.submit("dispatch", inputs)] = f"dispatch site {site_id}"
+            inputs = static_inputs(sites_data, h, g, e_states, args.horizon)
+            ids[farm.submit("static", inputs)] = "static fleet"
+
+        # Started once the queue is full, so idle_exit cannot fire early
+        workers = [
+            multiprocessing.Process(
+                target=_worker_process, args=(manager.address, AUTHKEY, 2.0)
+            )
+            for _ in range(args.workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        failed = 0
+        results = farm.collect(
+            list(ids),
+            timeout=args.timeout,
+            alive=lambda: any(worker.is_alive() for worker in workers),
+        )
+        for task_id, result in results:
+            if result["status"] == "done":
+                report = result["result"]["report"]
+                print(
+                    f"{ids[task_id]:<20} {report['termination']:<10} "
+                    f"profit {report['objective']:>16,.2f}  "
+                    f"{result['worker']} (attempt {result['attempts']})"
+                )
+            else:
+                failed += 1
+                print(f"{ids[task_id]:<20} FAILED {result['errors']}")
+        elapsed = time.perf_counter() - started
+        print(
+            f"\n{len(ids)} tasks ({failed} failed) on {args.workers} workers in "
+            f"{elapsed:.2f}s ({len(ids) / elapsed:.1f} tasks/s)"
+        )
+        for worker in workers:
+            worker.join()
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Append-only history of optimizer solves, with a query CLI.
+
+optimize_static_config, optimize_dispatch and optimise_over_hour append one
+compact JSON line per call to SOLVE_HISTORY (default solve_history.jsonl next
+to this file, whatever the working directory; set SOLVE_HISTORY= to turn
+recording off). The batch CLIs (backtest.py, forecast_eval.py, portfolio.py,
+solve_farm.py) do not record unless given --history, so they never mix into
+the server's history:
+
+    {"ts": 1750512000.1, "fn": "optimize_dispatch", "hash": "9f2c...",
+     "vars": 120, "ints": 120, "cons": 97, "nnz": 410, "build": 0.004,
+     "solve": 0.21, "gap": 0.0, "obj": 18234.5, "term": "optimal",
+     "solver": "cbc", "mode": "exact"}
+
+"hash" identifies the solve inputs, so the same inputs can be compared across
+code changes. The CLI shows latency trends and flags solves that are slow for
+their model size (solve time far above a log-log fit of time vs. non-zeros):
+
+    python solve_history.py trend --bucket day
+    python solve_history.py slow --factor 3
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+DEFAULT_HISTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "solve_history.jsonl"
+)
+SOLVE_HISTORY = os.getenv("SOLVE_HISTORY", DEFAULT_HISTORY)
+
+# Solves faster than this are never flagged as slow
+MIN_SLOW_SECONDS = 0.05
+
+_write_lock = threading.Lock()
+
+
+def _plain(obj):
+    if hasattr(obj, "tolist"):  # numpy arrays and scalars
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def input_hash(*inputs):
+    """
+    Short digest of the solve inputs (JSON-serializable values), taken over
+    JSON with sorted keys so it is the same in every process and run
+    """
+    body = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=_plain)
+    return hashlib.blake2b(body.encode(), digest_size=8).hexdigest()
+
+
+def set_history(path):
+    """
+    Record solves of this process and of worker processes it starts later to
+    path (None or "" turns recording off)
+    """
+    global SOLVE_HISTORY
+    SOLVE_HISTORY = path or ""
+    os.environ["SOLVE_HISTORY"] = SOLVE_HISTORY
+
+
+def model_size(prob):
+    """Variables, integer variables, constraints and non-zeros of a pulp model"""
+    variables = prob.variables()
+    return {
+        "vars": prob.numVariables(),
+        "ints": sum(1 for var in variables if var.cat == "Integer"),
+        "cons": prob.numConstraints(),
+        "nnz": len(prob.coefficients()),
+    }
+
+
+def record_solve(fn, prob, report, inputs, build_time, path=None):
+    """
+    Append one record for a finished solve; never raises, so a full disk or
+    read-only directory cannot fail an optimization
+    fn: name of the optimizer; report: solver_control-style report
+    inputs: tuple of the solve inputs, hashed with input_hash
+    """
+    path = SOLVE_HISTORY if path is None else path
+    if not path:
+        return None
+    try:
+        record = {
+            "ts": round(time.time(), 3),
+            "fn": fn,
+            "hash": input_hash(*inputs),
+            **model_size(prob),
+            "build": round(build_time, 6),
+            "solve": round(report["solve_time"], 6),
+            "gap": report.get("gap"),
+            "obj": report.get("objective"),
+            "term": report.get("termination"),
+            "solver": "cbc-lp" if report.get("mode") == "fast" else "cbc",
+            "mode": report.get("mode", "exact"),
+        }
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        # One write per record on an O_APPEND descriptor, so concurrent
+        # processes never interleave within a line
+        with _write_lock:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+        return record
+    except Exception:
+        return None
+
+
+def load_history(path=None, fn=None, since=None):
+    """Records from path, optionally for one optimizer and after a timestamp"""
+    path = SOLVE_HISTORY if path is None else path
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a torn last line from a crashed writer
+            if fn is not None and record["fn"] != fn:
+                continue
+            if since is not None and record["ts"] < since:
+                continue
+            records.append(record)
+    return records
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def trend(records, bucket="day"):
+    """
+    Latency per optimizer and time bucket ("hour" or "day")
+    Returns: [{fn, bucket, solves, p50, p95, build_p50, mean_gap}] in time order
+    """
+    fmt = "%Y-%m-%d %H:00" if bucket == "hour" else "%Y-%m-%d"
+    groups = {}
+    for record in records:
+        when = datetime.fromtimestamp(record["ts"], timezone.utc).strftime(fmt)
+        groups.setdefault((record["fn"], when), []).append(record)
+
+    rows = []
+    for (fn, when), group in sorted(groups.items(), key=lambda item: item[0][1]):
+        gaps = [r["gap"] for r in group if r.get("gap") is not None]
+        rows.append(
+            {
+                "fn": fn,
+                "bucket": when,
+                "solves": len(group),
+                "p50": _percentile([r["solve"] for r in group], 0.5),
+                "p95": _percentile([r["solve"] for r in group], 0.95),
+                "build_p50": _percentile([r["build"] for r in group], 0.5),
+                "mean_gap": sum(gaps) / len(gaps) if gaps else None,
+            }
+        )
+    return rows
+
+
+def _fit(points):
+    """Least-squares line through [(x, y)]: returns (intercept, slope)"""
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return mean_y, 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+    return mean_y - slope * mean_x, slope
+
+
+def slow_solves(records, factor=3.0):
+    """
+    Solves taking more than factor x the time expected for their size, from a
+    per-optimizer fit of log(solve time) against log(non-zeros)
+    Returns: records with "expected" and "ratio" added, slowest first
+    """
+    by_fn = {}
+    for record in records:
+        by_fn.setdefault(record["fn"], []).append(record)
+
+    flagged = []
+    for group in by_fn.values():
+        if len(group) < 3:
+            continue
+        points = [
+            (math.log(r["nnz"] + 1), math.log(max(r["solve"], 1e-4))) for r in group
+        ]
+        intercept, slope = _fit(points)
+        for record, (x, _) in zip(group, points):
+            expected = math.exp(intercept + slope * x)
+            ratio = record["solve"] / expected
+            if ratio > factor and record["solve"] >= MIN_SLOW_SECONDS:
+                flagged.append({**record, "expected": expected, "ratio": ratio})
+    return sorted(flagged, key=lambda r: r["ratio"], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the solve history")
+    parser.add_argument("--file", default=SOLVE_HISTORY)
+    parser.add_argument("--fn", help="Only this optimizer")
+    parser.add_argument("--days", type=float, help="Only the last N days")
+    commands = parser.add_subparsers(dest="command", required=True)
+    trend_parser = commands.add_parser("trend", help="Latency per time bucket")
+    trend_parser.add_argument("--bucket", choices=("hour", "day"), default="day")
+    slow_parser = commands.add_parser("slow", help="Solves slow for their size")
+    slow_parser.add_argument("--factor", type=float, default=3.0)
+    args = parser.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days is not None else None
+    records = load_history(args.file, fn=args.fn, since=since)
+    print(f"{len(records)} solves in {args.file}\n")
+
+    if args.command == "trend":
+        print(
+            f"{'optimizer':<24} {'bucket':<16} {'solves':>6} {'p50 s':>8} "
+            f"{'p95 s':>8} {'build s':>8} {'gap':>8}"
+        )
+        for row in trend(records, args.bucket):
+            gap = f"{row['mean_gap']:.2%}" if row["mean_gap"] is not None else "-"
+            print(
+                f"{row['fn']:<24} {row['bucket']:<16} {row['solves']:>6} "
+                f"{row['p50']:>8.3f} {row['p95']:>8.3f} {row['build_p50']:>8.3f} "
+                f"{gap:>8}"
+            )
+    else:
+        flagged = slow_solves(records, args.factor)
+        print(f"{len(flagged)} solves over {args.factor}x the expected time\n")
+        print(
+            f"{'when (UTC)':<20} {'optimizer':<24} {'nnz':>8} {'solve s':>8} "
+            f"{'expected':>8} {'ratio':>6} hash"
+        )
+        for r in flagged:
+            when = datetime.fromtimestamp(r["ts"], timezone.utc)
+            print(
+                f"{when:%Y-%m-%d %H:%M:%S}  {r['fn']:<24} {r['nnz']:>8} "
+                f"{r['solve']:>8.3f} {r['expected']:>8.3f} {r['ratio']:>6.1f} "
+                f"{r['hash']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
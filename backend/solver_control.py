@@ -0,0 +1,286 @@
+"""
+Anytime CBC solves with time budgets, gap targets and incumbent reporting.
+
+Every optimizer builds its pulp problem as before and hands it to solve(),
+which runs CBC with an optional time limit (seconds) and relative MIP gap,
+optionally warm-started from a heuristic solution, and reads the termination
+reason, best bound and gap back from the CBC log:
+
+    report = solve(prob, time_limit=2.0, gap_rel=0.01, warm_start=True)
+    report["termination"]  # optimal / gap_limit / time_limit / no_solution / ...
+
+When CBC stops without an incumbent, the caller falls back to its heuristic
+solution (termination "heuristic") instead of failing.
+"""
+
+import math
+import os
+import re
+import tempfile
+import time
+
+import pulp
+
+TERMINATIONS = (
+    "optimal",  # proven optimal
+    "gap_limit",  # within the requested relative gap
+    "time_limit",  # stopped on the time budget with an incumbent
+    "no_solution",  # stopped on the time budget without an incumbent
+    "infeasible",
+    "unbounded",
+    "heuristic",  # no incumbent from CBC, the heuristic seed was returned
+    "rounded",  # fast mode: LP relaxation rounded and repaired
+    "unknown",
+)
+
+# "exact" solves the MILP; "fast" rounds the LP relaxation (see round_and_repair)
+SOLVE_MODES = ("exact", "fast")
+
+_RESULT = re.compile(r"^Result - (.+)$", re.MULTILINE)
+_BOUND = re.compile(r"^(?:Upper|Lower) bound:\s+(\S+)", re.MULTILINE)
+
+
+def make_solver(
+    time_limit=None, gap_rel=None, warm_start=False, log_path=None, relax=False
+):
+    """
+    PULP_CBC_CMD with the budget options that are set
+    relax: solve the LP relaxation (integer variables treated as continuous)
+    """
+    options = {"msg": False, "warmStart": warm_start, "mip": not relax}
+    if time_limit is not None:
+        options["timeLimit"] = time_limit
+    if gap_rel is not None:
+        options["gapRel"] = gap_rel
+    if log_path is not None:
+        options["logPath"] = log_path
+    return pulp.PULP_CBC_CMD(**options)
+
+
+def _termination(result, has_incumbent):
+    result = result.lower()
+    if "infeasible" in result:
+        return "infeasible"
+    if "unbounded" in result:
+        return "unbounded"
+    if "gap tolerance" in result:
+        return "gap_limit"
+    if "optimal" in result:
+        return "optimal"
+    if "time limit" in result or "stopped" in result:
+        return "time_limit" if has_incumbent else "no_solution"
+    return "unknown"
+
+
+def relative_gap(objective, bound):
+    """|bound - objective| relative to the larger magnitude of the two"""
+    if objective is None or bound is None:
+        return None
+    scale = max(abs(objective), abs(bound), 1e-9)
+    return abs(bound - objective) / scale
+
+
+def solve(prob, time_limit=None, gap_rel=None, warm_start=False, relax=False):
+    """
+    Solve prob with CBC within the given budget
+    warm_start: use the variables' initial values as the starting incumbent
+    relax: solve the LP relaxation instead of the MILP
+    Returns: report {termination, status, objective, bound, gap, solve_time,
+        has_incumbent, time_limit, gap_target, warm_start}
+    """
+    # CBC costs a MIP start in the minimization sense even under -max, so a
+    # maximization is solved as the equivalent minimization of -objective
+    objective = prob.objective
+    sign = -1 if prob.sense == pulp.LpMaximize else 1
+    if sign < 0:
+        prob.sense, prob.objective = pulp.LpMinimize, -objective
+
+    fd, log_path = tempfile.mkstemp(suffix=".log", prefix="cbc_")
+    os.close(fd)
+    try:
+        started = time.perf_counter()
+        status = prob.solve(
+            make_solver(
+                time_limit,
+                gap_rel,
+                warm_start=warm_start,
+                log_path=log_path,
+                relax=relax,
+            )
+        )
+        solve_time = time.perf_counter() - started
+        with open(log_path) as f:
+            log = f.read()
+    finally:
+        os.remove(log_path)
+        if sign < 0:
+            prob.sense, prob.objective = pulp.LpMaximize, objective
+
+    has_incumbent = prob.sol_status in (
+        pulp.LpSolutionOptimal,
+        pulp.LpSolutionIntegerFeasible,
+    )
+    result = _RESULT.search(log)
+    termination = _termination(result.group(1) if result else "", has_incumbent)
+    if result is None and has_incumbent:
+        termination = "optimal" if status == pulp.LpStatusOptimal else "unknown"
+
+    objective = pulp.value(prob.objective) if has_incumbent else None
+    bound = _BOUND.search(log)
+    bound = sign * float(bound.group(1)) if bound else None
+    if bound is None and termination == "optimal":
+        bound = objective
+
+    return {
+        "termination": termination,
+        "status": pulp.LpStatus[status],
+        "objective": objective,
+        "bound": bound,
+        "gap": relative_gap(objective, bound),
+        "solve_time": solve_time,
+        "has_incumbent": has_incumbent,
+        "time_limit": time_limit,
+        "gap_target": gap_rel,
+        "warm_start": warm_start,
+    }
+
+
+def request_budget(body, time_limit=None, gap_rel=None):
+    """
+    Solve budget from a request body {"time_limit", "gap"}, falling back to
+    the given defaults
+    Returns: {"time_limit": seconds, "gap_rel": relative gap}
+    Raises: ValueError for non-numeric or negative values
+    """
+    time_limit = body.get("time_limit", time_limit)
+    gap_rel = body.get("gap", gap_rel)
+    time_limit = float(time_limit) if time_limit is not None else None
+    gap_rel = float(gap_rel) if gap_rel is not None else None
+    if (time_limit is not None and time_limit <= 0) or (
+        gap_rel is not None and gap_rel < 0
+    ):
+        raise ValueError("time_limit must be positive and gap non-negative")
+    return {"time_limit": time_limit, "gap_rel": gap_rel}
+
+
+def request_options(body, time_limit=None, gap_rel=None, mode="exact"):
+    """
+    Solve budget plus "mode" from a request body
+    Raises: ValueError for an unknown mode or an invalid budget
+    """
+    mode = body.get("mode", mode)
+    if mode not in SOLVE_MODES:
+        raise ValueError(f"Unknown mode '{mode}' (choose from {SOLVE_MODES})")
+    return {**request_budget(body, time_limit, gap_rel), "mode": mode}
+
+
+def greedy_fill(profit, power, N, capacity, cost=None, budget=None):
+    """
+    Integer greedy heuristic: add machines in order of profit per watt while
+    they fit under the power capacity (and the cost budget, when given).
+    Only profitable items are used, so the result is always feasible.
+    profit, power, N, cost: dicts keyed by item
+    Returns: ({item: count}, cost used)
+    """
+
+    def ratio(item):
+        return profit[item] / power[item] if power[item] > 0 else float("inf")
+
+    counts = {item: 0 for item in profit}
+    spent = 0.0
+    for item in sorted(profit, key=ratio, reverse=True):
+        if profit[item] <= 0:
+            continue
+        n = int(N[item])
+        if power[item] > 0:
+            n = min(n, int(capacity // power[item]))
+        if cost is not None and budget is not None and cost[item] > 0:
+            n = min(n, int((budget - spent) // cost[item]))
+        n = max(n, 0)
+        counts[item] = n
+        capacity -= n * power[item]
+        if cost is not None:
+            spent += n * cost[item]
+    return counts, spent
+
+
+def round_and_repair(relaxed, profit, upper, constraints):
+    """
+    Integer solution from an LP relaxation that satisfies every constraint
+    relaxed: {item: LP value}; profit: {item: objective coefficient}
+    upper: {item: upper bound}; constraints: [({item: coeff}, rhs)], all <=
+    1) floor every value (feasible when all coefficients are non-negative)
+    2) repair: while a constraint is violated, remove the units that cost the
+       least profit per unit of violation removed
+    3) fill: add units of profitable items, best first, within the slack
+    Returns: {item: count}
+    """
+    counts = {item: int(math.floor(value + 1e-9)) for item, value in relaxed.items()}
+    by_item = {}
+    for c, (coeffs, _) in enumerate(constraints):
+        for item, coeff in coeffs.items():
+            by_item.setdefault(item, []).append((c, coeff))
+
+    def lhs(c):
+        return sum(coeff * counts[item] for item, coeff in constraints[c][0].items())
+
+    usage = [lhs(c) for c in range(len(constraints))]
+
+    def change(item, delta):
+        counts[item] += delta
+        for c, coeff in by_item.get(item, ()):
+            usage[c] += coeff * delta
+
+    # 2) Repair
+    for _ in range(len(counts) + len(constraints)):
+        violated = [
+            c for c, (_, rhs) in enumerate(constraints) if usage[c] > rhs + 1e-6
+        ]
+        if not violated:
+            break
+        c = violated[0]
+        coeffs, rhs = constraints[c]
+        candidates = [i for i, coeff in coeffs.items() if coeff > 0 and counts[i] > 0]
+        if not candidates:
+            break
+        item = min(candidates, key=lambda i: profit[i] / coeffs[i])
+        excess = usage[c] - rhs
+        change(item, -min(counts[item], math.ceil(excess / coeffs[item] - 1e-9)))
+
+    # 3) Fill
+    for item in sorted(profit, key=profit.get, reverse=True):
+        if profit[item] <= 0:
+            break
+        room = upper[item] - counts[item]
+        for c, coeff in by_item.get(item, ()):
+            if coeff > 0:
+                room = min(room, (constraints[c][1] - usage[c]) // coeff)
+        if room >= 1:
+            change(item, int(room))
+    return counts
+
+
+def seed(variables, values):
+    """Set initial values for a warm start: {key: LpVariable}, {key: value}"""
+    for key, var in variables.items():
+        var.setInitialValue(values.get(key, 0))
+
+
+def fall_back(report, objective):
+    """Mark report as returning the heuristic solution with this objective"""
+    report["termination"] = "heuristic"
+    report["status"] = pulp.LpStatus[pulp.LpStatusNotSolved]
+    report["objective"] = objective
+    report["gap"] = relative_gap(objective, report["bound"])
+    return report
+
+
+def report_line(report):
+    """One-line summary for the solvers' status prints"""
+    parts = [f"termination={report['termination']}"]
+    if report["gap"] is not None:
+        parts.append(f"gap={report['gap']:.4%}")
+    if report["bound"] is not None:
+        parts.append(f"bound={report['bound']:.2f}")
+    parts.append(f"time={report['solve_time']:.3f}s")
+    return ", ".join(parts)
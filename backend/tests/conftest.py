@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The backend is a flat set of modules run from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Solves run by the tests stay out of the solve history
+os.environ["SOLVE_HISTORY"] = ""
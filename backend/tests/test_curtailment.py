@@ -0,0 +1,81 @@
+import copy
+
+import pytest
+
+from curtailment import MeritOrderIndex
+
+
+def _site(site_id, state, air, gpu):
+    return {
+        "id": site_id,
+        "state": state,
+        "powerCapacity": 10,
+        "energyPrice": 0.0,
+        "curtailmentRisk": "low",
+        "miners": {
+            "air": {
+                "max_machines": 5,
+                "hashrate": 10,
+                "power": 1000,
+                "optimal_machines": air,
+            }
+        },
+        "inference": {
+            "gpu": {
+                "max_machines": 5,
+                "tokens": 20,
+                "power": 1000,
+                "optimal_machines": gpu,
+            }
+        },
+    }
+
+
+SITES = [_site("1", "Texas", 1, 3), _site("2", "Ohio", 2, 2)]
+
+
+def _index():
+    # Per machine-step: air 10 - 5 = 5, gpu 20 - 5 = 15
+    return MeritOrderIndex(SITES, 1.0, 1.0, {"Texas": 0.005, "Ohio": 0.005})
+
+
+def test_shed_turns_off_least_profitable_per_watt_first():
+    plan = _index().shed("1", 1500)
+    assert plan["machines"] == [
+        {"device_type": "air", "turn_off": 1, "remaining": 0},
+        {"device_type": "gpu", "turn_off": 1, "remaining": 2},
+    ]
+    assert plan["shed_watts"] == 2000
+    assert plan["shortfall_watts"] == 0
+    assert plan["lost_profit_per_step"] == pytest.approx(20.0)
+
+
+def test_shed_reports_shortfall_and_commits():
+    index = _index()
+    plan = index.shed("2", 10_000, commit=True)
+    assert plan["shed_watts"] == 4000
+    assert plan["shortfall_watts"] == 6000
+    assert index.shed("2", 1000)["machines"] == []
+
+
+def test_energy_tick_reranks_only_that_state():
+    index = _index()
+    assert index.tick(energy={"Ohio": 0.001}) == 1
+    assert index.tick(token_price=0.1) == 2
+    # The token price drop makes gpu (2 - 5 = -3) worse than air (5) at Texas
+    plan = index.shed("1", 1000)
+    assert plan["machines"][0]["device_type"] == "gpu"
+
+
+def test_reconcile_keeps_ticked_prices():
+    index = _index()
+    index.tick(energy={"Texas": 0.02})
+    updated = copy.deepcopy(SITES)
+    updated[0]["miners"]["air"]["optimal_machines"] = 4
+    index.reconcile(updated)
+    assert index.energy[index._rows["1"]] == 0.02
+    assert index.shed("1", 4000)["machines"][0] == {
+        "device_type": "air",
+        "turn_off": 4,
+        "remaining": 0,
+    }
@@ -0,0 +1,13 @@
+import math
+
+from load_test import percentile
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 11))
+    assert percentile(values, 50) == 5
+    assert percentile(values, 10) == 1
+    assert percentile(values, 95) == 10
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile([7], 50) == 7
+    assert math.isnan(percentile([], 50))
@@ -0,0 +1,26 @@
+from local_mongo import LocalMongoClient, client_from_uri
+
+
+def test_results_have_pymongo_attributes():
+    sites = LocalMongoClient()["db"]["sites"]
+    inserted = sites.insert_one({"name": "a"})
+    assert sites.find_one({"_id": inserted.inserted_id})["name"] == "a"
+    assert len(sites.insert_many([{"name": "b"}, {"name": "c"}]).inserted_ids) == 2
+
+    updated = sites.update_one({"name": "b"}, {"$set": {"power.max": 5}})
+    assert (updated.matched_count, updated.modified_count) == (1, 1)
+    assert sites.find_one({"power.max": 5})["name"] == "b"
+
+    assert sites.delete_one({"name": "a"}).deleted_count == 1
+    assert sites.delete_one({"name": "a"}).deleted_count == 0
+    assert sites.count_documents() == 2
+
+
+def test_upsert_and_seed(tmp_path):
+    seed = tmp_path / "sites.json"
+    seed.write_text('[{"name": "x"}]')
+    sites = client_from_uri(f"local://{seed}", "db", "sites")["db"]["sites"]
+    assert sites.count_documents({"name": "x"}) == 1
+    result = sites.update_one({"name": "y"}, {"$set": {"on": True}}, upsert=True)
+    assert result.upserted_id is not None
+    assert sites.find_one({"name": "y"})["on"] is True
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from price_cube import PriceCube, asof_join, to_epoch_ns
+
+MIN = 60 * 10**9
+
+
+def test_asof_join_fill_policies():
+    grid = np.arange(0, 5 * MIN, MIN, dtype=np.int64)
+    times = np.array([MIN, 3 * MIN + MIN // 2], dtype=np.int64)
+    values = np.array([1.0, 2.0])
+
+    np.testing.assert_array_equal(
+        asof_join(grid, times, values, "ffill"), [np.nan, 1, 1, 1, 2]
+    )
+    np.testing.assert_array_equal(
+        asof_join(grid, times, values, "bfill"), [1, 1, 2, 2, np.nan]
+    )
+    np.testing.assert_array_equal(
+        asof_join(grid, times, values, "nearest"), [1, 1, 1, 2, 2]
+    )
+    np.testing.assert_array_equal(
+        asof_join(grid, times, values, "none"), [np.nan, 1, np.nan, np.nan, np.nan]
+    )
+    np.testing.assert_array_equal(
+        asof_join(grid, times, values, "ffill", tolerance=MIN),
+        [np.nan, 1, 1, np.nan, 2],
+    )
+    with pytest.raises(ValueError):
+        asof_join(grid, times, values, "backfill")
+
+
+def _cube():
+    # "a" starts at 00:00, "b" at 00:05 on a 5 minute grid
+    step = 5 * MIN
+    start = to_epoch_ns("2025-01-01T00:00:00")
+    series = {
+        "a": (start + step * np.arange(4), np.array([1.0, 2.0, 3.0, 4.0])),
+        "b": (start + step * np.arange(1, 4), np.array([10.0, 20.0, 30.0])),
+    }
+    return PriceCube.from_series(series), start, step
+
+
+def test_windows_align_on_timestamps():
+    cube, start, step = _cube()
+    assert cube.step_ns == step
+    assert cube.common_start() == start + step
+    window = cube.window(cube.common_start(), 2)
+    np.testing.assert_array_equal(window, [[2, 3], [10, 20]])
+
+    with pytest.raises(ValueError):
+        cube.window(start, 2)  # "b" has no price at 00:00
+    with pytest.raises(IndexError):
+        cube.window(cube.common_start(), 4)
+
+
+def test_asof_lookup():
+    cube, start, step = _cube()
+    lookups = [start - 1, start + step + 1, start + 3 * step - 1, start + 10 * step]
+    np.testing.assert_array_equal(cube.asof("a", lookups), [np.nan, 2, 3, np.nan])
+    assert cube.asof("b", ["2025-01-01 00:14:59"])[0] == 20
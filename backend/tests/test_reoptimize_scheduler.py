@@ -0,0 +1,27 @@
+import numpy as np
+
+from reoptimize_scheduler import greedy_profit
+
+
+def _arrays():
+    return {
+        "power": np.array([[10.0, 20.0], [10.0, 5.0]]),
+        "N": np.array([[5.0, 5.0], [5.0, 5.0]]),
+        "P_MAX": np.array([60.0, 30.0]),
+    }
+
+
+def test_greedy_profit_respects_power_caps():
+    arrays = _arrays()
+    coeff = np.array([[3.0, 4.0], [1.0, -1.0]])
+    energy = arrays["power"]
+    # Site 0: 5 x device 0 (50 W) leaves no room for device 1; site 1: 3 x device 0
+    assert greedy_profit(coeff, arrays, energy, budget=1e9) == 5 * 3.0 + 3 * 1.0
+
+
+def test_greedy_profit_respects_shared_budget():
+    arrays = _arrays()
+    coeff = np.array([[3.0, 4.0], [1.0, 1.0]])
+    # 2 machines of device 0 at site 0 spend 20, the last 5 buy one device 1
+    # at site 1
+    assert greedy_profit(coeff, arrays, arrays["power"], budget=25.0) == 2 * 3.0 + 1.0
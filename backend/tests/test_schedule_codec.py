@@ -0,0 +1,46 @@
+import json
+
+from schedule_codec import (
+    decode_schedule,
+    encode_schedule,
+    run_lengths,
+    stream_ndjson,
+)
+
+START = "2025-06-21T20:25:00"
+MINUTE = 60 * 10**9
+
+
+def test_run_lengths():
+    assert run_lengths([3, 3, 0, 0, 0, 5]) == [(0, 2, 3), (2, 5, 0), (5, 6, 5)]
+    assert run_lengths([]) == []
+
+
+def test_encode_decode_round_trip():
+    schedule = {"air": [2, 2, 2, 0, 1], "gpu": [4, 4, 4, 4, 4]}
+    for step in (MINUTE, 5 * MINUTE):
+        encoded = encode_schedule(schedule, START, step)
+        assert decode_schedule(encoded, step) == schedule
+    encoded = encode_schedule(schedule, START, MINUTE)
+    assert encoded["gpu"] == [
+        {"start": START, "end": "2025-06-21T20:30:00", "count": 4}
+    ]
+
+
+def test_stream_ends_with_end_line():
+    lines = [
+        json.loads(line) for line in stream_ndjson([("1", {"air": [1, 1, 2]})], START)
+    ]
+    assert [line["type"] for line in lines] == ["header", "segment", "segment", "end"]
+    assert lines[-1] == {"type": "end", "segments": 2, "complete": True}
+
+
+def test_stream_reports_a_failed_site():
+    def schedules():
+        yield "1", {"air": [1, 1]}
+        raise RuntimeError("solver crashed")
+
+    lines = [json.loads(line) for line in stream_ndjson(schedules(), START)]
+    assert [line["type"] for line in lines] == ["header", "segment", "error", "end"]
+    assert lines[2]["message"] == "solver crashed"
+    assert lines[-1]["complete"] is False
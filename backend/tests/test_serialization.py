@@ -0,0 +1,45 @@
+import gzip
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from serialization import (
+    compress,
+    dumps,
+    load_json_file,
+    loads,
+    negotiate,
+    save_json_file,
+)
+
+
+def test_dumps_handles_numpy_and_datetimes():
+    body = dumps({"n": np.int64(3), "a": np.arange(2), "t": datetime(2025, 1, 2, 3)})
+    assert loads(body) == {"n": 3, "a": [0, 1], "t": "2025-01-02T03:00:00"}
+
+
+def test_negotiate_prefers_supported_codings_by_weight():
+    assert negotiate("") is None
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("identity, gzip;q=0.5") == "gzip"
+    assert negotiate("*") in ("br", "gzip")
+
+
+def test_compress_skips_small_bodies():
+    assert compress(b"{}", "gzip") == (b"{}", None)
+    body = dumps([{"id": i, "name": "site"} for i in range(200)])
+    compressed, coding = compress(body, "gzip", min_size=0)
+    assert coding == "gzip"
+    assert gzip.decompress(compressed) == body
+
+
+def test_site_files_round_trip(tmp_path):
+    path = tmp_path / "sites.json"
+    sites = [{"id": "1", "miners": {"air": {"power": 3500}}}]
+    for fmt in ("pretty", "compact"):
+        save_json_file(str(path), sites, fmt)
+        assert load_json_file(str(path)) == sites
+    assert b"\n" not in path.read_bytes()
+    with pytest.raises(ValueError):
+        save_json_file(str(path), sites, "yaml")
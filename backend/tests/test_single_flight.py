@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+import single_flight
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution(monkeypatch):
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    attached = threading.Semaphore(0)
+    calls = []
+
+    class SignallingFuture(Future):
+        def result(self, timeout=None):
+            attached.release()  # a follower is about to block on the leader
+            return super().result(timeout)
+
+    monkeypatch.setattr(single_flight, "Future", SignallingFuture)
+
+    def solve(x):
+        calls.append(x)
+        started.set()
+        release.wait(5)
+        return x * 2
+
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(flight.do, "k", solve, 21)
+        assert started.wait(5)
+        followers = [pool.submit(flight.do, "k", solve, 21) for _ in range(3)]
+        for _ in followers:
+            assert attached.acquire(timeout=5)
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert len(calls) == 1
+    assert results == [(42, False)] + [(42, True)] * 3
+    assert flight.in_flight() == 0
+
+
+def test_key_is_released_after_each_call():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == (1, False)
+    assert flight.do("k", lambda: 2) == (2, False)
+
+
+def test_exceptions_reach_the_leader_and_release_the_key():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flight.do("k", fail)
+    assert flight.in_flight() == 0
+    assert flight.do("k", lambda: 3) == (3, False)
@@ -0,0 +1,32 @@
+import threading
+
+import pytest
+
+import site_optimizer
+from site_optimizer import sites_file_lock
+
+
+@pytest.mark.skipif(site_optimizer.fcntl is None, reason="needs fcntl")
+def test_sites_file_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / "sites.json")
+    held, release, entered = threading.Event(), threading.Event(), threading.Event()
+
+    def holder():
+        with sites_file_lock(path):
+            held.set()
+            release.wait(5)
+
+    def waiter():
+        with sites_file_lock(path):
+            entered.set()
+
+    threads = [threading.Thread(target=holder), threading.Thread(target=waiter)]
+    threads[0].start()
+    assert held.wait(5)
+    threads[1].start()
+    # flock excludes every other open file description, threads included
+    assert not entered.wait(0.2)
+    release.set()
+    assert entered.wait(5)
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,68 @@
+from site_sync import SiteChangeLog
+
+
+def _sites(**prices):
+    return [{"id": key, "energyPrice": price} for key, price in prices.items()]
+
+
+def test_cursor_returns_only_changes_and_deletions():
+    log = SiteChangeLog()
+    log.apply(_sites(a=1, b=2, c=3))
+    cursor = log.version
+
+    assert log.apply(_sites(a=1, b=5, d=4)) == 3  # b changed, d added, c deleted
+    delta = log.changes(cursor)
+    assert delta["full"] is False
+    assert [site["id"] for site in delta["sites"]] == ["b", "d"]
+    assert delta["deleted"] == ["c"]
+    assert delta["version"] == log.version != cursor
+
+    current = log.changes(log.version)
+    assert (current["sites"], current["deleted"]) == ([], [])
+
+
+def test_unknown_or_expired_cursor_gets_full_snapshot():
+    log = SiteChangeLog(max_versions=2)
+    log.apply(_sites(a=1))
+    first = log.version
+    log.apply(_sites(a=2))
+    log.apply(_sites(a=3))
+
+    for cursor in (None, "", "not-a-version", first):
+        delta = log.changes(cursor)
+        assert delta["full"] is True
+        assert delta["sites"] == _sites(a=3)
+
+
+def test_versions_depend_only_on_content():
+    # Two workers (or a restarted process) agree on versions and cursors
+    one, other = SiteChangeLog(), SiteChangeLog()
+    one.apply(_sites(a=1, b=2))
+    other.apply(list(reversed(_sites(a=1, b=2))))
+    assert one.version == other.version
+    assert one.etag() == f'W/"{one.version}"'
+
+    cursor = one.version
+    one.apply(_sites(a=1, b=3))
+    other.apply(_sites(a=1, b=3))
+    assert one.changes(cursor) == other.changes(cursor)
+
+    # An unchanged reload keeps the version
+    version = one.version
+    assert one.apply(_sites(a=1, b=3)) == 0
+    assert one.version == version
+
+
+def test_refresh_skips_an_unchanged_token():
+    log = SiteChangeLog()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return _sites(a=1)
+
+    log.refresh(load, token="v1")
+    log.refresh(load, token="v1")
+    log.refresh(load, token="v2")
+    assert len(loads) == 2
+    assert log.snapshot() == _sites(a=1)
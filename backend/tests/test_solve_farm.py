@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from serialization import dumps
+from solve_farm import LocalBroker, SolveFarm
+
+
+def test_expired_lease_is_requeued_for_another_worker():
+    broker = LocalBroker(lease_timeout=0.05, max_attempts=3)
+    task_id = broker.put(b"{}")
+    assert broker.reserve("a", timeout=0)[0] == task_id
+    time.sleep(0.1)  # "a" misses its heartbeat
+
+    leased = broker.reserve("b", timeout=0)
+    assert leased == (task_id, b"{}", 2)
+    assert broker.heartbeat("a", task_id) is False
+    assert broker.heartbeat("b", task_id) is True
+
+
+def test_late_result_of_a_requeued_task_wins_once():
+    broker = LocalBroker(lease_timeout=0.05)
+    task_id = broker.put(b"{}")
+    broker.reserve("a", timeout=0)
+    time.sleep(0.1)
+    broker.stats()  # expires the lease and requeues the task
+
+    assert broker.complete("a", task_id, b"1") is True
+    assert broker.complete("b", task_id, b"2") is False
+    assert broker.stats()["queued"] == 0
+    result = broker.wait_results([task_id], timeout=0)[task_id]
+    assert result["result"] == b"1" and result["worker"] == "a"
+
+
+def test_failed_attempts_retry_then_fail():
+    broker = LocalBroker(lease_timeout=10, max_attempts=2)
+    task_id = broker.put(b"{}")
+    for worker in ("a", "b"):
+        assert broker.reserve(worker, timeout=0)[0] == task_id
+        broker.fail(worker, task_id, "boom")
+
+    assert broker.reserve("c", timeout=0) is None
+    result = broker.wait_results([task_id], timeout=0)[task_id]
+    assert result == {
+        "status": "failed",
+        "errors": ["a: boom", "b: boom"],
+        "attempts": 2,
+    }
+
+
+def test_fail_from_a_worker_without_the_lease_is_ignored():
+    broker = LocalBroker(lease_timeout=10, max_attempts=1)
+    task_id = broker.put(b"{}")
+    broker.reserve("a", timeout=0)
+    broker.fail("b", task_id, "boom")
+    assert broker.stats()["leased"] == 1
+
+
+def test_expiry_counts_towards_max_attempts():
+    broker = LocalBroker(lease_timeout=0.05, max_attempts=1)
+    task_id = broker.put(b"{}")
+    broker.reserve("a", timeout=0)
+    result = broker.wait_results([task_id], timeout=1)[task_id]
+    assert result["status"] == "failed"
+    assert result["errors"] == ["a: lease expired"]
+
+
+def test_collect_decodes_results():
+    broker = LocalBroker()
+    farm = SolveFarm(broker)
+    task_id = farm.submit("static", {})
+    broker.reserve("a", timeout=0)
+    broker.complete("a", task_id, dumps({"config": {}}))
+    [(collected_id, result)] = list(farm.collect([task_id]))
+    assert collected_id == task_id and result["result"] == {"config": {}}
+
+
+def test_collect_stops_without_workers():
+    farm = SolveFarm(LocalBroker())
+    task_id = farm.submit("static", {})
+    with pytest.raises(RuntimeError):
+        list(farm.collect([task_id], alive=lambda: False))
+
+
+def test_collect_times_out():
+    farm = SolveFarm(LocalBroker())
+    task_id = farm.submit("static", {})
+    with pytest.raises(TimeoutError):
+        list(farm.collect([task_id], timeout=0.1))
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        SolveFarm(LocalBroker()).submit("bogus", {})
@@ -0,0 +1,61 @@
+import pulp
+
+import solve_history
+from solve_history import input_hash, load_history, record_solve, slow_solves
+
+
+def _prob():
+    prob = pulp.LpProblem("p", pulp.LpMaximize)
+    x = pulp.LpVariable("x", 0, 3, cat="Integer")
+    y = pulp.LpVariable("y", 0, 3)
+    prob += x + y
+    prob += x + 2 * y <= 4
+    return prob
+
+
+REPORT = {"solve_time": 0.01, "gap": 0.0, "objective": 4.0, "termination": "optimal"}
+
+
+def test_input_hash_is_stable():
+    inputs = ({"1": {"air": 1.0}}, [0.5, 0.6], 12)
+    assert input_hash(*inputs) == input_hash({"1": {"air": 1.0}}, [0.5, 0.6], 12)
+    assert input_hash(*inputs) != input_hash({"1": {"air": 2.0}}, [0.5, 0.6], 12)
+
+
+def test_input_hash_ignores_key_order():
+    a = {"1": {"air": 1.0, "hydro": 2.0}, "2": {"gpu": 3.0}}
+    b = {"2": {"gpu": 3.0}, "1": {"hydro": 2.0, "air": 1.0}}
+    assert input_hash(a, ["air", "gpu"]) == input_hash(b, ["air", "gpu"])
+
+
+def test_record_and_load(tmp_path):
+    path = tmp_path / "history.jsonl"
+    record = record_solve("f", _prob(), REPORT, ([1, 2],), 0.002, path=str(path))
+    assert (record["vars"], record["ints"], record["cons"], record["nnz"]) == (
+        2,
+        1,
+        1,
+        2,
+    )
+    with open(path, "a") as f:
+        f.write('{"torn')  # a crashed writer's partial line is skipped
+    assert load_history(str(path)) == [record]
+    assert load_history(str(path), fn="g") == []
+
+
+def test_set_history_turns_recording_off(monkeypatch, tmp_path):
+    monkeypatch.setattr(solve_history, "SOLVE_HISTORY", str(tmp_path / "h.jsonl"))
+    monkeypatch.setenv("SOLVE_HISTORY", "")
+    solve_history.set_history(None)
+    assert record_solve("f", _prob(), REPORT, (), 0.0) is None
+    assert not (tmp_path / "h.jsonl").exists()
+
+
+def test_slow_solves_flags_outliers():
+    records = [
+        {"fn": "f", "nnz": n, "solve": n / 1000, "ts": 0, "hash": ""}
+        for n in (100, 200, 400, 800, 1600)
+    ]
+    records.append({"fn": "f", "nnz": 200, "solve": 2.0, "ts": 0, "hash": ""})
+    flagged = slow_solves(records, factor=3)
+    assert [r["solve"] for r in flagged] == [2.0]
@@ -0,0 +1,84 @@
+import pulp
+import pytest
+
+from solver_control import (
+    fall_back,
+    greedy_fill,
+    request_budget,
+    request_options,
+    round_and_repair,
+    solve,
+)
+
+
+def test_request_budget_defaults_and_overrides():
+    assert request_budget({}, 10.0, None) == {"time_limit": 10.0, "gap_rel": None}
+    assert request_budget({"time_limit": "2", "gap": 0.01}, 10.0) == {
+        "time_limit": 2.0,
+        "gap_rel": 0.01,
+    }
+    assert request_options({"mode": "fast"}, 10.0)["mode"] == "fast"
+    for body in ({"time_limit": 0}, {"gap": -0.1}, {"mode": "best"}):
+        with pytest.raises(ValueError):
+            request_options(body, 10.0)
+
+
+def test_greedy_fill_by_profit_per_watt():
+    profit = {"a": 10.0, "b": 30.0, "c": -1.0}
+    power = {"a": 1.0, "b": 5.0, "c": 1.0}
+    N = {"a": 4, "b": 10, "c": 10}
+    counts, spent = greedy_fill(profit, power, N, 12.0, cost=power, budget=100.0)
+    assert counts == {"a": 4, "b": 1, "c": 0}
+    assert spent == 9.0
+
+
+def _knapsack():
+    prob = pulp.LpProblem("knapsack", pulp.LpMaximize)
+    x = {i: pulp.LpVariable(f"x{i}", 0, 3, cat="Integer") for i in range(3)}
+    prob += 5 * x[0] + 4 * x[1] + 3 * x[2]
+    prob += 2 * x[0] + 3 * x[1] + x[2] <= 7
+    return prob, x
+
+
+def test_solve_reports_optimum():
+    prob, x = _knapsack()
+    report = solve(prob, time_limit=5)
+    assert report["termination"] == "optimal"
+    assert report["has_incumbent"]
+    assert report["objective"] == pytest.approx(19.0)
+    assert report["gap"] == pytest.approx(0.0, abs=1e-6)
+    assert prob.sense == pulp.LpMaximize  # restored after the min -obj solve
+
+
+def test_fall_back_marks_heuristic():
+    report = fall_back({"bound": 20.0}, 16.0)
+    assert report["termination"] == "heuristic"
+    assert report["gap"] == pytest.approx(0.2)
+
+
+def _feasible(counts, upper, constraints):
+    return all(0 <= counts[i] <= upper[i] for i in counts) and all(
+        sum(coeff * counts[i] for i, coeff in coeffs.items()) <= rhs + 1e-9
+        for coeffs, rhs in constraints
+    )
+
+
+def test_round_and_repair_floors_then_fills():
+    upper = {"a": 3, "b": 3}
+    constraints = [({"a": 1, "b": 1}, 4)]
+    counts = round_and_repair(
+        {"a": 2.6, "b": 1.4}, {"a": 3, "b": 2}, upper, constraints
+    )
+    assert counts == {"a": 3, "b": 1}
+    assert _feasible(counts, upper, constraints)
+
+
+def test_round_and_repair_repairs_violations():
+    # Flooring a - b <= 0 at (2.0, 1.9) gives (2, 1), which violates it
+    upper = {"a": 5, "b": 5}
+    constraints = [({"a": 1, "b": -1}, 0), ({"a": 1, "b": 1}, 3.9)]
+    counts = round_and_repair(
+        {"a": 2.0, "b": 1.9}, {"a": 1, "b": 1}, upper, constraints
+    )
+    assert _feasible(counts, upper, constraints)
+    assert counts == {"a": 1, "b": 2}
@@ -1,7 +1,125 @@
+import os
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+
+# How long fetched sites are trusted before revalidating them with the backend
+SITES_TTL_SECONDS = 5
+# How often a running optimization job is polled
+POLL_INTERVAL_SECONDS = 2
+
+
+# --- Data layer -------------------------------------------------------------
+# Streamlit re-runs this script on every widget interaction, so everything that
+# talks to the backend goes through the cached helpers below.
+
+
+@st.cache_resource
+def get_session():
+    """One pooled HTTP session shared by all reruns and browser sessions"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, backoff_factor=0.2, allowed_methods=["GET"]),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def _sites_cache():
+    """Last /sites body and its ETag, shared by all reruns"""
+    return {"entry": None}
+
+
+@st.cache_data(ttl=SITES_TTL_SECONDS, show_spinner=False)
+def fetch_sites():
+    """Site list, revalidated with If-None-Match so unchanged sites cost a 304"""
+    cache = _sites_cache()
+    entry = cache["entry"]
+    headers = {"If-None-Match": entry[0]} if entry else {}
+    response = get_session().get(f"{BACKEND_URL}/sites", headers=headers, timeout=30)
+    if entry and response.status_code == 304:
+        return entry[1]
+    response.raise_for_status()
+    data = response.json()
+    sites = data.get("sites", []) if isinstance(data, dict) else data
+    etag = response.headers.get("ETag")
+    cache["entry"] = (etag, sites) if etag else None
+    return sites
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def fetch_job_result(job_id):
+    """Result of a finished optimization job (immutable, so cached for good)"""
+    response = get_session().get(f"{BACKEND_URL}/optimize/jobs/{job_id}", timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def poll_job(job_id):
+    response = get_session().get(f"{BACKEND_URL}/optimize/jobs/{job_id}", timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def show_results(result):
+    st.subheader("Optimization Results")
+
+    # Create a table for better visualization
+    results_data = []
+    for item in result.get("results", []):
+        results_data.append({
+            "Site ID": item["site_id"],
+            "Device Type": item["device_type"],
+            "Optimal Machines": item["optimal_machines"]
+        })
+
+    if results_data:
+        st.table(results_data)
+    else:
+        st.warning("No optimization results returned.")
+
+    # Show raw JSON in an expander for debugging
+    with st.expander("View Raw Optimization Results"):
+        st.json(result)
+
+
+@st.fragment(run_every=POLL_INTERVAL_SECONDS)
+def optimization_status():
+    """Polls the running job in the background; only this fragment re-runs"""
+    job_id = st.session_state.get("optimize_job_id")
+    if not job_id:
+        return
+
+    if st.session_state.get("optimize_job_done"):
+        job = fetch_job_result(job_id)
+    else:
+        try:
+            job = poll_job(job_id)
+        except requests.RequestException as e:
+            st.error(f"Failed to poll optimization status: {e}")
+            return
+        if job["status"] in ("done", "error"):
+            st.session_state["optimize_job_done"] = True
+            # Site data changed on the server; revalidate on the next fetch
+            fetch_sites.clear()
+
+    if job["status"] in ("queued", "running"):
+        st.info(f"Optimization {job['status']}... (job {job_id[:8]})")
+    elif job["status"] == "done":
+        st.success("Optimization completed successfully!")
+        show_results(job["result"])
+    else:
+        st.error(f"Optimization failed: {job.get('result', {}).get('message')}")
+
+
 st.title("Bitcoin Mining Site Configuration")
 
 # Site Information
@@ -54,7 +172,7 @@ with col1:
             "updated_at": datetime.utcnow().isoformat(),
         }
         try:
-            response = requests.post("http://localhost:8000/config", json=payload)
+            response = get_session().post(f"{BACKEND_URL}/config", json=payload, timeout=30)
             if response.ok:
                 st.success("Configuration submitted successfully!")
                 st.json(response.json())
@@ -66,37 +184,37 @@ with col1:
 with col2:
     if st.button("Run Optimization", type="primary", use_container_width=True):
         try:
-            with st.spinner("Running optimization..."):
-                response = requests.post("http://localhost:8000/optimize")
-                if response.ok:
-                    result = response.json()
-                    st.success("Optimization completed successfully!")
-                    
-                    # Display optimization results
-                    st.subheader("Optimization Results")
-                    
-                    # Create a table for better visualization
-                    results_data = []
-                    for item in result.get("results", []):
-                        results_data.append({
-                            "Site ID": item["site_id"],
-                            "Device Type": item["device_type"],
-                            "Optimal Machines": item["optimal_machines"]
-                        })
-                    
-                    if results_data:
-                        st.table(results_data)
-                    else:
-                        st.warning("No optimization results returned.")
-                    
-                    # Show raw JSON in an expander for debugging
-                    with st.expander("View Raw Optimization Results"):
-                        st.json(result)
-                else:
-                    st.error(f"Optimization failed: {response.status_code} - {response.text}")
+            response = get_session().post(f"{BACKEND_URL}/optimize/jobs", timeout=10)
+            if response.ok:
+                st.session_state["optimize_job_id"] = response.json()["job_id"]
+                st.session_state["optimize_job_done"] = False
+            else:
+                st.error(f"Optimization failed: {response.status_code} - {response.text}")
         except Exception as e:
             st.error(f"Failed to run optimization: {str(e)}")
 
+optimization_status()
+
+# Current site allocations, only re-downloaded when the server's ETag changes
+st.header("Sites")
+try:
+    sites = fetch_sites()
+    st.table([
+        {
+            "Site ID": site.get("id"),
+            "Name": site.get("name"),
+            "State": site.get("state"),
+            "Optimal Machines": sum(
+                device.get("optimal_machines", 0)
+                for group in ("miners", "inference")
+                for device in site.get(group, {}).values()
+            ),
+        }
+        for site in sites
+    ])
+except requests.RequestException as e:
+    st.warning(f"Could not load sites: {e}")
+
 # Add some space at the bottom
 st.markdown("---")
-st.info("Note: Make sure the backend server is running on http://localhost:8000")
+st.info(f"Note: Make sure the backend server is running on {BACKEND_URL}")
@@ -1,12 +1,26 @@
 # best_config_for_hour.py
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import time
 import pulp
 
+from backend.solve_history import record_solve
+from backend.solver_control import fall_back, greedy_fill, report_line, seed, solve
+
 
 def optimise_over_hour(
     config: Dict[str, Any],
-    price_series: List[Dict[str, float]],) -> Dict[str, int]:
-    """Find the best single config that maximizes cumulative profit over the next hour."""
+    price_series: List[Dict[str, float]],
+    time_limit: Optional[float] = None,
+    gap_rel: Optional[float] = None,
+    warm_start: bool = True,
+    return_report: bool = False,):
+    """Find the best single config that maximizes cumulative profit over the next hour.
+
+    time_limit / gap_rel bound the CBC solve (seconds / relative MIP gap). With
+    return_report=True, returns (config, report), the same solver_control report
+    as the backend optimizers (termination, objective, bound, gap, ...).
+    """
+    started = time.perf_counter()
     entries = {}
 
     # Flatten the config
@@ -52,9 +66,34 @@ def optimise_over_hour(
         "power_cap"
     )
 
-    prob.solve(pulp.PULP_CBC_CMD(msg=False))
+    # Greedy by profit per watt: a feasible seed and the fallback solution
+    greedy, _ = greedy_fill(
+        {name: spec["cumulative_profit"] for name, spec in entries.items()},
+        {name: spec["power"] for name, spec in entries.items()},
+        {name: spec["max"] for name, spec in entries.items()},
+        config["power"],
+    )
+    if warm_start:
+        seed(x, greedy)
+
+    build_time = time.perf_counter() - started
+    report = solve(prob, time_limit=time_limit, gap_rel=gap_rel, warm_start=warm_start)
+    report["mode"] = "exact"
 
-    return {name: int(var.value()) for name, var in x.items()}
+    # Best incumbent, or the greedy seed when CBC stopped without one
+    if report["has_incumbent"]:
+        result = {name: int(round(var.value())) for name, var in x.items()}
+    else:
+        result = greedy
+        fall_back(
+            report,
+            sum(result[n] * spec["cumulative_profit"] for n, spec in entries.items()),
+        )
+    record_solve("optimise_over_hour", prob, report, (config, price_series), build_time)
+    print("Status:", report["status"], f"({report_line(report)})")
+    if not return_report:
+        return result
+    return result, report
 
 if __name__ == "__main__":
     from pprint import pprint
@@ -97,5 +136,6 @@ if __name__ == "__main__":
         # Add more as needed to fill the full hour
     ]
 
-    result = optimise_over_hour(config, price_series)
+    result, report = optimise_over_hour(config, price_series, time_limit=1.0, return_report=True)
     pprint(result)
+    pprint(report)